@@ -11,5 +11,52 @@ class Settings:
 
     ALLOWED_EXTENSIONS = {".csv"}
     MAX_FILE_SIZE_MB = 200
+    DEDUPE_UPLOADS = True           # Store uploads once per content hash, shared by sessions (services/blob_store.py)
+
+    # Session lifetime (services/session_manifest.py, services/cleanup.py)
+    SESSION_TTL_HOURS = 24              # Deleted after this long without a request
+    SESSION_DISK_QUOTA_MB = 10_240      # All sessions together; least recently used ones go first
+    SESSION_TOUCH_INTERVAL_SECONDS = 60 # Access times are written at most this often per session
+    SAMPLE_ROWS = 1000
+    SAMPLE_MAX_ROWS = 50_000        # Upper bound for a user-chosen sample size
+    SAMPLE_MAX_STRATA = 1000        # More distinct values than this -> plain reservoir
+
+    # Storage dtypes (see services/dtypes.py)
+    OPTIMIZE_DTYPES = True          # Narrow loaded frames to the dtypes inferred at upload
+    DTYPE_CATEGORY_MAX_RATIO = 0.5  # Strings become `category` up to this many distinct values per row
+
+    # Session cache (services/recipe_cache.py): loaded samples, schemas and preview frames
+    SESSION_CACHE_MAX_MB = 512      # One budget for every session in the process (memory_usage(deep=True))
+    PREVIEW_CACHE_MAX_MB = 64       # The most one session may hold of it
+    PREVIEW_WORKERS = 2             # Warm processes for heavy preview steps (0 = run inline)
+    PREVIEW_TIMEOUT_SECONDS = 15    # After this, /preview returns the steps done so far
+    PREVIEW_PAGE_ROWS = 100         # Rows /preview serializes when no limit is given
+    PREVIEW_MAX_PAGE_ROWS = 5000
+
+    # Recipe replays (see services/backends.py); per request with /preview?backend=...
+    EXECUTION_BACKEND = "pandas"    # "pandas" or "polars" (optional package, lazy multithreaded queries)
+
+    # Full-dataset (chunked) execution
+    EXECUTOR_CHUNK_ROWS = 100_000
+    QUANTILE_SKETCH_K = 4096        # Values kept per level by the quantile sketch
+    KNN_REFERENCE_ROWS = 5_000      # Rows sampled as the KNN neighbour pool
+    BOXCOX_SAMPLE_ROWS = 100_000    # Rows sampled to estimate the Box-Cox lambda
+
+    # Sample profiling (analyzer): columns per vectorised block, threads over blocks
+    ANALYZER_COLUMN_BLOCK = 256
+    ANALYZER_THREADS = min(4, os.cpu_count() or 1)
+
+    # Full-file profiling (analyzer, mode=full)
+    PROFILE_HLL_PRECISION = 14              # 16 KB per column, ~0.8% distinct-count error
+    PROFILE_TOP_K_CAPACITY = 1000           # Counters kept per categorical column
+    PROFILE_EXACT_DUPLICATE_ROWS = 5_000_000  # Row hashes kept for an exact duplicate count (40 MB)
+    PROFILE_DUPLICATE_HLL_PRECISION = 16
+
+    # Background jobs (full export / fit / profile)
+    JOB_WORKERS = 2                 # Processes in the job pool
+    JOB_TIME_LIMIT_SECONDS = 30 * 60
+    JOB_MEMORY_LIMIT_MB = 4096      # Extra address space a job may take (Linux only; None = off)
+    JOB_MAX_ATTEMPTS = 3            # A job interrupted by a restart is requeued this many times
+    JOB_MAX_TASKS_PER_CHILD = 20    # Workers are recycled so leaks cannot build up
 
 settings = Settings()
\ No newline at end of file
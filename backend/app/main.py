@@ -4,10 +4,13 @@ from contextlib import asynccontextmanager
 from app.config import settings
 from apscheduler.schedulers.background import BackgroundScheduler
 from app.services.cleanup import delete_old_sessions
+from app.services import jobs, preview_pool, session_manifest
 
 # --- PLACEHOLDERS FOR ROUTERS ---
 # We will uncomment these as we create the files in the next steps.
-from app.routers import upload, analysis, preview, export
+from app.routers import upload, analysis, preview, export, fitted
+from app.routers import jobs as jobs_router
+from app.routers import metrics as metrics_router
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -17,6 +20,8 @@ async def lifespan(app: FastAPI):
     # 1. STARTUP: Ensure storage exists
     print(f"🚀 Server Starting... Creating storage at: {settings.UPLOAD_DIR}")
     settings.UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    # Index the sessions left by a previous process (or from before the manifest)
+    session_manifest.sync()
     
     # 2. SCHEDULER: Start the cleanup job
     scheduler = BackgroundScheduler()
@@ -25,12 +30,20 @@ async def lifespan(app: FastAPI):
     # scheduler.add_job(delete_old_sessions, 'interval', seconds=15)
     scheduler.start()
     print("⏰ Cleanup Scheduler started (Running every 60 mins)")
+
+    # 3. JOBS: pick up work a previous process left unfinished
+    jobs.resume_jobs()
+
+    # 4. PREVIEW POOL: spawn and warm the workers for heavy preview steps
+    preview_pool.start()
     
     yield
     
-    # 3. SHUTDOWN: proper cleanup
+    # 5. SHUTDOWN: proper cleanup
     print("🛑 Server Stopping...")
     scheduler.shutdown() # Stop the scheduler cleanly
+    jobs.shutdown()
+    preview_pool.shutdown()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -60,6 +73,10 @@ app.include_router(upload.router, prefix="/api", tags=["Upload"])
 app.include_router(analysis.router, prefix="/api", tags=["Analysis"])
 app.include_router(preview.router, prefix="/api", tags=["Preview"])
 app.include_router(export.router, prefix="/api", tags=["Export"])
+app.include_router(fitted.router, prefix="/api", tags=["Fit"])
+app.include_router(jobs_router.router, prefix="/api", tags=["Jobs"])
+# Prometheus scrapes /metrics at the root, not under /api
+app.include_router(metrics_router.router, tags=["Metrics"])
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from typing import Dict, Optional, Any
+from app.models.recipe import Recipe
+
+class Job(BaseModel):
+    job_id: str
+    session_id: str
+    kind: str                       # "export", "fit" or "profile"
+    recipe: Recipe
+    status: str = "queued"          # queued -> running -> succeeded / failed / cancelled
+    progress: float = 0.0           # 0-100
+    message: str = ""
+    error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    attempts: int = 0               # Times a worker picked it up (restarts requeue running jobs)
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
\ No newline at end of file
@@ -1,12 +1,14 @@
 from pydantic import BaseModel
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Union
 
 class Step(BaseModel):
     id: str                 # Unique ID from frontend (e.g. "uuid-123")
     operation: str          # e.g. "impute", "standard_scaler", "drop"
-    column: str             # The target column
+    column: Union[str, List[str]] = ""  # The target column, or a list of them for a batched step
+    selector: Optional[str] = None      # Instead of `column`: "numeric", "categorical", "datetime", "all",
+                                        # "dtype:<name>" or "regex:<pattern>", matched when the step runs
     params: Dict[str, Any] = {}  # Flexible dict for extras like {"strategy": "median"}
 
 class Recipe(BaseModel):
     session_id: str
-    steps: List[Step]
\ No newline at end of file
+    steps: List[Step]
@@ -1,19 +1,56 @@
-from fastapi import APIRouter, HTTPException
+import time
+from fastapi import APIRouter, HTTPException, Request, Response
 from pathlib import Path
 from app.config import settings
-from app.services import analyzer
+from app.services import analysis_cache, analyzer, metrics, session_manifest
 
 router = APIRouter()
 
 @router.get("/analyze/{session_id}")
-def get_dataset_analysis(session_id: str):
-
+def get_dataset_analysis(session_id: str, request: Request, mode: str = "sample"):
+    """
+    mode=sample (default): exact profile of sample.csv.
+    mode=full: streamed, sketch-based profile of the whole original.csv.
+    Results are cached on disk per upload; the ETag lets the browser revalidate for free.
+    """
     session_dir = settings.UPLOAD_DIR / session_id
     sample_path = session_dir / "sample.csv"
     
     if not sample_path.exists():
         raise HTTPException(status_code=404, detail="Session not found or file missing.")
 
-    stats = analyzer.analyze_dataset(sample_path)
-    
-    return stats
\ No newline at end of file
+    if mode not in ["sample", "full"]:
+        raise HTTPException(status_code=400, detail="mode must be 'sample' or 'full'.")
+    if mode == "full" and not (session_dir / "original.csv").exists():
+        raise HTTPException(status_code=404, detail="Original file missing.")
+    session_manifest.touch(session_id)
+
+    started = time.perf_counter()
+
+    # 1. Cache hit: same content, same analyzer version
+    key = analysis_cache.content_key(session_dir, mode)
+    etag = f'"{key}"'
+    if request.headers.get("if-none-match") == etag:
+        metrics.ANALYZE_SECONDS.observe(time.perf_counter() - started, mode=mode, cache="etag")
+        return Response(status_code=304, headers={"ETag": etag})
+
+    cached = analysis_cache.load(session_dir, mode, key)
+    metrics.cache_lookup("analysis", cached is not None)
+    if cached is not None:
+        metrics.ANALYZE_SECONDS.observe(time.perf_counter() - started, mode=mode, cache="hit")
+        return Response(content=cached, media_type="application/json", headers={"ETag": etag})
+
+    # 2. Miss: profile, store, return
+    if mode == "full":
+        stats = analyzer.analyze_full_dataset(session_dir / "original.csv")
+    else:
+        stats = analyzer.analyze_dataset(sample_path)
+    metrics.ANALYZE_SECONDS.observe(time.perf_counter() - started, mode=mode, cache="miss")
+
+    if "error" in stats:
+        return stats
+
+    payload = analysis_cache.store(session_dir, mode, key, stats)
+    if payload is None:
+        return stats
+    return Response(content=payload, media_type="application/json", headers={"ETag": etag})
\ No newline at end of file
@@ -1,20 +1,38 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+from app.config import settings
 from app.models.recipe import Recipe
-from app.services import code_generator
+from app.services import code_generator, executor, session_manifest
 
 router = APIRouter()
 
 @router.post("/generate-code")
-def generate_code(recipe: Recipe):
+def generate_code(recipe: Recipe, mode: str = "memory", output_format: str = "csv"):
     """
     Converts the Recipe into a production-ready Python script.
+    mode="chunked" gives a streaming script for files that do not fit in memory
+    (fit passes over read_csv chunks, then chunk-by-chunk output, as CSV or Parquet).
+    mode="sklearn" gives a sklearn Pipeline that is fit once, saved with joblib and
+    reused on new files.
     """
+    if mode not in ["memory", "chunked", "sklearn"]:
+        raise HTTPException(status_code=400, detail="mode must be 'memory', 'chunked' or 'sklearn'.")
+    if output_format not in code_generator.OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"output_format must be one of {code_generator.OUTPUT_FORMATS}.")
+    if mode != "chunked" and output_format != "csv":
+        raise HTTPException(status_code=400, detail="Parquet output needs mode='chunked'.")
+
     try:
         # 1. Generate the massive "God-Mode" Script
-        script_content = code_generator.generate_pipeline_code(recipe)
+        if mode == "chunked":
+            script_content = code_generator.generate_chunked_pipeline_code(recipe, output_format)
+        elif mode == "sklearn":
+            script_content = code_generator.generate_sklearn_pipeline_code(recipe)
+        else:
+            script_content = code_generator.generate_pipeline_code(recipe)
         
         # 2. Get the list of libraries (xgboost, lightgbm, etc.)
-        requirements = code_generator.get_requirements()
+        requirements = code_generator.get_requirements(output_format)
         
         # 3. Return everything needed for the Frontend Code Editor
         return {
@@ -28,4 +46,35 @@ def generate_code(recipe: Recipe):
     except Exception as e:
         # If the generator crashes, tell us why
         print(f"Error generating code: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/export/full")
+def run_full_dataset(recipe: Recipe):
+    """
+    Runs the Recipe over the FULL original upload (chunked, bounded memory)
+    and stores the result for download.
+    """
+    source_path = settings.UPLOAD_DIR / recipe.session_id / "original.csv"
+    if not source_path.exists():
+        raise HTTPException(status_code=404, detail="Session expired or not found.")
+
+    session_manifest.touch(recipe.session_id)
+    result = executor.run_recipe_on_file(recipe)
+    session_manifest.refresh_size(recipe.session_id)
+
+    return {
+        "status": "success",
+        "rows_in": result["rows_in"],
+        "rows_out": result["rows_out"],
+        "columns": result["columns"],
+        "download_url": f"/api/export/download/{recipe.session_id}"
+    }
+
+@router.get("/export/download/{session_id}")
+def download_processed(session_id: str):
+    output_path = settings.UPLOAD_DIR / session_id / "processed.csv"
+    if not output_path.exists():
+        raise HTTPException(status_code=404, detail="No processed file for this session. Run the full export first.")
+    session_manifest.touch(session_id)
+
+    return FileResponse(output_path, media_type="text/csv", filename="processed_data.csv")
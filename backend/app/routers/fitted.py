@@ -0,0 +1,76 @@
+from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi.responses import FileResponse
+import pandas as pd
+from app.config import settings
+from app.models.recipe import Recipe
+from app.services import executor, file_manager, fitting, recipe_cache, session_manifest
+from app.services.fitting import FittedRecipe
+
+router = APIRouter()
+
+@router.post("/fit")
+def fit_recipe(recipe: Recipe, source: str = "full"):
+    """
+    Fits every step once and stores the learned parameters in the session.
+    source="full" streams original.csv, source="sample" uses the 1000-row sample.
+    """
+    session_dir = settings.UPLOAD_DIR / recipe.session_id
+    if not (session_dir / "original.csv").exists():
+        raise HTTPException(status_code=404, detail="Session expired or not found.")
+    session_manifest.touch(recipe.session_id)
+
+    if source == "full":
+        fitted = executor.fit_file(recipe)
+    elif source == "sample":
+        df = recipe_cache.load_sample(recipe.session_id)
+        fitted = fitting.fit(df, recipe)
+        fitted.save(session_dir)
+    else:
+        raise HTTPException(status_code=400, detail="source must be 'full' or 'sample'.")
+    session_manifest.refresh_size(recipe.session_id)
+
+    return {
+        "status": "success",
+        "fitted_on": fitted.fitted_on,
+        "steps": [
+            {"id": step.id, "operation": step.operation, "params": params}
+            for step, params in zip(fitted.steps, fitted.params)
+        ]
+    }
+
+@router.get("/fit/{session_id}")
+def get_fitted_recipe(session_id: str):
+    fitted = FittedRecipe.load(settings.UPLOAD_DIR / session_id)
+    if fitted is None:
+        raise HTTPException(status_code=404, detail="No fitted recipe for this session. Call /fit first.")
+    session_manifest.touch(session_id)
+    return fitted
+
+@router.post("/fit/{session_id}/transform")
+def transform_new_file(session_id: str, file: UploadFile = File(...)):
+    """
+    Applies the stored FittedRecipe to a new CSV (test set, fresh batch...)
+    without refitting anything, and returns the transformed CSV.
+    """
+    session_dir = settings.UPLOAD_DIR / session_id
+    fitted = FittedRecipe.load(session_dir)
+    if fitted is None:
+        raise HTTPException(status_code=404, detail="No fitted recipe for this session. Call /fit first.")
+    if not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="Only CSV files are allowed.")
+    session_manifest.touch(session_id)
+
+    # Text columns as in the training data, so encoders see the same value types;
+    # numeric ones are inferred, a new file may well have missing values where the sample had none
+    chunks = pd.read_csv(file.file, chunksize=settings.EXECUTOR_CHUNK_ROWS,
+                         dtype=file_manager.full_read_dtypes(session_dir))
+    output_path = session_dir / "transformed.csv"
+    try:
+        executor.transform_to_csv(fitted, chunks, output_path)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"File is not a valid CSV: {str(e)}")
+    finally:
+        file.file.close()
+    session_manifest.refresh_size(session_id)
+
+    return FileResponse(output_path, media_type="text/csv", filename="transformed_data.csv")
@@ -0,0 +1,70 @@
+from fastapi import APIRouter, HTTPException, Response
+from fastapi.responses import FileResponse
+from app.config import settings
+from app.models.recipe import Recipe
+from app.services import analysis_cache, jobs, session_manifest
+from app.services.fitting import FittedRecipe
+
+router = APIRouter()
+
+@router.post("/jobs")
+def submit_job(recipe: Recipe, kind: str = "export"):
+    """
+    Queues full-data work on the job pool and returns at once.
+    kind="export" runs the recipe over original.csv, "fit" fits it, "profile" profiles the file.
+    Poll GET /jobs/{session_id}/{job_id} for status and progress.
+    """
+    if kind not in jobs.JOB_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {jobs.JOB_KINDS}.")
+    if not (settings.UPLOAD_DIR / recipe.session_id / "original.csv").exists():
+        raise HTTPException(status_code=404, detail="Session expired or not found.")
+
+    session_manifest.touch(recipe.session_id)
+    return jobs.submit_job(recipe, kind)
+
+@router.get("/jobs/{session_id}")
+def list_jobs(session_id: str):
+    return jobs.list_jobs(settings.UPLOAD_DIR / session_id)
+
+@router.get("/jobs/{session_id}/{job_id}")
+def get_job(session_id: str, job_id: str):
+    job = jobs.read_job(settings.UPLOAD_DIR / session_id, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    # The frontend polls this while a job runs: the session is in use
+    session_manifest.touch(session_id)
+    return job
+
+@router.post("/jobs/{session_id}/{job_id}/cancel")
+def cancel_job(session_id: str, job_id: str):
+    job = jobs.cancel_job(settings.UPLOAD_DIR / session_id, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+@router.get("/jobs/{session_id}/{job_id}/result")
+def get_job_result(session_id: str, job_id: str):
+    session_dir = settings.UPLOAD_DIR / session_id
+    job = jobs.read_job(session_dir, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}, no result yet.")
+    session_manifest.touch(session_id)
+
+    if job.kind == "export":
+        path = jobs.output_path(session_dir, job_id)
+        if not path.exists():
+            raise HTTPException(status_code=404, detail="Result file is gone.")
+        return FileResponse(path, media_type="text/csv", filename="processed_data.csv")
+
+    if job.kind == "fit":
+        fitted = FittedRecipe.load(session_dir)
+        if fitted is None:
+            raise HTTPException(status_code=404, detail="Fitted recipe is gone.")
+        return fitted
+
+    cached = analysis_cache.load(session_dir, "full", analysis_cache.content_key(session_dir, "full"))
+    if cached is None:
+        raise HTTPException(status_code=404, detail="Profile is gone (file re-uploaded?).")
+    return Response(content=cached, media_type="application/json")
\ No newline at end of file
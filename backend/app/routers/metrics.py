@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Response
+from app.services import metrics, recipe_cache
+
+router = APIRouter()
+
+@router.get("/metrics")
+def get_metrics():
+    """
+    Prometheus text format: per-operation step histograms, preview / analyze
+    latency, upload sizes and cache hit/miss counters (this process only).
+    """
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.get("/metrics/cache")
+def get_cache_stats():
+    """The process-wide session cache: bytes held against the budget, evictions, hits and misses."""
+    return recipe_cache.stats()
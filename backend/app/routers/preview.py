@@ -1,55 +1,111 @@
-from fastapi import APIRouter, HTTPException
-import pandas as pd
+import time
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException
 from app.config import settings
 from app.models.recipe import Recipe
-from app.services import transformer
-import numpy as np
+from app.services import backends, metrics, planner, preview_format, preview_pool, recipe_cache, session_manifest
 
 router = APIRouter()
 
 @router.post("/preview")
-def preview_pipeline(recipe: Recipe):
+def preview_pipeline(recipe: Recipe, offset: int = 0, limit: Optional[int] = None, profile: bool = False,
+                     backend: Optional[str] = None, accept: Optional[str] = Header(default=None)):
     """
     Loads the session's SAMPLE csv, applies steps, returns transformed data.
+
+    Only rows [offset, offset + limit) are serialized (default: the first PREVIEW_PAGE_ROWS).
+    The format follows the Accept header (see services/preview_format.py):
+    application/json (records, default), application/vnd.prima.columns+json
+    (one list per column) or application/vnd.apache.arrow.stream (Arrow IPC).
+    profile=true adds per-step timings, memory and row/column changes ("profile").
+    backend picks the execution backend (default: settings.EXECUTION_BACKEND, see
+    services/backends.py); only the pandas one has per-step timeouts, caching and profiles.
     """
+    started = time.perf_counter()
+    limit = settings.PREVIEW_PAGE_ROWS if limit is None else limit
+    if offset < 0 or not 1 <= limit <= settings.PREVIEW_MAX_PAGE_ROWS:
+        raise HTTPException(status_code=400,
+                            detail=f"offset must be >= 0 and limit between 1 and {settings.PREVIEW_MAX_PAGE_ROWS}.")
+    try:
+        engine = backends.get_backend(backend)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     # 1. Find the file
     session_dir = settings.UPLOAD_DIR / recipe.session_id
     sample_path = session_dir / "sample.csv"
     
     if not sample_path.exists():
         raise HTTPException(status_code=404, detail="Session expired or not found.")
+    session_manifest.touch(recipe.session_id)
 
     # 2. Load the CLEAN sample (Replay Strategy)
+    # The process-wide session cache keeps the raw sample and every intermediate frame,
+    # so an edit near the end of the recipe only replays the tail.
     try:
-        df = pd.read_csv(sample_path)
+        df = recipe_cache.load_sample(recipe.session_id)
     except Exception:
         raise HTTPException(status_code=500, detail="Could not read sample file.")
+    cache = recipe_cache.get_session_cache(recipe.session_id, sample_path)
 
-    # 3. Apply the Recipe
-    df_transformed = transformer.apply_recipe(df, recipe)
-    
-    # --- SAFETY FIXES FOR JSON RESPONSE ---
-    
-    # 1. Handle Infinity: Math ops (like Log/Division) can create 'inf'. 
-    # JSON cannot handle 'inf', so we replace it with None or a high number.
-    df_transformed = df_transformed.replace([np.inf, -np.inf], None)
-
-    # 2. Handle NaN: You already have this, keep it!
-    df_clean = df_transformed.replace({np.nan: None})
-
-    # 3. Handle Dates: If you kept a Date column (drop_original=False), 
-    # Pandas Timestamps sometimes break FastAPI JSON serialization.
-    # Convert any remaining datetime columns to strings just to be safe.
-    for col in df_clean.select_dtypes(include=['datetime', 'datetimetz']).columns:
-        df_clean[col] = df_clean[col].astype(str)
-    
-    return {
+    # 3. Plan: prune/reorder the steps, keep only the source columns they need
+    plan = planner.optimize(recipe.steps, list(df.columns))
+    if plan.columns is not None:
+        df = df[plan.columns]
+    planned = Recipe(session_id=recipe.session_id, steps=plan.steps)
+
+    # 4. Apply the plan (heavy steps run in the preview process pool)
+    profiler = metrics.StepProfiler(detailed=profile)
+    try:
+        if engine.name == "pandas":
+            df_transformed, timed_out_step, completed = preview_pool.apply_recipe(
+                df, planned, cache, source_key=recipe_cache.projection_key(plan.columns), profiler=profiler)
+        else:
+            # One query for the whole plan: no per-step cache, timeout or profile
+            df_transformed, timed_out_step, completed = engine.apply_recipe(df, planned), None, len(planned.steps)
+    finally:
+        profiler.close()
+
+    # 5. Only the requested page is sanitized (inf/NaN/dates) and serialized
+    rows = preview_format.page(df_transformed, offset, limit)
+    meta = {
         "status": "success",
         "rows": len(df_transformed),
-        "columns": list(df_transformed.columns),
-        "data": df_clean.head(100).to_dict(orient="records")
+        "offset": offset,
+        "limit": limit,
+        "columns": [str(col) for col in df_transformed.columns],
+        "backend": engine.name,
     }
 
+    # Too slow: show what is done and say which step is still running
+    if timed_out_step is not None:
+        meta["status"] = "partial"
+        meta["timed_out_step"] = timed_out_step.id
+        meta["completed_steps"] = completed
+        meta["message"] = (f"Step '{timed_out_step.operation}' did not finish within "
+                           f"{settings.PREVIEW_TIMEOUT_SECONDS}s; showing the result of the first {completed} steps.")
+
+    if profile:
+        meta["profile"] = profiler.entries
+
+    response = preview_format.respond(preview_format.negotiate(accept), meta, rows)
+    metrics.PREVIEW_SECONDS.observe(time.perf_counter() - started, status=meta["status"])
+    return response
+
+@router.post("/plan/explain")
+def explain_plan(recipe: Recipe):
+    """
+    Shows what the planner does with the recipe: the optimized steps, the
+    source columns that get loaded, and every rewrite with its reason.
+    """
+    schema = recipe_cache.load_schema(recipe.session_id)
+    if schema is None:
+        raise HTTPException(status_code=404, detail="Session expired or not found.")
+    session_manifest.touch(recipe.session_id)
+
+    plan = planner.optimize(recipe.steps, [c["name"] for c in schema["columns"]])
+    return plan.explain()
+
 @router.get("/options")
 def get_pipeline_options():
     return {
@@ -246,5 +302,8 @@ def get_pipeline_options():
                     {"name": "target_col", "type": "column_select", "label": "Target Variable (e.g. SalePrice)"}
                 ]
             }
-        ]
+        ],
+        # Execution backends installed on this server (/preview?backend=...)
+        "backends": backends.available_backends(),
+        "default_backend": settings.EXECUTION_BACKEND,
     }
\ No newline at end of file
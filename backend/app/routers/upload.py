@@ -1,15 +1,27 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, Request
 from app.services import file_manager
 
 router = APIRouter()
 
 @router.post("/upload/{session_id}")
-async def upload_dataset(session_id: str, file: UploadFile = File(...)):
-
-    if not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="Only CSV files are allowed.")
+async def upload_dataset(session_id: str, request: Request, background_tasks: BackgroundTasks,
+                         sample_size: Optional[int] = None, sampling: str = "reservoir",
+                         stratify_by: Optional[str] = None, seed: Optional[int] = None):
+    """
+    Expects multipart/form-data with a "file" field (CSV).
+    The body is streamed: nothing is spooled in memory or read back from disk.
 
+    Sampling (query params):
+    - sampling: "reservoir" (default, uniform over the whole file), "stratified" or "head"
+    - stratify_by: column to stratify on (required for "stratified")
+    - sample_size: rows in the sample (default SAMPLE_ROWS)
+    - seed: makes the sample reproducible; a random one is picked and returned otherwise
+    """
     # 2. Call the Service (The Logic)
-    result = file_manager.save_upload_and_create_sample(session_id, file)
-    
+    result = await file_manager.save_upload_and_create_sample(
+        session_id, request, background_tasks,
+        sample_size=sample_size, sampling=sampling, stratify_by=stratify_by, seed=seed,
+    )
+
     return result
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""
+On-disk cache of analyzer results, one JSON file per profiled file and mode.
+
+The key is the content hash of the profiled file plus ANALYZER_VERSION, so a
+re-upload or an analyzer change never serves a stale profile. Sessions whose
+files are in the blob store share their profiles through it. A hit returns the
+stored bytes as-is: no profiling, no JSON parsing.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+from app.services import file_manager
+
+# Bump whenever the analyzer output changes for the same input
+ANALYZER_VERSION = "3"
+
+ANALYSIS_SOURCES = {
+    # mode: (profiled file, hash field written at upload)
+    "sample": ("sample.csv", "sample_sha256"),
+    "full": ("original.csv", "sha256"),
+}
+
+def _cache_files(session_dir: Path, mode: str, shared: bool = True):
+    # Next to the profiled file: in the blob store when the session links there (see
+    # blob_store.py), so every session with the same data shares one profile
+    folder = (session_dir / ANALYSIS_SOURCES[mode][0]).resolve().parent if shared else session_dir
+    return folder / f"analysis_{mode}.json", folder / f"analysis_{mode}.key"
+
+def content_key(session_dir: Path, mode: str) -> str:
+    """Hash recorded at upload time; falls back to hashing the file for older sessions."""
+    data_file, field = ANALYSIS_SOURCES[mode]
+    meta_file = file_manager.SAMPLE_META_FILE if mode == "sample" else file_manager.UPLOAD_META_FILE
+    digest = None
+    try:
+        digest = json.loads((session_dir / meta_file).read_text()).get(field)
+    except (OSError, ValueError):
+        pass
+
+    if not digest:
+        hasher = hashlib.sha256()
+        with (session_dir / data_file).open("rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(block)
+        digest = hasher.hexdigest()
+
+    return f"{mode}-{digest[:32]}-v{ANALYZER_VERSION}"
+
+def load(session_dir: Path, mode: str, key: str) -> Optional[bytes]:
+    result_file, key_file = _cache_files(session_dir, mode)
+    try:
+        if key_file.read_text() == key:
+            return result_file.read_bytes()
+    except OSError:
+        pass
+    return None
+
+def store(session_dir: Path, mode: str, key: str, result: dict) -> Optional[bytes]:
+    """Writes the result and returns its bytes; results that are not strict JSON are not cached."""
+    try:
+        payload = json.dumps(result, allow_nan=False).encode()
+    except (TypeError, ValueError):
+        return None
+
+    result_file, key_file = _cache_files(session_dir, mode)
+    # Key last: a crash in between leaves no key, i.e. a miss, never a wrong hit
+    key_file.unlink(missing_ok=True)
+    tmp = result_file.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_bytes(payload)
+    tmp.replace(result_file)
+    key_file.write_text(key)
+    return payload
+
+def invalidate(session_dir: Path):
+    # The session's own files only: shared profiles are keyed by content and stay valid
+    for mode in ANALYSIS_SOURCES:
+        for path in _cache_files(session_dir, mode, shared=False):
+            path.unlink(missing_ok=True)
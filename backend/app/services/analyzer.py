@@ -1,89 +1,341 @@
 import pandas as pd
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Callable, Optional
+from app.config import settings
+from app.services import dtypes, file_manager, recipe_cache
+from app.services.sketches import HeavyHitters, HyperLogLog, QuantileSketch, RunningMoments
+
+HISTOGRAM_BINS = 10
+TOP_CATEGORIES = 20
 
 def analyze_dataset(sample_path: Path):
 
+    session_dir = sample_path.parent
+    # An upload session's sample comes from the process-wide cache it shares with /preview
+    in_session = session_dir.parent == settings.UPLOAD_DIR
     try:
-        df = pd.read_csv(sample_path)
+        df = recipe_cache.load_sample(session_dir.name) if in_session else file_manager.read_dataset(sample_path)
     except Exception:
         return {"error": "Could not read sample file."}
-    
+
+    result = {"filename": sample_path.name, **profile_frame(df)}
+    # memory_usage is the narrowed frame; the upload's report has the read_csv size next to it
+    schema = (recipe_cache.load_schema(session_dir.name) if in_session else file_manager.read_schema(session_dir)) or {}
+    if "memory" in schema:
+        result["memory"] = schema["memory"]
+    return result
+
+def profile_frame(df: pd.DataFrame) -> dict:
+    """
+    Profiles an in-memory frame. Missing counts, uniques and numeric stats are
+    computed frame-wide per block of columns; each categorical column is counted once.
+    Blocks of columns run in a thread pool (pandas/numpy release the GIL in these loops).
+    """
     total_rows = len(df)
     
     # --- FIX: Cast numpy types to standard Python int ---
-    memory_usage = int(df.memory_usage(deep=True).sum()) 
     duplicate_rows = int(df.duplicated().sum())
     # ----------------------------------------------------
 
-    column_stats = []
+    block = settings.ANALYZER_COLUMN_BLOCK
+    blocks = [df.iloc[:, i:i + block] for i in range(0, df.shape[1], block)]
+    if len(blocks) > 1 and settings.ANALYZER_THREADS > 1:
+        with ThreadPoolExecutor(max_workers=settings.ANALYZER_THREADS) as pool:
+            results = list(pool.map(lambda part: _profile_block(part, total_rows), blocks))
+    else:
+        results = [_profile_block(part, total_rows) for part in blocks]
 
-    for col in df.columns:
-        col_type = "numeric" if np.issubdtype(df[col].dtype, np.number) else "categorical"
-        
-        # Cast to standard int/float here as well just to be safe
-        missing_count = int(df[col].isna().sum())
-        missing_percentage = round((missing_count / total_rows) * 100, 1)
-        unique_count = int(df[col].nunique())
+    # Deep memory usage is measured per block, inside the pool
+    memory_usage = int(df.index.memory_usage(deep=True)) + sum(part_memory for _, part_memory in results)
 
-        stat_item = {
+    return {
+        "total_rows": total_rows,
+        "total_cols": len(df.columns),
+        "memory_usage": memory_usage,
+        "duplicate_rows": duplicate_rows,
+        "columns": [stat_item for part, _ in results for stat_item in part]
+    }
+
+def _profile_block(block: pd.DataFrame, total_rows: int) -> tuple:
+    # 1. Frame-wide counts (uniques: sorted-array count for numeric, value_counts for the rest)
+    missing = block.isna().sum().to_numpy()
+    is_numeric = [dtypes.is_number(dtype) for dtype in block.dtypes]
+    unique = np.zeros(block.shape[1], dtype="int64")
+
+    column_stats = []
+    for j, col in enumerate(block.columns):
+        # Cast to standard int/float here as well just to be safe
+        missing_count = int(missing[j])
+        column_stats.append({
             "name": col,
-            "type": col_type,
+            "type": "numeric" if is_numeric[j] else "categorical",
             "missing": missing_count,
-            "missing_pct": missing_percentage,
-            "unique": unique_count,
-            "distribution": [] 
-        }
+            "missing_pct": round((missing_count / total_rows) * 100, 1) if total_rows else 0.0,
+            "unique": 0,
+            "distribution": []
+        })
+
+    # 2. Numeric stats for all numeric columns of the block at once
+    numeric_pos = [j for j, flag in enumerate(is_numeric) if flag]
+    if numeric_pos:
+        num = block.iloc[:, numeric_pos]
+        unique[numeric_pos] = _count_unique(num.to_numpy(dtype="float64"))
+        _numeric_stats(num, [column_stats[j] for j in numeric_pos])
+
+    # 3. Categorical: one value_counts per column gives top value, freq, distribution (and uniques)
+    for j, flag in enumerate(is_numeric):
+        if not flag:
+            unique[j] = _categorical_stats(block.iloc[:, j], column_stats[j])
+
+    for j, stat_item in enumerate(column_stats):
+        stat_item["unique"] = int(unique[j])
+
+    return column_stats, int(block.memory_usage(deep=True, index=False).sum())
+
+def _count_unique(values: np.ndarray) -> np.ndarray:
+    """Distinct non-NaN values per column of a 2-D array (NaN sorts last)."""
+    if values.shape[0] == 0:
+        return np.zeros(values.shape[1], dtype="int64")
+    ordered = np.sort(values, axis=0)
+    valid = ~np.isnan(ordered)
+    changes = np.diff(ordered, axis=0) != 0
+    return valid[:1].sum(axis=0) + (changes & valid[1:]).sum(axis=0)
+
+def _numeric_stats(num: pd.DataFrame, stat_items: list):
+    means, medians, stds = num.mean().to_numpy(), num.median().to_numpy(), num.std().to_numpy()
+    mins, maxs = num.min().to_numpy(dtype="float64"), num.max().to_numpy(dtype="float64")
+    counts = _histograms(num.to_numpy(dtype="float64"), mins, maxs)
+
+    for j, stat_item in enumerate(stat_items):
+        if np.isnan(mins[j]):
+            continue  # All values missing
+        # Explicit float() casting for all stats
+        stat_item["mean"] = round(float(means[j]), 2)
+        stat_item["median"] = round(float(medians[j]), 2)
+        # One value has no std: None, like the other stats JSON cannot hold
+        stat_item["std_dev"] = None if np.isnan(stds[j]) else round(float(stds[j]), 2)
+        stat_item["min"] = round(float(mins[j]), 2)
+        stat_item["max"] = round(float(maxs[j]), 2)
+
+        # Histogram
+        edges, hist = counts[j]
+        for i in range(len(hist)):
+            label = f"{edges[i]:.1f}-{edges[i+1]:.1f}"
+            stat_item["distribution"].append({
+                "label": label,
+                "value": int(hist[i]) # Cast numpy int to python int
+            })
+
+def _histograms(values: np.ndarray, mins: np.ndarray, maxs: np.ndarray, bins: int = HISTOGRAM_BINS) -> list:
+    """
+    np.histogram(column, bins=10) for every column of a 2-D array in one go,
+    using the same edges and the same edge corrections as numpy's fast path.
+    """
+    n_rows, n_cols = values.shape
+    first = np.where(mins == maxs, mins - 0.5, mins)
+    last = np.where(mins == maxs, maxs + 0.5, maxs)
+    edges = np.linspace(first, last, bins + 1, axis=1)         # (cols, bins + 1)
+
+    valid = ~np.isnan(values)
+    col_idx = np.broadcast_to(np.arange(n_cols), values.shape)[valid]
+    x = values[valid]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        idx = (((x - first[col_idx]) / (last - first)[col_idx]) * bins).astype(np.intp)
+    idx[idx == bins] -= 1
+    idx[x < edges[col_idx, idx]] -= 1
+    idx[(x >= edges[col_idx, idx + 1]) & (idx != bins - 1)] += 1
+
+    flat = np.bincount(col_idx * bins + idx, minlength=n_cols * bins).reshape(n_cols, bins)
+    return [(edges[j], flat[j]) for j in range(n_cols)]
+
+def _categorical_stats(series: pd.Series, stat_item: dict) -> int:
+    """Fills top value / freq / distribution and returns the column's unique count."""
+    clean_series = series.dropna()
+    is_text = pd.api.types.infer_dtype(clean_series, skipna=False) == "string"
+    unique = None if is_text else int(clean_series.nunique())
+    if not is_text:
+        clean_series = clean_series.astype(str)
+    if clean_series.empty:
+        return 0
 
-        # --- NUMERIC STATS ---
-        if col_type == "numeric":
-            clean_series = df[col].dropna()
-            if not clean_series.empty:
-                # Explicit float() casting for all stats
-                stat_item["mean"] = round(float(clean_series.mean()), 2)
-                stat_item["median"] = round(float(clean_series.median()), 2)
-                stat_item["std_dev"] = round(float(clean_series.std()), 2)
-                stat_item["min"] = round(float(clean_series.min()), 2)
-                stat_item["max"] = round(float(clean_series.max()), 2)
-
-                # Histogram
-                counts, bin_edges = np.histogram(clean_series, bins=10)
-                for i in range(len(counts)):
-                    label = f"{bin_edges[i]:.1f}-{bin_edges[i+1]:.1f}"
-                    stat_item["distribution"].append({
-                        "label": label,
-                        "value": int(counts[i]) # Cast numpy int to python int
-                    })
-        
-        # --- CATEGORICAL STATS ---
+    # value_counts() sorts by frequency descending; the mode is the smallest of the top ties
+    counts = clean_series.value_counts()
+    freq = int(counts.iloc[0])
+    stat_item["top_value"] = str(min(counts.index[counts.to_numpy() == freq]))
+    stat_item["freq"] = freq
+
+    # --- FIX: Show Top 20 instead of 10 ---
+    for cat_name, count in counts.head(TOP_CATEGORIES).items():
+        stat_item["distribution"].append({
+            "label": str(cat_name),
+            "value": int(count) 
+        })
+
+    return len(counts) if unique is None else unique
+
+# ====================================================
+#  FULL-FILE PROFILE (streamed, sketch based)
+# ====================================================
+
+class _ColumnProfile:
+    """Constant-memory accumulator for one column; same output shape as the sample profile."""
+
+    def __init__(self, numeric: bool):
+        self.numeric = numeric
+        self.missing = 0
+        self.distinct = HyperLogLog(settings.PROFILE_HLL_PRECISION)
+        if numeric:
+            self.moments = RunningMoments()
+            self.quantiles = QuantileSketch(settings.QUANTILE_SKETCH_K)
+        else:
+            self.top = HeavyHitters(settings.PROFILE_TOP_K_CAPACITY)
+
+    def update(self, series: pd.Series):
+        self.missing += int(series.isna().sum())
+        self.distinct.update(series)
+
+        clean_series = series.dropna()
+        if self.numeric:
+            values = pd.to_numeric(clean_series, errors="coerce").to_numpy(dtype="float64")
+            self.moments.update(values)
+            self.quantiles.update(values)
         else:
-            clean_series = df[col].dropna().astype(str)
-            if not clean_series.empty:
-                # Top Value Logic
-                top_val = clean_series.mode().iloc[0] if not clean_series.mode().empty else "N/A"
-                freq = int(clean_series.value_counts().iloc[0]) if not clean_series.value_counts().empty else 0
-                
-                stat_item["top_value"] = str(top_val)
-                stat_item["freq"] = freq
-
-                # --- FIX: Show Top 20 instead of 10 ---
-                # value_counts() sorts by frequency descending by default.
-                # .head(20) will take the top 20. If there are less than 20, it takes all.
-                top_counts = clean_series.value_counts().head(20)
-                
-                for cat_name, count in top_counts.items():
-                    stat_item["distribution"].append({
-                        "label": str(cat_name),
-                        "value": int(count) 
-                    })
-
-        column_stats.append(stat_item)
+            self.top.update(clean_series.astype(str))
+
+    def result(self, name: str, total_rows: int) -> dict:
+        stat_item = {
+            "name": name,
+            "type": "numeric" if self.numeric else "categorical",
+            "missing": self.missing,
+            "missing_pct": round((self.missing / total_rows) * 100, 1) if total_rows else 0.0,
+            "unique": self.distinct.count(),
+            "distribution": []
+        }
+
+        if self.numeric and self.moments.count:
+            m = self.moments
+            stat_item["mean"] = round(float(m.mean), 2)
+            stat_item["median"] = round(self.quantiles.quantile(0.5), 2)
+            stat_item["std_dev"] = round(m.std(), 2) if m.count > 1 else None
+            stat_item["min"] = round(float(m.min), 2)
+            stat_item["max"] = round(float(m.max), 2)
+
+            # Same bins as np.histogram(bins=10): [a, b) except the last one, which is closed
+            lo, hi = (m.min, m.max) if m.min != m.max else (m.min - 0.5, m.max + 0.5)
+            edges = np.linspace(lo, hi, HISTOGRAM_BINS + 1)
+            below = self.quantiles.cdf(edges[1:-1], strict=True) * m.count
+            counts = np.diff(np.concatenate([[0.0], below, [m.count]]))
+            for i in range(HISTOGRAM_BINS):
+                stat_item["distribution"].append({
+                    "label": f"{edges[i]:.1f}-{edges[i+1]:.1f}",
+                    "value": int(round(counts[i]))
+                })
+
+        elif not self.numeric and not self.top.counts.empty:
+            top_counts = self.top.top(TOP_CATEGORIES)
+            stat_item["top_value"] = str(self.top.mode())
+            stat_item["freq"] = int(top_counts.iloc[0])
+            for cat_name, count in top_counts.items():
+                stat_item["distribution"].append({
+                    "label": str(cat_name),
+                    "value": int(count)
+                })
+
+        return stat_item
+
+    @property
+    def approximate(self) -> bool:
+        if self.numeric:
+            return not self.quantiles.is_exact
+        return not self.top.is_exact
+
+class _DuplicateCounter:
+    """
+    Counts repeated rows by their 64-bit hash. Exact while the seen hashes fit in
+    PROFILE_EXACT_DUPLICATE_ROWS (8 bytes each); past that, rows minus a HyperLogLog
+    estimate of the distinct rows.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.duplicates = 0
+        self.exact = True
+        self.seen = np.empty(0, dtype="uint64")
+        self.distinct = HyperLogLog(settings.PROFILE_DUPLICATE_HLL_PRECISION)
+
+    def update(self, df: pd.DataFrame):
+        hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        self.rows += len(hashes)
+        self.distinct.update_hashes(hashes)
+        if not self.exact:
+            return
+
+        repeated = pd.Series(hashes).duplicated().to_numpy() | np.isin(hashes, self.seen)
+        self.duplicates += int(repeated.sum())
+        self.seen = np.union1d(self.seen, hashes[~repeated])
+        if self.seen.size > settings.PROFILE_EXACT_DUPLICATE_ROWS:
+            self.exact = False
+            self.seen = np.empty(0, dtype="uint64")
+
+    def count(self) -> int:
+        if self.exact:
+            return self.duplicates
+        return max(self.rows - self.distinct.count(), 0)
+
+def analyze_full_dataset(csv_path: Path, on_progress: Optional[Callable[[int, int], None]] = None):
+    """
+    Profiles the whole uploaded file in one streamed pass. Memory per column is
+    constant (sketches), so the file size only affects the run time.
+    Counts of rows and missing values are exact; distinct counts are HyperLogLog
+    estimates, and quantiles / top categories are exact until their sketch fills up.
+    """
+    total_rows = 0
+    memory_usage = 0
+    profiles = {}
+    duplicates = _DuplicateCounter()
+    expected_rows = max(file_manager.read_upload_meta(csv_path.parent).get("rows", 0), 1)
+
+    chunks = file_manager.iter_dataset_chunks(csv_path, settings.EXECUTOR_CHUNK_ROWS)
+    while True:
+        # Only read errors become an error result; on_progress may raise on purpose (job cancel)
+        try:
+            chunk = next(chunks, None)
+        except Exception as e:
+            print(f"⚠️ Full profile failed for {csv_path.name}: {e}")
+            return {"error": "Could not read the uploaded file."}
+        if chunk is None:
+            break
+
+        total_rows += len(chunk)
+        memory_usage += int(chunk.memory_usage(deep=True, index=False).sum())
+        # Sketches hash values: chunks must agree on dtypes, whatever each one got narrowed to
+        chunk = dtypes.widen(chunk)
+
+        if not profiles:
+            for col in chunk.columns:
+                profiles[col] = _ColumnProfile(np.issubdtype(chunk[col].dtype, np.number))
+
+        duplicates.update(chunk)
+        for col, profile in profiles.items():
+            profile.update(chunk[col])
+        if on_progress:
+            on_progress(min(total_rows, expected_rows), expected_rows)
+
+    approximate = ["unique"]
+    if not duplicates.exact:
+        approximate.append("duplicate_rows")
+    approximate += [f"columns.{col}" for col, profile in profiles.items() if profile.approximate]
 
     return {
-        "filename": sample_path.name,
+        "filename": csv_path.name,
+        "mode": "full",
         "total_rows": total_rows,
-        "total_cols": len(df.columns),
+        "total_cols": len(profiles),
         "memory_usage": memory_usage,
-        "duplicate_rows": duplicate_rows,
-        "columns": column_stats
-    }
\ No newline at end of file
+        "duplicate_rows": duplicates.count(),
+        "approximate": approximate,
+        "columns": [profile.result(col, total_rows) for col, profile in profiles.items()]
+    }
@@ -0,0 +1,244 @@
+"""
+Execution backends for recipe replays.
+
+- pandas (default): transformer.apply_recipe, one step at a time. The preview adds
+  its prefix cache, lineage reuse and process pool on top of it.
+- polars: runs of steps it can express are lowered into ONE lazy query (filters,
+  fills, group fills, date parts, scalers...), which Polars optimizes and runs on
+  all cores. A step it cannot express (KNN, Box-Cox, binning, encoders that need
+  the category list...) runs on pandas in between, so every recipe runs.
+  Needs the optional `polars` package.
+
+Both give the same values up to float rounding (benchmarks/backends.py checks it
+op by op). Dtypes can differ where pandas keeps an integer column that Polars
+widens (e.g. a fill on an integer column without missing values).
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.config import settings
+from app.models.recipe import Recipe, Step
+from app.services import transformer
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+class ExecutionBackend:
+    name = ""
+
+    def available(self) -> bool:
+        return True
+
+    def apply_recipe(self, df: pd.DataFrame, recipe: Recipe) -> pd.DataFrame:
+        """The recipe's result on a copy of `df` (the input is never modified)."""
+        raise NotImplementedError
+
+class PandasBackend(ExecutionBackend):
+    name = "pandas"
+
+    def apply_recipe(self, df: pd.DataFrame, recipe: Recipe) -> pd.DataFrame:
+        return transformer.apply_recipe(df, recipe)
+
+# ====================================================
+#  POLARS: LOWERING
+# ====================================================
+# Each function returns the lazy frame with the step applied, or None when the
+# step cannot be expressed (it then runs on pandas). They mirror transformer.apply_step.
+
+def _is_number(schema, col: str) -> bool:
+    return schema[col].is_numeric()
+
+def _lower_step(lf, step: Step):
+    op = step.operation
+    params = step.params if step.params else {}
+    col = transformer.resolve_column(step)
+    schema = lf.collect_schema()
+
+    if op not in transformer.OPS_WITHOUT_COL and col not in schema:
+        print(f"⚠️ SKIPPING {op}: Column '{col}' not found in data.")
+        return lf
+
+    c = pl.col(col) if col in schema else None
+    numeric = c is not None and _is_number(schema, col)
+
+    # --- 1. CLEANING ---
+    if op == "drop_column":
+        return lf.drop(col)
+    if op == "drop_duplicates":
+        return lf.unique(keep="first", maintain_order=True)
+    if op == "drop_outliers_zscore":
+        if not numeric:
+            return lf
+        std = c.std()
+        inside = ((c - c.mean()) / std).abs() < float(params.get('threshold', 3))
+        # A zero std keeps every row; a missing one (< 2 values) keeps none, like pandas
+        return lf.filter(pl.when(std == 0).then(True).otherwise(inside))
+    if op == "drop_outliers_manual":
+        return lf.filter(c < float(params.get('value', 0))) if numeric else lf
+
+    # --- 2. IMPUTATION ---
+    if op in ["fill_na_mean", "fill_na_median"]:
+        if not numeric:
+            return lf
+        return lf.with_columns(c.fill_null(c.mean() if op == "fill_na_mean" else c.median()))
+    if op == "fill_na_mode":
+        # Series.mode()[0]: the smallest of the most frequent values
+        return lf.with_columns(c.fill_null(c.drop_nulls().mode().sort().first()))
+    if op == "fill_na_const":
+        val = params.get('value', 0)
+        fits = (numeric and isinstance(val, (int, float)) and not isinstance(val, bool)) or \
+               (schema[col] == pl.String and isinstance(val, str))
+        return lf.with_columns(c.fill_null(val)) if fits else None
+    if op == "fill_na_groupby":
+        group_col = params.get('group_col')
+        strategy = params.get('strategy', 'median')
+        if group_col not in schema:
+            return lf
+        if strategy not in ['mean', 'median'] or not numeric:
+            return None
+        g = pl.col(group_col)
+        per_group = c.mean().over(group_col) if strategy == 'mean' else c.median().over(group_col)
+        # pandas groupby leaves rows with a missing key out
+        lf = lf.with_columns(c.fill_null(pl.when(g.is_not_null()).then(per_group)))
+        # Global fallback, on the filled column
+        return lf.with_columns(c.fill_null(c.mean() if strategy == 'mean' else c.median()))
+
+    # --- 3. DATES ---
+    if op == "extract_date_parts":
+        if schema[col] == pl.String:
+            parsed = c.str.to_datetime(strict=False)
+        elif schema[col].is_temporal():
+            parsed = c
+        else:
+            return None
+        lf = lf.with_columns(parsed.alias(col))
+        lf = lf.with_columns(c.dt.year().alias(f"{col}_year"), c.dt.month().alias(f"{col}_month"),
+                             c.dt.day().alias(f"{col}_day"),
+                             # pandas: Monday=0, Polars: Monday=1
+                             (c.dt.weekday() - 1).alias(f"{col}_dow"))
+        if str(params.get('drop_original')) == "True":
+            lf = lf.drop(col)
+        return lf
+
+    # --- 4. MATH ---
+    if op == "log_transform":
+        if not numeric:
+            return lf
+        shifted = (c + c.min().abs() + 1).log1p()
+        return lf.with_columns(pl.when((c <= 0).any()).then(shifted).otherwise(c.log1p()))
+    if op == "create_interaction":
+        c1, c2 = params.get('col1'), params.get('col2')
+        new_name = params.get('new_name')
+        math_op = params.get('math_op', '+')
+        if c1 not in schema or c2 not in schema:
+            return lf
+        if not new_name or not (_is_number(schema, c1) and _is_number(schema, c2)):
+            return None
+        a, b = pl.col(c1), pl.col(c2)
+        if math_op == '+':
+            return lf.with_columns((a + b).alias(new_name))
+        if math_op == '*':
+            return lf.with_columns((a * b).alias(new_name))
+        if math_op == '-':
+            return lf.with_columns((a - b).alias(new_name))
+        if math_op == '/':
+            return lf.with_columns((a / pl.when(b != 0).then(b)).alias(new_name))
+        return lf
+
+    # --- 5. SCALERS (same zero-scale handling as sklearn) ---
+    if op in ["standard_scaler", "minmax_scaler", "robust_scaler", "maxabs_scaler"]:
+        if not numeric:
+            return lf
+        x = c.cast(pl.Float64)
+        if op == "standard_scaler":
+            std = x.std(ddof=0)
+            scale = pl.when(std < 10 * np.finfo(np.float64).eps).then(1.0).otherwise(std)
+            return lf.with_columns((x - x.mean()) / scale)
+        if op == "minmax_scaler":
+            data_range = x.max() - x.min()
+            return lf.with_columns((x - x.min()) / pl.when(data_range == 0).then(1.0).otherwise(data_range))
+        if op == "robust_scaler":
+            iqr = x.quantile(0.75, "linear") - x.quantile(0.25, "linear")
+            return lf.with_columns((x - x.median()) / pl.when(iqr == 0).then(1.0).otherwise(iqr))
+        max_abs = x.abs().max()
+        return lf.with_columns(x / pl.when(max_abs == 0).then(1.0).otherwise(max_abs))
+
+    # --- 6. ENCODING (only where the codes do not depend on pandas' text formatting) ---
+    if op == "label_encode":
+        if schema[col] != pl.String:
+            return None
+        # astype(str) turns missing values into 'nan', which gets a code like any other text
+        return lf.with_columns((c.fill_null("nan").rank("dense") - 1).cast(pl.Int64))
+    if op == "ordinal_encode":
+        if schema[col] != pl.String and not numeric:
+            return None
+        return lf.with_columns((c.rank("dense") - 1).cast(pl.Float64))
+
+    return None
+
+class PolarsBackend(ExecutionBackend):
+    name = "polars"
+
+    def available(self) -> bool:
+        return pl is not None
+
+    def _to_polars(self, df: pd.DataFrame):
+        # Steps compute on the read_csv dtypes: storage dtypes (see dtypes.py) are widened
+        # on the Polars side, which is cheaper than widening to pandas objects first
+        lf = pl.from_pandas(df).lazy()
+        widen = []
+        for name, dtype in lf.collect_schema().items():
+            if dtype == pl.Categorical or dtype == pl.Enum:
+                widen.append(pl.col(name).cast(pl.String))
+            elif dtype.is_integer() and dtype != pl.Int64:
+                widen.append(pl.col(name).cast(pl.Int64))
+            elif dtype == pl.Float32:
+                widen.append(pl.col(name).cast(pl.Float64))
+        return lf.with_columns(widen) if widen else lf
+
+    def apply_recipe(self, df: pd.DataFrame, recipe: Recipe) -> pd.DataFrame:
+        if not df.columns.is_unique or not all(isinstance(c, str) for c in df.columns):
+            # Polars needs unique text column names
+            return transformer.apply_recipe(df, recipe)
+        try:
+            lf = self._to_polars(df)
+        except (pl.exceptions.PolarsError, TypeError, ValueError) as e:
+            print(f"⚠️ Polars cannot load this frame ({e}), running on pandas")
+            return transformer.apply_recipe(df, recipe)
+
+        try:
+            for step in recipe.steps:
+                if transformer.is_batched(step):
+                    # Batched steps run on pandas, where their block forms and selectors live
+                    lowered = None
+                else:
+                    lowered = _lower_step(lf, step)
+                if lowered is None:
+                    # Run the query so far (one optimized collect), do the step on pandas, go on lazily
+                    lf = self._to_polars(transformer.apply_step(lf.collect().to_pandas(), step))
+                else:
+                    lf = lowered
+            return lf.collect().to_pandas()
+        except pl.exceptions.PolarsError as e:
+            # pandas logs and skips a failing step; in a lowered query it fails the whole run
+            print(f"⚠️ Polars query failed ({e}), running on pandas")
+            return transformer.apply_recipe(df, recipe)
+
+BACKENDS: Dict[str, ExecutionBackend] = {backend.name: backend for backend in [PandasBackend(), PolarsBackend()]}
+
+def available_backends() -> List[str]:
+    return [name for name, backend in BACKENDS.items() if backend.available()]
+
+def get_backend(name: Optional[str] = None) -> ExecutionBackend:
+    """The backend called `name` (default: settings.EXECUTION_BACKEND). ValueError if unknown or not installed."""
+    name = name or settings.EXECUTION_BACKEND
+    backend = BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"Unknown execution backend '{name}'. Choose from {list(BACKENDS)}.")
+    if not backend.available():
+        raise ValueError(f"The '{name}' backend is not installed on this server (pip install {name}).")
+    return backend
@@ -0,0 +1,116 @@
+"""
+Content-addressed storage for uploads, shared by every session.
+
+An upload is stored once per content hash under <UPLOAD_DIR>/blobs/<ab>/<digest>/,
+and the session folder holds symlinks to it:
+
+- dataset blob (sha256 of the upload):  original.csv, plus what is derived from it
+  (original.feather, the full profile)
+- sample blob (sha256 of sample.csv):   sample.csv, sample.feather, schema.json, the sample profile
+
+Derived artifacts follow the link into the blob folder (columnar copies are written
+next to the resolved CSV, profiles next to the resolved profiled file), so they are
+computed once per unique dataset. A sample is shared when its bytes match, e.g. a
+file smaller than the sample, or the same seed.
+
+References and refcounts live in the session manifest; `collect_garbage` deletes
+blobs no session references any more. Store changes hold <blobs>/.lock (fcntl.flock),
+so a blob cannot be collected between being stored and being referenced.
+"""
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List
+
+from app.config import settings
+from app.services import session_manifest
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+STORE_LOCK_FILE = ".lock"
+# Session files that may be links into the store: never written through, only replaced
+SHARED_FILES = ["original.csv", "sample.csv", "sample.feather", "schema.json"]
+
+def blobs_dir() -> Path:
+    return settings.UPLOAD_DIR / session_manifest.BLOB_DIR_NAME
+
+def blob_path(digest: str) -> Path:
+    return blobs_dir() / digest[:2] / digest
+
+@contextmanager
+def _store_lock():
+    if fcntl is None:
+        yield
+        return
+    blobs_dir().mkdir(parents=True, exist_ok=True)
+    with open(blobs_dir() / STORE_LOCK_FILE, "a+") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _link(target: Path, link: Path):
+    # Relative, so the upload dir can be moved; swapped in atomically
+    tmp_link = link.with_name(f".{link.name}.{os.getpid()}.link")
+    tmp_link.unlink(missing_ok=True)
+    os.symlink(os.path.relpath(target, link.parent), tmp_link)
+    tmp_link.replace(link)
+
+def detach(session_folder: Path):
+    """
+    Before a re-upload writes into the session: drops its links into the store
+    (unlinking a symlink leaves the blob alone), so nothing writes through them.
+    """
+    for name in SHARED_FILES:
+        path = session_folder / name
+        if path.is_symlink():
+            path.unlink()
+
+def share(session_folder: Path, kind: str, digest: str, names: List[str]):
+    """
+    Moves the session's freshly written `names` into the blob `digest` (or drops them,
+    when the blob has them already) and links them back; the session now references it.
+    """
+    if not settings.DEDUPE_UPLOADS:
+        return
+    session_id = session_folder.name
+    blob = blob_path(digest)
+    with _store_lock():
+        blob.mkdir(parents=True, exist_ok=True)
+        for name in names:
+            local, stored = session_folder / name, blob / name
+            if local.is_symlink() or not (local.exists() or stored.exists()):
+                continue
+            if stored.exists():
+                local.unlink(missing_ok=True)
+                print(f"♻️ {name} of session {session_id} is already stored ({digest[:12]})")
+            else:
+                local.replace(stored)
+            _link(stored, local)
+        session_manifest.add_blob(digest, session_manifest.session_bytes(blob))
+        session_manifest.reference_blob(session_id, kind, digest)
+
+def collect_garbage() -> int:
+    """Deletes the blobs no session references (O(unreferenced)); returns how many."""
+    if not blobs_dir().exists():
+        return 0
+    collected = 0
+    with _store_lock():
+        for digest in session_manifest.unreferenced_blobs():
+            try:
+                shutil.rmtree(blob_path(digest))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"⚠️ Error deleting blob {digest[:12]}: {e}")
+                continue
+            session_manifest.remove_blob(digest)
+            collected += 1
+    if collected:
+        print(f"🗑️ Collected {collected} unreferenced blob(s)")
+    return collected
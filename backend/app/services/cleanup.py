@@ -1,36 +1,71 @@
-import os
 import shutil
-import time
-from pathlib import Path
+from typing import Optional
 from app.config import settings
+from app.services import blob_store, file_manager, jobs, recipe_cache, session_manifest
+
+# Sessions read off the manifest per query while over the disk quota
+QUOTA_BATCH = 32
+
+def _has_active_jobs(session_id: str) -> bool:
+    return any(job.status in jobs.ACTIVE_STATUSES for job in jobs.list_jobs(settings.UPLOAD_DIR / session_id))
+
+def delete_session(session_id: str, reason: str) -> bool:
+    session_path = settings.UPLOAD_DIR / session_id
+    print(f"🗑️ Deleting session: {session_id} ({reason})")
+    file_manager.forget_columnar(session_path)
+    try:
+        shutil.rmtree(session_path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"⚠️ Error cleaning up {session_id}: {e}")
+        return False
+    recipe_cache.invalidate_session(session_id)
+    session_manifest.remove(session_id)
+    return True
 
 def delete_old_sessions():
     """
-    Scans the upload directory and deletes folders older than 24 hours.
+    Deletes sessions nobody accessed for SESSION_TTL_HOURS, then enforces the disk quota.
+    Both read the session manifest: no listing of the upload directory. Folders it does not
+    know (an upload killed before it registered) are indexed by session_manifest.sync() at startup.
     """
-    upload_dir = settings.UPLOAD_DIR
-    
-    # 24 hours in seconds (24 * 60 * 60)
-    MAX_AGE_SECONDS = 86400 
-    # MAX_AGE_SECONDS = 10     # (10 Seconds)
-    
-    current_time = time.time()
-    
-    if not upload_dir.exists():
+    if not settings.UPLOAD_DIR.exists():
         return
 
     print("🧹 Running cleanup job...")
-    
-    # Iterate over all UUID folders in temp_uploads
-    for session_path in upload_dir.iterdir():
-        if session_path.is_dir():
-            try:
-                # Get the last modified time of the FOLDER
-                folder_mtime = session_path.stat().st_mtime
-                age = current_time - folder_mtime
-                
-                if age > MAX_AGE_SECONDS:
-                    print(f"🗑️ Deleting expired session: {session_path.name} (Age: {int(age)}s)")
-                    shutil.rmtree(session_path) # Recursively delete folder & files
-            except Exception as e:
-                print(f"⚠️ Error cleaning up {session_path.name}: {e}")
\ No newline at end of file
+    for session_id in session_manifest.expired():
+        if _has_active_jobs(session_id):
+            # A long export counts as use
+            session_manifest.touch(session_id, force=True)
+            continue
+        delete_session(session_id, f"idle for more than {settings.SESSION_TTL_HOURS}h")
+
+    # Uploads no session links to any more
+    blob_store.collect_garbage()
+    enforce_disk_quota()
+    # Every worker runs this job: each one lets go of files the others deleted
+    file_manager.prune_columnar()
+
+def enforce_disk_quota(keep: Optional[str] = None):
+    """
+    While the sessions take more than SESSION_DISK_QUOTA_MB, deletes the least
+    recently accessed ones. `keep` (the upload that triggered it) is never deleted.
+    """
+    quota = settings.SESSION_DISK_QUOTA_MB * 1024 * 1024
+    skipped = set()
+    while session_manifest.total_bytes() > quota:
+        candidates = [(session_id, size) for session_id, size in session_manifest.least_recent(QUOTA_BATCH + len(skipped))
+                      if session_id not in skipped]
+        if not candidates:
+            print("⚠️ Disk quota exceeded, but every session left is in use")
+            return
+        for session_id, size in candidates:
+            if session_manifest.total_bytes() <= quota:
+                return
+            if session_id == keep or _has_active_jobs(session_id) or \
+                    not delete_session(session_id, f"disk quota, {size / 1024 / 1024:.1f} MB"):
+                skipped.add(session_id)
+                continue
+            # A shared upload only frees its space with its last session
+            blob_store.collect_garbage()
@@ -1,10 +1,229 @@
-from app.models.recipe import Recipe
+import inspect
+from typing import List, Optional, Tuple
+from app.config import settings
+from app.models.recipe import Recipe, Step
+from app.services import executor, file_manager, fitting, planner, sketches, transformer
+from app.services.planner import Plan
 
-def get_requirements() -> list[str]:
+def get_requirements(output_format: str = "csv") -> list[str]:
     # Only data processing libraries
-    return [
+    requirements = [
         "pandas", "numpy", "scipy", "scikit-learn", "category_encoders"
     ]
+    if output_format == "parquet":
+        requirements.append("pyarrow")
+    return requirements
+
+def _single_step_code(op: str, col: str, params: dict) -> Tuple[str, List[str]]:
+    """Code for one single-column step: (section, lines)."""
+    section, lines = "cleaning", []
+
+    def add(target: str, line: str):
+        nonlocal section
+        section = target
+        lines.append(line)
+
+    # ====================================================
+    #  GROUP 1: CLEANING
+    # ====================================================
+    if op == "drop_column":
+        add("cleaning", f"df.drop(['{col}'], axis=1, inplace=True)")
+        
+    elif op == "drop_duplicates":
+        add("cleaning", "df.drop_duplicates(inplace=True)")
+        
+    elif op == "drop_outliers_manual":
+        val = params.get('value')
+        add("cleaning", f"df = df[df['{col}'] < {val}]")
+
+    elif op == "drop_outliers_zscore":
+        threshold = params.get('threshold', 3)
+        add("cleaning", f"# Drop Z-Score outliers in {col}")
+        add("cleaning", f"df = df[np.abs((df['{col}'] - df['{col}'].mean())/df['{col}'].std()) < {threshold}]")
+
+    # ====================================================
+    #  GROUP 2: IMPUTATION 
+    # ====================================================
+    elif op == "fill_na_mode":
+        add("cleaning", f"df['{col}'] = df['{col}'].fillna(df['{col}'].mode()[0])")
+        
+    elif op == "fill_na_mean":
+        add("cleaning", f"df['{col}'] = df['{col}'].fillna(df['{col}'].mean())")
+
+    elif op == "fill_na_median":
+        add("cleaning", f"df['{col}'] = df['{col}'].fillna(df['{col}'].median())")
+
+    elif op == "fill_na_const":
+        val = params.get('value', 0)
+        val_str = f"'{val}'" if isinstance(val, str) else val
+        add("cleaning", f"df['{col}'] = df['{col}'].fillna({val_str})")
+        
+    elif op == "fill_na_groupby":
+        group_col = params.get('group_col')
+        strategy = params.get('strategy', 'median')
+        add("cleaning", f"# Fill {col} by {group_col} {strategy}")
+        add("cleaning", f"df['{col}'] = df.groupby('{group_col}')['{col}'].transform(lambda x: x.fillna(x.{strategy}()))")
+
+    elif op == "fill_na_knn":
+        add("cleaning", f"# KNN Imputation for {col}")
+        add("cleaning", f"imputer = KNNImputer(n_neighbors=5)")
+        add("cleaning", f"df['{col}'] = imputer.fit_transform(df[['{col}']])")
+
+    # ====================================================
+    #  GROUP 3: DATES (ESSENTIAL)
+    # ====================================================
+    elif op == "extract_date_parts":
+        add("features", f"# Extract Date Parts for {col}")
+        add("features", f"df['{col}'] = pd.to_datetime(df['{col}'], errors='coerce')")
+        add("features", f"df['{col}_year'] = df['{col}'].dt.year")
+        add("features", f"df['{col}_month'] = df['{col}'].dt.month")
+        add("features", f"df['{col}_day'] = df['{col}'].dt.day")
+        add("features", f"df['{col}_dow'] = df['{col}'].dt.dayofweek")
+        if params.get('drop_original', True):
+            add("features", f"df.drop(['{col}'], axis=1, inplace=True)")
+
+    # ====================================================
+    #  GROUP 4: MATH & TRANSFORM
+    # ====================================================
+    elif op == "bin_numeric":
+        bins = params.get('bins', 5)
+        labels = params.get('labels', False)
+        strategy = params.get('strategy', 'quantile')
+        add("features", f"# Binning {col}")
+        if strategy == 'quantile':
+            add("features", f"df['{col}'] = pd.qcut(df['{col}'], q={bins}, labels={labels}, duplicates='drop').cat.codes")
+        else:
+            add("features", f"df['{col}'] = pd.cut(df['{col}'], bins={bins}, labels={labels}).cat.codes")
+
+    elif op == "log_transform":
+        add("features", f"df['{col}'] = np.log1p(df['{col}'])")
+        
+    elif op == "box_cox_transform":
+        thresh = params.get('threshold', 0.5)
+        block = f"""
+# Skew correction for {col}
+skewness = skew(df['{col}'].dropna())
+if abs(skewness) > {thresh}:
+    clean_col = df['{col}'].fillna(0)
+    min_val = clean_col.min()
+    if min_val <= 0:
+        df['{col}'] += (abs(min_val) + 1)
+    lam = boxcox_normmax(df['{col}'].fillna(df['{col}'].mean()))
+    df['{col}'] = boxcox1p(df['{col}'], lam)
+"""
+        add("features", block)
+
+    elif op == "create_interaction":
+        c1, c2 = params.get('col1'), params.get('col2')
+        op_sym = params.get('math_op', '+')
+        new_name = params.get('new_name')
+        add("features", f"df['{new_name}'] = df['{c1}'] {op_sym} df['{c2}']")
+
+    elif op == "polynomial_features":
+        degree = params.get('degree', 2)
+        add("features", f"# Poly features for {col}")
+        add("features", f"poly = PolynomialFeatures(degree={degree}, include_bias=False)")
+        add("features", f"poly_data = poly.fit_transform(df[['{col}']])")
+        add("features", f"# Powers from 2 up: the first one is '{col}' itself")
+        add("features", f"new_cols = [f'{col}_poly_{{i}}' for i in range(2, poly_data.shape[1] + 1)]")
+        add("features", f"df = pd.concat([df, pd.DataFrame(poly_data[:, 1:], columns=new_cols, index=df.index)], axis=1)")
+
+    # ====================================================
+    #  GROUP 5: SCALERS & ENCODING
+    # ====================================================
+    elif op in ["standard_scaler", "minmax_scaler", "robust_scaler", "maxabs_scaler"]:
+        add("features", f"df['{col}'] = {_SCALER_CLASSES[op]}().fit_transform(df[['{col}']])")
+
+    elif op == "one_hot_encode":
+        add("encoding", f"df = pd.get_dummies(df, columns=['{col}'], drop_first=True)")
+
+    elif op == "label_encode":
+        add("encoding", f"df['{col}'] = LabelEncoder().fit_transform(df['{col}'].astype(str))")
+
+    elif op == "ordinal_encode":
+        add("encoding", f"df['{col}'] = OrdinalEncoder().fit_transform(df[['{col}']])")
+
+    elif op == "target_encode":
+        target_c = params.get('target_col', 'SalePrice')
+        add("encoding", f"encoder = ce.TargetEncoder(cols=['{col}'])")
+        add("encoding", f"df['{col}'] = encoder.fit_transform(df['{col}'], df['{target_c}'])")
+
+    return section, lines
+
+# ====================================================
+#  BATCHED STEPS (column lists and selectors)
+# ====================================================
+
+_COLUMN_PLACEHOLDER = "__prima_col__"
+
+_SCALER_CLASSES = {
+    "standard_scaler": "StandardScaler",
+    "minmax_scaler": "MinMaxScaler",
+    "robust_scaler": "RobustScaler",
+    "maxabs_scaler": "MaxAbsScaler"
+}
+
+def _selector_code(selector: str) -> str:
+    """Expression that evaluates a Step.selector on `df` in the generated script."""
+    if selector == "all":
+        return "list(df.columns)"
+    if selector == "numeric":
+        return "list(df.select_dtypes(include='number').columns)"
+    if selector == "categorical":
+        return "list(df.select_dtypes(include=['object', 'category', 'string']).columns)"
+    if selector == "datetime":
+        return "list(df.select_dtypes(include=['datetime', 'datetimetz']).columns)"
+    if selector.startswith("dtype:"):
+        return f"list(df.select_dtypes(include=[{selector[len('dtype:'):]!r}]).columns)"
+    if selector.startswith("regex:"):
+        return f"list(df.filter(regex={selector[len('regex:'):]!r}).columns)"
+    raise ValueError(f"Unknown column selector '{selector}'.")
+
+def _block_code(op: str, params: dict) -> Tuple[str, List[str]]:
+    """Vectorized code over `cols` for ops that have a block form (same set as transformer.BLOCK_OPS)."""
+    numeric = "cols = [c for c in cols if pd.api.types.is_numeric_dtype(df[c])]"
+    if op == "drop_column":
+        return "cleaning", ["df.drop(columns=cols, inplace=True)"]
+    if op in ["fill_na_mean", "fill_na_median"]:
+        stat = op[len("fill_na_"):]
+        return "cleaning", [numeric, f"df[cols] = df[cols].fillna(df[cols].{stat}())"]
+    if op == "fill_na_const":
+        val = params.get('value', 0)
+        val_str = f"'{val}'" if isinstance(val, str) else val
+        return "cleaning", [f"df[cols] = df[cols].fillna({val_str})"]
+    if op == "log_transform":
+        return "features", [numeric, "df[cols] = np.log1p(df[cols])"]
+    if op in _SCALER_CLASSES:
+        return "features", [numeric, f"df[cols] = {_SCALER_CLASSES[op]}().fit_transform(df[cols])"]
+    if op == "ordinal_encode":
+        return "encoding", ["df[cols] = OrdinalEncoder().fit_transform(df[cols])"]
+    if op == "one_hot_encode":
+        return "encoding", ["df = pd.get_dummies(df, columns=cols, drop_first=True)"]
+    return "", []
+
+def _loop_code(op: str, params: dict) -> Tuple[str, List[str]]:
+    """The single-column code of `op` inside a `for col in cols:` loop."""
+    section, lines = _single_step_code(op, _COLUMN_PLACEHOLDER, params)
+    body = "\n".join(lines)
+    # df['x'] -> df[col], 'x_year' -> f'{col}_year', comments mention {col}
+    body = body.replace(f"'{_COLUMN_PLACEHOLDER}'", "col")
+    body = body.replace(f"'{_COLUMN_PLACEHOLDER}", "f'{col}")
+    body = body.replace(_COLUMN_PLACEHOLDER, "{col}")
+    indented = ["    " + line if line.strip() else line for line in body.split("\n")]
+    return section, ["for col in cols:"] + indented
+
+def _step_code(step: Step) -> Tuple[str, List[str]]:
+    params = step.params if step.params else {}
+    if step.selector is None and not isinstance(step.column, list):
+        return _single_step_code(step.operation, step.column, params)
+
+    cols = _selector_code(step.selector) if step.selector is not None else repr(list(step.column))
+    header = [f"# {step.operation} on {step.selector or f'{len(step.column)} columns'}",
+              f"cols = [c for c in {cols} if c in df.columns]"]
+    section, lines = _block_code(step.operation, params)
+    if not lines:
+        section, lines = _loop_code(step.operation, params)
+    return section, header + lines
 
 def generate_pipeline_code(recipe: Recipe) -> str:
     # --- 1. GLOBAL IMPORTS (CLEANED) ---
@@ -22,145 +241,16 @@ def generate_pipeline_code(recipe: Recipe) -> str:
     }
     
     # --- SECTIONS ---
-    cleaning_code = []     
-    feature_eng_code = []  
-    encoding_code = []     
-    
+    sections = {"cleaning": [], "features": [], "encoding": []}
+
     # --- PARSER LOOP ---
     for step in recipe.steps:
-        op = step.operation
-        col = step.column
-        params = step.params if step.params else {}
-        
-        # ====================================================
-        #  GROUP 1: CLEANING
-        # ====================================================
-        if op == "drop_column":
-            cleaning_code.append(f"df.drop(['{col}'], axis=1, inplace=True)")
-            
-        elif op == "drop_duplicates":
-            cleaning_code.append("df.drop_duplicates(inplace=True)")
-            
-        elif op == "drop_outliers_manual":
-            val = params.get('value')
-            cleaning_code.append(f"df = df[df['{col}'] < {val}]")
-
-        elif op == "drop_outliers_zscore":
-            threshold = params.get('threshold', 3)
-            cleaning_code.append(f"# Drop Z-Score outliers in {col}")
-            cleaning_code.append(f"df = df[np.abs((df['{col}'] - df['{col}'].mean())/df['{col}'].std()) < {threshold}]")
-
-        # ====================================================
-        #  GROUP 2: IMPUTATION 
-        # ====================================================
-        elif op == "fill_na_mode":
-            cleaning_code.append(f"df['{col}'] = df['{col}'].fillna(df['{col}'].mode()[0])")
-            
-        elif op == "fill_na_mean":
-            cleaning_code.append(f"df['{col}'] = df['{col}'].fillna(df['{col}'].mean())")
-
-        elif op == "fill_na_median":
-            cleaning_code.append(f"df['{col}'] = df['{col}'].fillna(df['{col}'].median())")
-
-        elif op == "fill_na_const":
-            val = params.get('value', 0)
-            val_str = f"'{val}'" if isinstance(val, str) else val
-            cleaning_code.append(f"df['{col}'] = df['{col}'].fillna({val_str})")
-            
-        elif op == "fill_na_groupby":
-            group_col = params.get('group_col')
-            strategy = params.get('strategy', 'median')
-            cleaning_code.append(f"# Fill {col} by {group_col} {strategy}")
-            cleaning_code.append(f"df['{col}'] = df.groupby('{group_col}')['{col}'].transform(lambda x: x.fillna(x.{strategy}()))")
-
-        elif op == "fill_na_knn":
-            cleaning_code.append(f"# KNN Imputation for {col}")
-            cleaning_code.append(f"imputer = KNNImputer(n_neighbors=5)")
-            cleaning_code.append(f"df['{col}'] = imputer.fit_transform(df[['{col}']])")
-
-        # ====================================================
-        #  GROUP 3: DATES (ESSENTIAL)
-        # ====================================================
-        elif op == "extract_date_parts":
-            feature_eng_code.append(f"# Extract Date Parts for {col}")
-            feature_eng_code.append(f"df['{col}'] = pd.to_datetime(df['{col}'], errors='coerce')")
-            feature_eng_code.append(f"df['{col}_year'] = df['{col}'].dt.year")
-            feature_eng_code.append(f"df['{col}_month'] = df['{col}'].dt.month")
-            feature_eng_code.append(f"df['{col}_day'] = df['{col}'].dt.day")
-            feature_eng_code.append(f"df['{col}_dow'] = df['{col}'].dt.dayofweek")
-            if params.get('drop_original', True):
-                feature_eng_code.append(f"df.drop(['{col}'], axis=1, inplace=True)")
-
-        # ====================================================
-        #  GROUP 4: MATH & TRANSFORM
-        # ====================================================
-        elif op == "bin_numeric":
-            bins = params.get('bins', 5)
-            labels = params.get('labels', False)
-            strategy = params.get('strategy', 'quantile')
-            feature_eng_code.append(f"# Binning {col}")
-            if strategy == 'quantile':
-                feature_eng_code.append(f"df['{col}'] = pd.qcut(df['{col}'], q={bins}, labels={labels}, duplicates='drop').cat.codes")
-            else:
-                feature_eng_code.append(f"df['{col}'] = pd.cut(df['{col}'], bins={bins}, labels={labels}).cat.codes")
-
-        elif op == "log_transform":
-            feature_eng_code.append(f"df['{col}'] = np.log1p(df['{col}'])")
-            
-        elif op == "box_cox_transform":
-            thresh = params.get('threshold', 0.5)
-            block = f"""
-# Skew correction for {col}
-skewness = skew(df['{col}'].dropna())
-if abs(skewness) > {thresh}:
-    clean_col = df['{col}'].fillna(0)
-    min_val = clean_col.min()
-    if min_val <= 0:
-        df['{col}'] += (abs(min_val) + 1)
-    lam = boxcox_normmax(df['{col}'].fillna(df['{col}'].mean()))
-    df['{col}'] = boxcox1p(df['{col}'], lam)
-"""
-            feature_eng_code.append(block)
-
-        elif op == "create_interaction":
-            c1, c2 = params.get('col1'), params.get('col2')
-            op_sym = params.get('math_op', '+')
-            new_name = params.get('new_name')
-            feature_eng_code.append(f"df['{new_name}'] = df['{c1}'] {op_sym} df['{c2}']")
-
-        elif op == "polynomial_features":
-            degree = params.get('degree', 2)
-            feature_eng_code.append(f"# Poly features for {col}")
-            feature_eng_code.append(f"poly = PolynomialFeatures(degree={degree}, include_bias=False)")
-            feature_eng_code.append(f"poly_data = poly.fit_transform(df[['{col}']])")
-            feature_eng_code.append(f"new_cols = [f'{col}_poly_{{i}}' for i in range(1, poly_data.shape[1] + 1)]")
-            feature_eng_code.append(f"df = pd.concat([df, pd.DataFrame(poly_data, columns=new_cols, index=df.index)], axis=1)")
-
-        # ====================================================
-        #  GROUP 5: SCALERS & ENCODING
-        # ====================================================
-        elif op in ["standard_scaler", "minmax_scaler", "robust_scaler", "maxabs_scaler"]:
-            mapper = {
-                "standard_scaler": "StandardScaler",
-                "minmax_scaler": "MinMaxScaler",
-                "robust_scaler": "RobustScaler",
-                "maxabs_scaler": "MaxAbsScaler"
-            }
-            feature_eng_code.append(f"df['{col}'] = {mapper[op]}().fit_transform(df[['{col}']])")
-
-        elif op == "one_hot_encode":
-            encoding_code.append(f"df = pd.get_dummies(df, columns=['{col}'], drop_first=True)")
-
-        elif op == "label_encode":
-            encoding_code.append(f"df['{col}'] = LabelEncoder().fit_transform(df['{col}'].astype(str))")
-
-        elif op == "ordinal_encode":
-            encoding_code.append(f"df['{col}'] = OrdinalEncoder().fit_transform(df[['{col}']])")
-
-        elif op == "target_encode":
-            target_c = params.get('target_col', 'SalePrice')
-            encoding_code.append(f"encoder = ce.TargetEncoder(cols=['{col}'])")
-            encoding_code.append(f"df['{col}'] = encoder.fit_transform(df['{col}'], df['{target_c}'])")
+        section, lines = _step_code(step)
+        sections[section].extend(lines)
+
+    cleaning_code = sections["cleaning"]
+    feature_eng_code = sections["features"]
+    encoding_code = sections["encoding"]
 
     # --- 3. ASSEMBLE SCRIPT ---
     script = []
@@ -195,4 +285,815 @@ if abs(skewness) > {thresh}:
     script.append("df.to_csv('processed_data.csv', index=False)")
     script.append("print('Saved to processed_data.csv')")
         
-    return "\n".join(script)
\ No newline at end of file
+    return "\n".join(script)
+# ====================================================
+#  CHUNKED (STREAMING) SCRIPT
+# ====================================================
+# Same two phases as services/executor.py, written out as a standalone script:
+# fit passes over read_csv(chunksize=...) collect each stateful step's statistics,
+# then one transform pass streams every chunk through the steps into the output.
+# The statistics are the ones services/fitting.py collects, with the accumulators
+# of services/sketches.py copied into the script.
+
+OUTPUT_FORMATS = ["csv", "parquet"]
+
+# op -> (accumulator, fit lines, finish lines, transform lines). In the lines,
+# <col> / <group_col> / <target_col> / <threshold> ... are replaced by the step's values,
+# `acc` is the accumulator and `p` the fitted params.
+_MOMENTS_FIT = ["acc.update(df[<col>].to_numpy())"]
+_FILLNA = ["df[<col>] = df[<col>].fillna(p['value'])"]
+
+_STREAM_OPS = {
+    "fill_na_mean": ("RunningMoments()", _MOMENTS_FIT,
+                     ["return {'value': acc.mean if acc.count else np.nan}"], _FILLNA),
+    "fill_na_median": ("QuantileSketch(SKETCH_K)", _MOMENTS_FIT,
+                       ["return {'value': acc.quantile(0.5)}"], _FILLNA),
+    "fill_na_mode": ("ValueCounter()", ["acc.update(df[<col>])"],
+                     ["return {'value': acc.mode()}"],
+                     ["if p['value'] is not None:", "    df[<col>] = df[<col>].fillna(p['value'])"]),
+    "drop_outliers_zscore": ("RunningMoments()", _MOMENTS_FIT,
+                             ["return {'mean': acc.mean if acc.count else np.nan, 'std': acc.std(ddof=1)}"],
+                             ["if p['std'] != 0:",
+                              "    df = df[np.abs((df[<col>] - p['mean']) / p['std']) < <threshold>]"]),
+    "standard_scaler": ("RunningMoments()", _MOMENTS_FIT,
+                        ["std = acc.std(ddof=0)",
+                         "scale = 1.0 if not acc.count or std < 10 * np.finfo(np.float64).eps else std",
+                         "return {'mean': acc.mean if acc.count else np.nan, 'scale': scale}"],
+                        ["df[<col>] = (df[<col>] - p['mean']) / p['scale']"]),
+    "minmax_scaler": ("RunningMoments()", _MOMENTS_FIT,
+                      ["data_range = acc.max - acc.min",
+                       "return {'min': acc.min, 'scale': 1.0 if not data_range else data_range}"],
+                      ["df[<col>] = (df[<col>] - p['min']) / p['scale']"]),
+    "maxabs_scaler": ("RunningMoments()", _MOMENTS_FIT,
+                      ["max_abs = max(abs(acc.min), abs(acc.max)) if acc.count else 0.0",
+                       "return {'scale': max_abs or 1.0}"],
+                      ["df[<col>] = df[<col>] / p['scale']"]),
+    "log_transform": ("RunningMoments()", _MOMENTS_FIT,
+                      ["return {'offset': abs(acc.min) + 1 if acc.count and acc.min <= 0 else 0.0}"],
+                      ["df[<col>] = np.log1p(df[<col>] + p['offset'])"]),
+    "robust_scaler": ("QuantileSketch(SKETCH_K)", _MOMENTS_FIT,
+                      ["q25, q50, q75 = acc.quantiles([0.25, 0.5, 0.75])",
+                       "iqr = q75 - q25",
+                       "return {'center': q50, 'scale': 1.0 if not iqr or np.isnan(iqr) else iqr}"],
+                      ["df[<col>] = (df[<col>] - p['center']) / p['scale']"]),
+    "bin_numeric": ("(QuantileSketch(SKETCH_K), RunningMoments())",
+                    ["acc[0].update(df[<col>].to_numpy())", "acc[1].update(df[<col>].to_numpy())"],
+                    ["sketch, moments = acc"],   # + the edges, see _bin_finish
+                    ["res = pd.cut(df[<col>], bins=p['edges'], labels=<labels>, include_lowest=<include_lowest>)",
+                     "df[<col>] = res.cat.codes if hasattr(res, 'cat') else res"]),
+    "box_cox_transform": ("(RunningMoments(), QuantileSketch(SKETCH_K), Reservoir(BOXCOX_ROWS))",
+                          ["acc[0].update(df[<col>].to_numpy())", "acc[1].update(df[<col>].to_numpy())",
+                           "acc[2].update(df[<col>].dropna().to_frame())"],
+                          ["moments, sketch, reservoir = acc",
+                           "try:",
+                           "    shift = abs(moments.min) + 1 if moments.min <= 0 else 0.0",
+                           "    lam = boxcox_normmax(reservoir.rows[<col>].astype('float64') + shift)",
+                           "    return {'lambda': lam, 'median': sketch.quantile(0.5), 'shift': shift}",
+                           "except Exception as e:",
+                           "    print('Box-Cox failed on', <col>, f'- falling back to Log1p. Error: {e}')",
+                           "    return {'fallback': True}"],
+                          ["if p.get('fallback'):",
+                           "    df[<col>] = np.log1p(df[<col>])",
+                           "else:",
+                           "    df[<col>] = boxcox1p(df[<col>].fillna(p['median']) + p['shift'], p['lambda'])"]),
+    "fill_na_knn": ("Reservoir(KNN_ROWS)", ["acc.update(df.select_dtypes(include=[np.number]))"],
+                    ["if acc.rows is None or acc.rows.empty:",
+                     "    return None",
+                     "# The sampled rows are the neighbour pool for every chunk",
+                     "imputer = KNNImputer(n_neighbors=5).fit(acc.rows.astype('float64'))",
+                     "return {'imputer': imputer, 'columns': list(acc.rows.columns)}"],
+                    ["imputed = p['imputer'].transform(df[p['columns']])",
+                     "df[<col>] = imputed[:, p['columns'].index(<col>)]"]),
+    "fill_na_groupby": ("GroupFill(<strategy>)", ["acc.update(df[<col>], df.get(<group_col>))"],
+                        ["return acc.finish()"],
+                        ["df[<col>] = df[<col>].fillna(df[<group_col>].map(p['mapping']))",
+                         "df[<col>] = df[<col>].fillna(p['fallback'])"]),
+    "one_hot_encode": ("ValueCounter()", ["acc.update(df[<col>])"],
+                       ["return {'categories': acc.values()}"],
+                       ["# Fixed categories: every chunk gets the same dummy columns",
+                        "df[<col>] = pd.Categorical(df[<col>], categories=p['categories'])",
+                        "df = pd.get_dummies(df, columns=[<col>], drop_first=True)"]),
+    "label_encode": ("ValueCounter()", ["acc.update(df[<col>].astype(str))"],
+                     ["return {'codes': {v: i for i, v in enumerate(acc.values())}}"],
+                     ["df[<col>] = df[<col>].astype(str).map(p['codes']).fillna(-1).astype('int64')"]),
+    "ordinal_encode": ("ValueCounter()", ["acc.update(df[<col>])"],
+                       ["return {'codes': {v: float(i) for i, v in enumerate(acc.values())}}"],
+                       ["df[<col>] = df[<col>].map(p['codes']).astype('float64')"]),
+    "target_encode": ("TargetStats()", ["acc.update(df[<col>], df.get(<target_col>))"],
+                      ["return acc.finish()"],
+                      ["encoded = df[<col>].map(p['mapping']).fillna(p['prior'])",
+                       "df[<col>] = encoded.where(df[<col>].notna(), p['missing'])"]),
+}
+
+# Fits that only look at numeric columns (the step is skipped otherwise, like in the transformer)
+_NUMERIC_FITS = ["fill_na_mean", "fill_na_median", "drop_outliers_zscore", "standard_scaler", "minmax_scaler",
+                 "maxabs_scaler", "log_transform", "robust_scaler", "bin_numeric", "box_cox_transform", "fill_na_knn"]
+
+_GROUP_FILL_CLASS = '''
+class GroupFill:
+    """fill_na_groupby: per-group fill values, and the global fallback computed on the filled column."""
+
+    def __init__(self, strategy):
+        self.strategy = strategy
+        self.sums, self.counts = pd.Series(dtype='float64'), pd.Series(dtype='int64')
+        self.missing = pd.Series(dtype='int64')
+        self.sketches = {}
+        self.moments, self.sketch = RunningMoments(), QuantileSketch(SKETCH_K)
+        self.pairs = None
+        self.values = ValueCounter()
+        self.usable = strategy in ['mean', 'median', 'mode']
+
+    def update(self, values, groups):
+        if groups is None or (self.strategy in ['mean', 'median'] and not np.issubdtype(values.dtype, np.number)):
+            self.usable = False
+        if not self.usable:
+            return
+        self.missing = self.missing.add(groups[values.isna()].value_counts(), fill_value=0)
+        if self.strategy == 'mean':
+            self.moments.update(values.to_numpy())
+            grouped = values.groupby(groups)
+            self.sums = self.sums.add(grouped.sum(), fill_value=0)
+            self.counts = self.counts.add(grouped.count(), fill_value=0)
+        elif self.strategy == 'median':
+            self.sketch.update(values.to_numpy())
+            for key, group_values in values.groupby(groups):
+                self.sketches.setdefault(key, QuantileSketch(SKETCH_K)).update(group_values.to_numpy())
+        else:
+            pairs = pd.DataFrame({'group': groups, 'value': values}).value_counts()
+            self.pairs = pairs if self.pairs is None else self.pairs.add(pairs, fill_value=0)
+        self.values.update(values)
+
+    def finish(self):
+        if not self.usable:
+            return None
+        # 1. Per-group fill value
+        if self.strategy == 'mean':
+            per_group = (self.sums / self.counts.where(self.counts > 0)).dropna()
+        elif self.strategy == 'median':
+            per_group = pd.Series({k: s.quantile(0.5) for k, s in self.sketches.items() if s.count})
+        else:
+            best = {}
+            for (key, value), count in (self.pairs if self.pairs is not None else pd.Series(dtype='int64')).items():
+                current = best.get(key)
+                if current is None or count > current[1] or (count == current[1] and value < current[0]):
+                    best[key] = (value, count)
+            per_group = pd.Series({k: v for k, (v, _) in best.items()}, dtype='object')
+
+        # 2. Global fallback on the column AFTER the group fill
+        filled = self.missing.reindex(per_group.index).fillna(0).astype('int64')
+        if self.strategy == 'mean':
+            n = self.moments.count + filled.sum()
+            total = self.moments.mean * self.moments.count + (filled * per_group).sum()
+            fallback = total / n if n else np.nan
+        elif self.strategy == 'median':
+            for key, n in filled.items():
+                if n:
+                    self.sketch.update(np.full(int(n), per_group[key], dtype='float64'))
+            fallback = self.sketch.quantile(0.5) if self.sketch.count else np.nan
+        else:
+            for key, n in filled.items():
+                if n:
+                    self.values.counts[per_group[key]] = self.values.counts.get(per_group[key], 0) + n
+            fallback = self.values.mode()
+        return {'mapping': per_group.to_dict(), 'fallback': np.nan if fallback is None else fallback}
+'''
+
+_TARGET_STATS_CLASS = '''
+class TargetStats:
+    """target_encode with the category_encoders.TargetEncoder defaults (min_samples_leaf=20, smoothing=10)."""
+
+    def __init__(self):
+        self.sums, self.counts = pd.Series(dtype='float64'), pd.Series(dtype='int64')
+        self.target = RunningMoments()
+        self.usable = True
+
+    def update(self, values, target):
+        if target is None or target.isna().any():
+            # The encoder refuses missing targets
+            self.usable = False
+        if not self.usable:
+            return
+        target = target.astype('float64')
+        # Missing categories form their own group
+        keys = values.astype(object).where(values.notna(), '__nan__')
+        grouped = target.groupby(keys)
+        self.sums = self.sums.add(grouped.sum(), fill_value=0)
+        self.counts = self.counts.add(grouped.count(), fill_value=0)
+        self.target.update(target.to_numpy())
+
+    def finish(self):
+        if not self.usable:
+            return None
+        prior = self.target.mean
+        smoove = expit((self.counts - 20) / 10)
+        encoded = prior * (1 - smoove) + (self.sums / self.counts) * smoove
+        missing = encoded.pop('__nan__') if '__nan__' in encoded.index else prior
+        return {'mapping': encoded.to_dict(), 'missing': missing, 'prior': prior}
+'''
+
+_CHUNK_WRITER_CLASS = '''
+class ChunkWriter:
+    """Appends chunks to a CSV or Parquet file, with the columns (and Parquet types) of the first chunk."""
+
+    def __init__(self, path):
+        self.path = path
+        self.columns = None
+        self.parquet = None
+
+    def write(self, df):
+        if self.columns is None:
+            self.columns = list(df.columns)
+            if self.path.endswith('.parquet'):
+                schema = pa.Schema.from_pandas(df, preserve_index=False)
+                # A column with no values in the first chunk would be typed null for good
+                schema = pa.schema([f.with_type(pa.string()) if pa.types.is_null(f.type) else f for f in schema])
+                self.parquet = pq.ParquetWriter(self.path, schema)
+            else:
+                df.iloc[0:0].to_csv(self.path, index=False)
+        df = df.reindex(columns=self.columns)
+        if self.parquet is not None:
+            self.parquet.write_table(pa.Table.from_pandas(df, schema=self.parquet.schema, preserve_index=False))
+        else:
+            df.to_csv(self.path, mode='a', header=False, index=False)
+
+    def close(self):
+        if self.parquet is not None:
+            self.parquet.close()
+'''
+
+def _indent(lines: List[str], depth: int = 1) -> List[str]:
+    pad = "    " * depth
+    return [pad + line if line.strip() else line for line in "\n".join(lines).split("\n")]
+
+def _stream_tokens(step: Step, col: str) -> dict:
+    params = step.params if step.params else {}
+    labels = params.get('labels', False)
+    return {
+        "<col>": repr(col),
+        "<group_col>": repr(params.get('group_col')),
+        "<target_col>": repr(params.get('target_col')),
+        "<strategy>": repr(params.get('strategy', 'median')),
+        "<threshold>": repr(float(params.get('threshold', 3))),
+        "<labels>": repr(False if str(labels) == "False" else labels),
+        "<include_lowest>": repr(params.get('strategy', 'quantile') == 'quantile'),
+    }
+
+def _fill_tokens(lines: List[str], tokens: dict) -> List[str]:
+    filled = []
+    for line in lines:
+        for token, value in tokens.items():
+            line = line.replace(token, value)
+        filled.append(line)
+    return filled
+
+def _bin_finish(params: dict) -> List[str]:
+    """The edges of pd.qcut(..., duplicates='drop') / pd.cut(bins=n), from the sketch and the min/max."""
+    bins = int(params.get('bins', 5))
+    if params.get('strategy', 'quantile') == 'quantile':
+        return [f"edges = sketch.quantiles(np.linspace(0, 1, {bins + 1}))",
+                "# The outer edges are exact even once the sketch is approximate",
+                "edges[0], edges[-1] = moments.min, moments.max",
+                "return {'edges': np.unique(edges).tolist()}"]
+    return ["mn, mx = moments.min, moments.max",
+            "if mn == mx:",
+            "    mn -= 0.001 * abs(mn) if mn != 0 else 0.001",
+            "    mx += 0.001 * abs(mx) if mx != 0 else 0.001",
+            f"    return {{'edges': np.linspace(mn, mx, {bins + 1}).tolist()}}",
+            f"edges = np.linspace(mn, mx, {bins + 1})",
+            "edges[0] -= (mx - mn) * 0.001",
+            "return {'edges': edges.tolist()}"]
+
+def _stream_step_code(n: int, step: Step) -> Tuple[List[str], Optional[str]]:
+    """
+    The functions of step `n` in the chunked script: step_<n>(df), plus for a stateful step
+    fit_<n>(df, acc) / finish_<n>(acc). Returns them with the accumulator expression (None if stateless).
+    """
+    op = step.operation
+    col = transformer.resolve_column(step)
+    params = step.params if step.params else {}
+    code = [f"def step_{n}(df):", f"    # {op}" + (f" on {col}" if col else "")]
+
+    if op == "drop_duplicates":
+        # Row hashes seen in earlier chunks (8 bytes per kept row)
+        code += ["    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()",
+                 "    keep = ~pd.Series(hashes).duplicated().to_numpy()",
+                 f"    keep &= ~np.isin(hashes, seen_hashes.get({n}, np.empty(0, dtype='uint64')))",
+                 f"    seen_hashes[{n}] = np.union1d(seen_hashes.get({n}, np.empty(0, dtype='uint64')), hashes[keep])",
+                 "    return df[keep]"]
+        return code, None
+
+    if op not in _STREAM_OPS:
+        _, lines = _single_step_code(op, col, params)
+        return code + _indent(lines) + ["    return df"], None
+
+    accumulator, fit_lines, finish_lines, transform_lines = _STREAM_OPS[op]
+    if op == "bin_numeric":
+        finish_lines = finish_lines + _bin_finish(params)
+    tokens = _stream_tokens(step, col)
+
+    code += [f"    p = params.get({n})",
+             f"    if p is None or {col!r} not in df.columns:",
+             "        return df"]
+    code += _indent(_fill_tokens(transform_lines, tokens)) + ["    return df", ""]
+
+    guard = f"if {col!r} not in df.columns"
+    if op in _NUMERIC_FITS:
+        guard += f" or not np.issubdtype(df[{col!r}].dtype, np.number)"
+    code += [f"def fit_{n}(df, acc):", f"    {guard}:", "        return"]
+    code += _indent(_fill_tokens(fit_lines, tokens)) + [""]
+    code += [f"def finish_{n}(acc):"] + _indent(_fill_tokens(finish_lines, tokens))
+    return code, _fill_tokens([accumulator], tokens)[0]
+
+def _export_plan(recipe: Recipe) -> Tuple[Plan, Optional[dict]]:
+    """The planned steps and the read_csv dtypes (text columns only), from the session when it still exists."""
+    session_dir = settings.UPLOAD_DIR / recipe.session_id
+    if (session_dir / "sample.csv").exists():
+        return executor.plan_recipe(recipe), file_manager.full_read_dtypes(session_dir)
+    if any(step.selector is not None for step in recipe.steps):
+        raise ValueError("Column selectors are resolved on the session's sample, which is gone. Upload the file again.")
+    return planner.optimize(transformer.expand_steps(recipe.steps)), None
+
+def generate_chunked_pipeline_code(recipe: Recipe, output_format: str = "csv") -> str:
+    """
+    A script that runs the recipe over a CSV of any size, one chunk in memory at a time.
+    Same steps and fitted statistics as the full-data export (services/executor.py).
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}'.")
+    plan, schema_dtypes = _export_plan(recipe)
+    steps = plan.steps
+    usecols = plan.columns
+    if schema_dtypes is not None:
+        wanted = set(usecols) if usecols is not None else None
+        schema_dtypes = {c: d for c, d in schema_dtypes.items() if wanted is None or c in wanted}
+
+    # --- 1. STEP FUNCTIONS ---
+    step_code, accumulators = [], {}
+    for n, step in enumerate(steps, start=1):
+        lines, accumulator = _stream_step_code(n, step)
+        step_code += lines + [""]
+        if accumulator:
+            accumulators[n] = accumulator
+    ops = {step.operation for step in steps}
+
+    # --- 2. ASSEMBLE SCRIPT ---
+    imports = [
+        "import numpy as np",
+        "import pandas as pd",
+        "import warnings",
+        "from typing import Optional",
+        "from scipy.special import boxcox1p, expit",
+        "from scipy.stats import boxcox_normmax",
+        "from sklearn.impute import KNNImputer",
+        "from sklearn.preprocessing import PolynomialFeatures",
+    ]
+    if output_format == "parquet":
+        imports += ["import pyarrow as pa", "import pyarrow.parquet as pq"]
+    imports.append("warnings.filterwarnings('ignore')")
+
+    script = []
+    script.append("# ==========================================")
+    script.append("# GENERATED PREPROCESSING PIPELINE (CHUNKED)")
+    script.append("# Reads the CSV in chunks: memory stays bounded whatever the file size.")
+    script.append("# ==========================================")
+    script.append("\n".join(imports))
+
+    script.append("\n# --- 1. SETTINGS ---")
+    script.append("# TODO: Replace with your actual file path")
+    script.append("SOURCE = 'dataset.csv'")
+    script.append(f"OUTPUT = 'processed_data.{output_format}'")
+    script.append(f"CHUNK_ROWS = {settings.EXECUTOR_CHUNK_ROWS}")
+    script.append(f"SKETCH_K = {settings.QUANTILE_SKETCH_K}       # Values kept per level by the quantile sketch")
+    script.append(f"KNN_ROWS = {settings.KNN_REFERENCE_ROWS}       # Rows sampled as the KNN neighbour pool")
+    script.append(f"BOXCOX_ROWS = {settings.BOXCOX_SAMPLE_ROWS}  # Rows sampled to estimate the Box-Cox lambda")
+    script.append("# Only the columns the pipeline uses" + (" (None: all)" if usecols is None else ""))
+    script.append(f"USECOLS = {usecols!r}")
+    if schema_dtypes is not None:
+        script.append("# Text columns of the uploaded sample; numeric ones are inferred chunk by chunk")
+        script.append(f"DTYPES = {schema_dtypes!r}")
+    else:
+        script.append("DTYPES = None")
+    script.append("\ndef read_chunks():")
+    script.append("    return pd.read_csv(SOURCE, usecols=USECOLS, dtype=DTYPES, chunksize=CHUNK_ROWS)")
+
+    script.append("\n# --- 2. STREAMING STATISTICS ---")
+    script.append("\n\n".join(inspect.getsource(cls) for cls in
+                              [sketches.RunningMoments, sketches.QuantileSketch, sketches.ValueCounter, sketches.Reservoir]))
+    if "fill_na_groupby" in ops:
+        script.append(_GROUP_FILL_CLASS)
+    if "target_encode" in ops:
+        script.append(_TARGET_STATS_CLASS)
+    script.append(_CHUNK_WRITER_CLASS)
+
+    script.append("\n# --- 3. STEPS ---")
+    script.append("params = {}        # Step number -> fitted statistics")
+    script.append("seen_hashes = {}   # drop_duplicates: step number -> row hashes already written\n")
+    script.append("\n".join(step_code))
+    script.append(f"STEPS = [{', '.join(f'step_{n}' for n in range(1, len(steps) + 1))}]")
+
+    passes = fitting.plan_fit_passes(steps)
+    if passes:
+        script.append("\n# --- 4. FIT: ONE PASS OVER THE FILE PER GROUP OF INDEPENDENT STEPS ---")
+    for n_pass, group in enumerate(passes, start=1):
+        numbers = [i + 1 for i in group]
+        script.append(f"print('Fit pass {n_pass}/{len(passes)} (steps {', '.join(map(str, numbers))})...')")
+        script.append("seen_hashes.clear()")
+        script.append("acc = {" + ", ".join(f"{n}: {accumulators[n]}" for n in numbers) + "}")
+        script.append("for chunk in read_chunks():")
+        script.append("    df = chunk")
+        for n in range(1, max(numbers) + 1):
+            script.append(f"    fit_{n}(df, acc[{n}])" if n in numbers else f"    df = step_{n}(df)")
+        script.append("\n".join(f"params[{n}] = finish_{n}(acc[{n}])" for n in numbers) + "\n")
+
+    script.append("\n# --- 5. TRANSFORM: STREAM EVERY CHUNK THROUGH THE STEPS ---")
+    script.append("print('Transforming...')")
+    script.append("seen_hashes.clear()")
+    script.append("writer = ChunkWriter(OUTPUT)")
+    script.append("rows = 0")
+    script.append("for chunk in read_chunks():")
+    script.append("    df = chunk")
+    script.append("    for step in STEPS:")
+    script.append("        df = step(df)")
+    script.append("    writer.write(df)")
+    script.append("    rows += len(df)")
+    script.append("writer.close()")
+    script.append("# No auto-dummy safety step here: one chunk does not see every category of the file.")
+    script.append("# Add one_hot_encode steps for the columns that need it.")
+    script.append("print(f'Saved {rows} rows to {OUTPUT}')")
+
+    return "\n".join(script)
+
+# ====================================================
+#  SKLEARN PIPELINE SCRIPT
+# ====================================================
+# The recipe compiled into a sklearn Pipeline that is fit once and saved with joblib.
+# Runs of single-column steps on distinct columns become one ColumnTransformer
+# (columns transformed in parallel); the other steps are whole-frame stages.
+# Row filters cannot live in a Pipeline (it never drops rows of the data it scores):
+# they clean the training data before the fit.
+
+ROW_FILTER_OPS = ["drop_duplicates", "drop_outliers_zscore", "drop_outliers_manual"]
+
+# Single-column steps -> the transformer that does them on a ColumnTransformer column
+_COLUMN_ESTIMATORS = {
+    "fill_na_mean": "SimpleImputer(strategy='mean', keep_empty_features=True)",
+    "fill_na_median": "SimpleImputer(strategy='median', keep_empty_features=True)",
+    "fill_na_mode": "SimpleImputer(strategy='most_frequent', keep_empty_features=True)",
+    "standard_scaler": "StandardScaler()",
+    "minmax_scaler": "MinMaxScaler()",
+    "robust_scaler": "RobustScaler()",
+    "maxabs_scaler": "MaxAbsScaler()",
+    "log_transform": "ShiftedLog()",
+    "box_cox_transform": "BoxCox1p()",
+    "label_encode": "LabelCodes()",
+    "ordinal_encode": "OrdinalEncoder(handle_unknown='use_encoded_value', unknown_value=np.nan)",
+    "one_hot_encode": "Dummies()",
+}
+
+_SKLEARN_HELPERS = '''
+# --- 2. CUSTOM TRANSFORMERS (same maths as the Prima preview) ---
+class ColumnStep(OneToOneFeatureMixin, TransformerMixin, BaseEstimator):
+    """Base for the column-wise transformers below: DataFrame in, same columns out."""
+
+    def fit(self, X, y=None):
+        self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        self.n_features_in_ = X.shape[1]
+        self.params_ = {c: self.fit_column(X[c]) for c in X.columns}
+        return self
+
+    def transform(self, X):
+        return pd.DataFrame({c: self.transform_column(X[c], self.params_[c]) for c in X.columns}, index=X.index)
+
+class ShiftedLog(ColumnStep):
+    """log1p, shifted by |min| + 1 when the training column has values <= 0."""
+
+    def fit_column(self, x):
+        return abs(x.min()) + 1 if (x <= 0).any() else 0.0
+
+    def transform_column(self, x, offset):
+        return np.log1p(x + offset)
+
+class BoxCox1p(ColumnStep):
+    """boxcox1p with the lambda of the training column; log1p if it cannot be estimated."""
+
+    def fit_column(self, x):
+        try:
+            clean = x.dropna()
+            shift = abs(clean.min()) + 1 if clean.min() <= 0 else 0.0
+            return {'lambda': boxcox_normmax(clean + shift), 'median': x.median(), 'shift': shift}
+        except Exception as e:
+            print(f'Box-Cox failed on {x.name}, falling back to Log1p. Error: {e}')
+            return None
+
+    def transform_column(self, x, p):
+        if p is None:
+            return np.log1p(x)
+        return boxcox1p(x.fillna(p['median']) + p['shift'], p['lambda'])
+
+class Binner(ColumnStep):
+    """Bin codes with the edges of the training column (quantile or uniform bins)."""
+
+    def __init__(self, bins=5, strategy='quantile', labels=False):
+        self.bins = bins
+        self.strategy = strategy
+        self.labels = labels
+
+    def fit_column(self, x):
+        if self.strategy == 'quantile':
+            return pd.qcut(x, q=self.bins, retbins=True, duplicates='drop')[1]
+        return pd.cut(x, bins=self.bins, retbins=True)[1]
+
+    def transform_column(self, x, edges):
+        res = pd.cut(x, bins=edges, labels=self.labels, include_lowest=self.strategy == 'quantile')
+        return res.cat.codes if hasattr(res, 'cat') else res
+
+class LabelCodes(ColumnStep):
+    """Codes of the sorted training values (as text); -1 for values not seen in training."""
+
+    def fit_column(self, x):
+        return {v: i for i, v in enumerate(sorted(x.astype(str).unique()))}
+
+    def transform_column(self, x, codes):
+        return x.astype(str).map(codes).fillna(-1).astype('int64')
+
+class Dummies(TransformerMixin, BaseEstimator):
+    """get_dummies(drop_first=True) over the training categories: unknown values at scoring
+    time get all-zero dummies, so the output columns never change."""
+
+    def fit(self, X, y=None):
+        self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        self.n_features_in_ = X.shape[1]
+        self.categories_ = {c: sorted(X[c].dropna().unique()) for c in X.columns}
+        return self
+
+    def transform(self, X):
+        return pd.get_dummies(pd.DataFrame({c: pd.Categorical(X[c], categories=self.categories_[c]) for c in X.columns},
+                                           index=X.index), drop_first=True)
+
+    def get_feature_names_out(self, input_features=None):
+        return np.asarray([f'{c}_{v}' for c in self.feature_names_in_ for v in self.categories_[c][1:]], dtype=object)
+
+class KeepColumnOrder(TransformerMixin, BaseEstimator):
+    """Runs a ColumnTransformer (which puts the transformed columns first), then puts the columns
+    back in the input's order; new ones (dummies) go last, as in the Prima preview."""
+
+    def __init__(self, transformer):
+        self.transformer = transformer
+
+    def fit(self, X, y=None):
+        self.transformer.fit(X, y)
+        return self
+
+    def fit_transform(self, X, y=None):
+        return self._reorder(X, self.transformer.fit_transform(X, y))
+
+    def transform(self, X):
+        return self._reorder(X, self.transformer.transform(X))
+
+    def _reorder(self, X, result):
+        kept = [c for c in X.columns if c in result.columns]
+        return result[kept + [c for c in result.columns if c not in set(kept)]]
+
+class FrameStep(TransformerMixin, BaseEstimator):
+    """Base for whole-frame steps: DataFrame in, DataFrame out."""
+
+    def fit(self, X, y=None):
+        return self
+
+class GroupImputer(FrameStep):
+    """fill_na_groupby: the per-group mean / median / mode of training, then the filled column's."""
+
+    def __init__(self, col, group_col, strategy='median'):
+        self.col = col
+        self.group_col = group_col
+        self.strategy = strategy
+
+    def fit(self, X, y=None):
+        values = X[self.col]
+        if self.strategy == 'mode':
+            self.mapping_ = values.groupby(X[self.group_col]).agg(lambda x: x.mode()[0] if not x.mode().empty else np.nan)
+        else:
+            self.mapping_ = values.groupby(X[self.group_col]).agg(self.strategy)
+        filled = values.fillna(X[self.group_col].map(self.mapping_))
+        if self.strategy == 'mode':
+            self.fallback_ = filled.mode()[0] if not filled.mode().empty else np.nan
+        else:
+            self.fallback_ = filled.agg(self.strategy)
+        return self
+
+    def transform(self, X):
+        X = X.copy()
+        X[self.col] = X[self.col].fillna(X[self.group_col].map(self.mapping_)).fillna(self.fallback_)
+        return X
+
+class TargetMeanEncoder(FrameStep):
+    """target_encode with the category_encoders.TargetEncoder defaults (min_samples_leaf=20, smoothing=10).
+    The target is only read at fit time."""
+
+    def __init__(self, col, target_col):
+        self.col = col
+        self.target_col = target_col
+
+    def fit(self, X, y=None):
+        target = X[self.target_col].astype('float64')
+        keys = X[self.col].astype(object).where(X[self.col].notna(), '__nan__')
+        stats = target.groupby(keys).agg(['sum', 'count'])
+        self.prior_ = target.mean()
+        smoove = expit((stats['count'] - 20) / 10)
+        encoded = self.prior_ * (1 - smoove) + stats['sum'] / stats['count'] * smoove
+        self.missing_ = encoded.pop('__nan__') if '__nan__' in encoded.index else self.prior_
+        self.mapping_ = encoded
+        return self
+
+    def transform(self, X):
+        X = X.copy()
+        encoded = X[self.col].map(self.mapping_).astype('float64').fillna(self.prior_)
+        X[self.col] = encoded.where(X[self.col].notna(), self.missing_)
+        return X
+
+class KNNFill(FrameStep):
+    """One KNNImputer over the numeric columns, fit once; only `columns` take the imputed values."""
+
+    def __init__(self, columns, n_neighbors=5):
+        self.columns = columns
+        self.n_neighbors = n_neighbors
+
+    def fit(self, X, y=None):
+        self.numeric_ = list(X.select_dtypes(include=[np.number]).columns)
+        self.imputer_ = KNNImputer(n_neighbors=self.n_neighbors, keep_empty_features=True).fit(X[self.numeric_])
+        return self
+
+    def transform(self, X):
+        X = X.copy()
+        imputed = self.imputer_.transform(X[self.numeric_])
+        for col in self.columns:
+            X[col] = imputed[:, self.numeric_.index(col)]
+        return X
+'''
+
+def _column_estimator(step: Step) -> str:
+    op = step.operation
+    params = step.params if step.params else {}
+    if op == "fill_na_const":
+        return f"SimpleImputer(strategy='constant', fill_value={params.get('value', 0)!r}, keep_empty_features=True)"
+    if op == "bin_numeric":
+        labels = params.get('labels', False)
+        labels = False if str(labels) == "False" else labels
+        return f"Binner(bins={int(params.get('bins', 5))}, strategy={params.get('strategy', 'quantile')!r}, labels={labels!r})"
+    return _COLUMN_ESTIMATORS[op]
+
+def _is_column_step(step: Step) -> bool:
+    return step.operation == "fill_na_const" or step.operation == "bin_numeric" or step.operation in _COLUMN_ESTIMATORS
+
+def _sklearn_stages(steps: List[Step]) -> Tuple[List[Step], List[list]]:
+    """
+    Splits the planned steps into the training row filters and the pipeline stages:
+    ("columns", [steps]) for a ColumnTransformer, ("knn", [steps]) for one KNNFill,
+    ("frame", [step]) for everything else.
+    """
+    filters, stages = [], []
+    for step in steps:
+        if step.operation in ROW_FILTER_OPS:
+            filters.append(step)
+            continue
+        last = stages[-1] if stages else None
+        if _is_column_step(step):
+            col = transformer.resolve_column(step)
+            # A column can only be transformed once per ColumnTransformer
+            if last and last[0] == "columns" and col not in {transformer.resolve_column(s) for s in last[1]}:
+                last[1].append(step)
+            else:
+                stages.append(["columns", [step]])
+        elif step.operation == "fill_na_knn":
+            if last and last[0] == "knn":
+                last[1].append(step)
+            else:
+                stages.append(["knn", [step]])
+        else:
+            stages.append(["frame", [step]])
+    return filters, stages
+
+def _column_transformer_code(n: int, steps: List[Step]) -> str:
+    # Same transformer and params on several columns -> one entry
+    entries: dict = {}
+    for step in steps:
+        entries.setdefault((step.operation, _column_estimator(step)), []).append(transformer.resolve_column(step))
+    lines = [f"            ('{op}_{i}', {estimator}, {cols!r}),"
+             for i, ((op, estimator), cols) in enumerate(entries.items())]
+    return "\n".join([f"        ('columns_{n}', KeepColumnOrder(ColumnTransformer(["] + lines +
+                     ["        ], remainder='passthrough', verbose_feature_names_out=False, n_jobs=N_JOBS",
+                      "        ).set_output(transform='pandas'))),"])
+
+def generate_sklearn_pipeline_code(recipe: Recipe) -> str:
+    """
+    A script that fits the recipe as a sklearn Pipeline once, saves it with joblib,
+    and transforms new files with the saved pipeline (fixed output columns, no refit).
+    """
+    plan, schema_dtypes = _export_plan(recipe)
+    # New files are not projected on load: they get the pruned columns' drop steps back
+    filters, stages = _sklearn_stages(plan.load_drops + plan.steps)
+
+    # --- 1. STAGES ---
+    functions, pipeline_lines = [], []
+    for n, (kind, steps) in enumerate(stages, start=1):
+        step = steps[0]
+        params = step.params if step.params else {}
+        col = transformer.resolve_column(step)
+        if kind == "columns":
+            pipeline_lines.append(_column_transformer_code(n, steps))
+        elif kind == "knn":
+            cols = [transformer.resolve_column(s) for s in steps]
+            if len(cols) > 1:
+                pipeline_lines.append("        # One imputer for these fill_na_knn steps: each column is imputed "
+                                      "from the data as it was before them")
+            pipeline_lines.append(f"        ('knn_{n}', KNNFill(columns={cols!r})),")
+        elif step.operation == "fill_na_groupby":
+            pipeline_lines.append(f"        ('{step.operation}_{n}', GroupImputer({col!r}, {params.get('group_col')!r}, "
+                                  f"{params.get('strategy', 'median')!r})),")
+        elif step.operation == "target_encode":
+            pipeline_lines.append(f"        ('{step.operation}_{n}', TargetMeanEncoder({col!r}, {params.get('target_col')!r})),")
+        else:
+            # Stateless steps: the same code as the in-memory script, as a function
+            _, lines = _single_step_code(step.operation, col, params)
+            functions += [f"def step_{n}(df):", f"    # {step.operation}" + (f" on {col}" if col else ""),
+                          "    df = df.copy()"] + _indent(lines) + ["    return df", ""]
+            pipeline_lines.append(f"        ('{step.operation}_{n}', FunctionTransformer(step_{n})),")
+
+    filter_lines = []
+    for step in filters:
+        _, lines = _single_step_code(step.operation, transformer.resolve_column(step), step.params or {})
+        filter_lines += _indent(lines)
+
+    # --- 2. ASSEMBLE SCRIPT ---
+    script = []
+    script.append("# ==========================================")
+    script.append("# GENERATED PREPROCESSING PIPELINE (SKLEARN)")
+    script.append("#   python pipeline.py fit [dataset.csv]                 fits once, saves pipeline.joblib")
+    script.append("#   python pipeline.py transform new.csv [output.csv]    reuses the saved pipeline, no refit")
+    script.append("# ==========================================")
+    script.append("\n".join([
+        "import sys",
+        "import warnings",
+        "import joblib",
+        "import numpy as np",
+        "import pandas as pd",
+        "from scipy.special import boxcox1p, expit",
+        "from scipy.stats import boxcox_normmax",
+        "from sklearn.base import BaseEstimator, OneToOneFeatureMixin, TransformerMixin",
+        "from sklearn.compose import ColumnTransformer",
+        "from sklearn.impute import KNNImputer, SimpleImputer",
+        "from sklearn.pipeline import Pipeline",
+        "from sklearn.preprocessing import (FunctionTransformer, MaxAbsScaler, MinMaxScaler, OrdinalEncoder,\n"
+        "    PolynomialFeatures, RobustScaler, StandardScaler)",
+        "warnings.filterwarnings('ignore')",
+    ]))
+
+    script.append("\n# --- 1. SETTINGS ---")
+    script.append("MODEL_PATH = 'pipeline.joblib'")
+    script.append("N_JOBS = -1               # Columns of a ColumnTransformer are transformed in parallel")
+    script.append(f"CHUNK_ROWS = {settings.EXECUTOR_CHUNK_ROWS}      # New files are transformed chunk by chunk")
+    script.append(f"DTYPES = {schema_dtypes!r}")
+    script.append(_SKLEARN_HELPERS)
+
+    script.append("# --- 3. RECIPE STEPS ---")
+    script.append("def filter_training_rows(df):")
+    script.append("    # Row filters clean the training data only: the fitted pipeline never drops rows")
+    script.append("\n".join(filter_lines + ["    return df"]) + "\n")
+    if functions:
+        script.append("\n".join(functions))
+    script.append("def build_pipeline():")
+    script.append("    return Pipeline([")
+    script.append("\n".join(pipeline_lines) if pipeline_lines
+                  else "        ('identity', FunctionTransformer()),")
+    script.append("    ])")
+
+    script.append("\n# --- 4. FIT ONCE / TRANSFORM MANY ---")
+    script.append('''def fit(source='dataset.csv', output='processed_data.csv'):
+    df = filter_training_rows(pd.read_csv(source, dtype=DTYPES))
+    pipeline = build_pipeline()
+    result = pipeline.fit_transform(df)
+    # The artifact refers to the classes and functions above: load it from this script
+    joblib.dump({'pipeline': pipeline, 'columns': list(result.columns)}, MODEL_PATH)
+    result.to_csv(output, index=False)
+    print(f'Fitted on {len(df)} rows, saved {MODEL_PATH}. Output shape: {result.shape}')
+
+def transform(source, output='transformed_data.csv'):
+    artifact = joblib.load(MODEL_PATH)
+    rows = 0
+    for i, chunk in enumerate(pd.read_csv(source, dtype=DTYPES, chunksize=CHUNK_ROWS)):
+        # Same columns, in the same order, as at fit time
+        result = artifact['pipeline'].transform(chunk).reindex(columns=artifact['columns'])
+        result.to_csv(output, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        rows += len(result)
+    print(f'Transformed {rows} rows into {output}')
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'fit'
+    if command == 'fit':
+        fit(*sys.argv[2:])
+    elif command == 'transform':
+        transform(*sys.argv[2:])
+    else:
+        sys.exit('usage: python pipeline.py fit [dataset.csv] | transform new.csv [output.csv]')''')
+
+    return "\n".join(script)
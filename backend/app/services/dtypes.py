@@ -0,0 +1,156 @@
+"""
+Storage dtypes: the narrowest dtype that holds a column without loss.
+
+pandas reads a CSV as int64 / float64 / object. The storage dtypes are picked
+once, from the sample at upload, and stored in schema.json:
+
+- integers:  int8 / int16 / int32 when the values fit
+- floats:    float32 when every value round-trips exactly
+- strings:   `category` when few distinct values, Arrow-backed strings otherwise
+
+Every loader narrows its frames to these (file_manager.read_dataset and
+iter_dataset_chunks). A frame that does not fit (e.g. a chunk with a larger
+integer than the sample) keeps the wider dtype for that column: narrowing never
+changes a value.
+
+Steps compute on the read_csv dtypes. Right before a step runs, the columns it
+reads are widened back (`widen`), so recipe results do not depend on storage.
+Columns no step reads stay narrow through the whole preview.
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.config import settings
+
+INT_DTYPES = ["int8", "int16", "int32", "int64"]
+STRING_STORAGE = "string[pyarrow]"
+
+def is_number(dtype) -> bool:
+    """np.issubdtype(dtype, np.number), also for pandas extension dtypes (which are never numbers here)."""
+    return isinstance(dtype, np.dtype) and np.issubdtype(dtype, np.number)
+
+def compute_dtype(dtype) -> Optional[str]:
+    """The dtype read_csv would give for a narrowed column; None if `dtype` is not a storage dtype."""
+    if isinstance(dtype, (pd.CategoricalDtype, pd.StringDtype)):
+        return "object"
+    if isinstance(dtype, np.dtype):
+        if dtype.kind in "iu" and dtype.itemsize < 8:
+            return "int64"
+        if dtype.kind == "f" and dtype.itemsize < 8:
+            return "float64"
+    return None
+
+# ====================================================
+#  INFERENCE (once, on the sample)
+# ====================================================
+
+def _is_text(series: pd.Series) -> bool:
+    return pd.api.types.infer_dtype(series, skipna=True) in ["string", "empty"]
+
+def _narrowest_int(series: pd.Series, start: str = "int8") -> Optional[str]:
+    if series.empty:
+        return start
+    low, high = series.min(), series.max()
+    for dtype in INT_DTYPES[INT_DTYPES.index(start):]:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    return None
+
+def _float32_exact(series: pd.Series) -> bool:
+    values = series.to_numpy()
+    with np.errstate(over="ignore"):
+        return np.array_equal(values.astype("float32").astype("float64"), values, equal_nan=True)
+
+def infer_storage_dtypes(df: pd.DataFrame) -> Dict[str, str]:
+    """Storage dtype per column of a frame as read_csv gives it (only the columns that can shrink)."""
+    storage = {}
+    for col in df.columns:
+        series = df[col]
+        dtype = series.dtype
+        if dtype == "int64":
+            narrow = _narrowest_int(series)
+            if narrow != "int64":
+                storage[str(col)] = narrow
+        elif dtype == "float64":
+            if _float32_exact(series):
+                storage[str(col)] = "float32"
+        elif dtype == object and _is_text(series):
+            present = series.count()
+            distinct = series.nunique()
+            if present and distinct <= settings.DTYPE_CATEGORY_MAX_RATIO * present:
+                storage[str(col)] = "category"
+            else:
+                storage[str(col)] = STRING_STORAGE
+    return storage
+
+# ====================================================
+#  NARROW (on load) / WIDEN (before a step)
+# ====================================================
+
+def _narrow_series(series: pd.Series, target: str) -> pd.Series:
+    dtype = series.dtype
+    if target in INT_DTYPES:
+        if dtype != "int64":
+            return series
+        narrow = _narrowest_int(series, target)
+        return series if narrow in [None, "int64"] else series.astype(narrow)
+    if target == "float32":
+        return series.astype("float32") if dtype == "float64" and _float32_exact(series) else series
+    if dtype != object or not _is_text(series):
+        return series
+    if target == "category":
+        return series.astype("category")
+    return series.astype(STRING_STORAGE)
+
+def narrow(df: pd.DataFrame, storage: Optional[Dict[str, str]]) -> pd.DataFrame:
+    """Converts the columns of a freshly loaded frame to their storage dtypes, where they fit."""
+    if not storage or not settings.OPTIMIZE_DTYPES:
+        return df
+    for col in df.columns:
+        target = storage.get(str(col))
+        if target is not None:
+            df[col] = _narrow_series(df[col], target)
+    return df
+
+def widen_series(series: pd.Series) -> pd.Series:
+    target = compute_dtype(series.dtype)
+    if target is None:
+        return series
+    if target == "object":
+        values = series.astype(object)
+        # Arrow strings give pd.NA where read_csv gives NaN
+        return values.where(series.notna(), np.nan)
+    return series.astype(target)
+
+def widen(df: pd.DataFrame, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Back to read_csv dtypes, in place, for `columns` (default: all). Returns `df`."""
+    wanted = None if columns is None else set(columns)
+    # By position: a frame can hold two columns with the same name
+    for i, (col, dtype) in enumerate(df.dtypes.items()):
+        if (wanted is None or col in wanted) and compute_dtype(dtype) is not None:
+            df.isetitem(i, widen_series(df.iloc[:, i]))
+    return df
+
+def compute_view(df: pd.DataFrame) -> pd.DataFrame:
+    """An empty frame with the columns of `df` in their read_csv dtypes (for dtype-based selection)."""
+    return widen(df.iloc[:0].copy())
+
+# ====================================================
+#  REPORT
+# ====================================================
+
+def memory_report(df: pd.DataFrame, storage: Dict[str, str]) -> dict:
+    """Deep memory of `df` as read_csv gives it and once narrowed, with what changed per column."""
+    before = int(df.memory_usage(deep=True, index=False).sum())
+    narrowed = narrow(df.copy(), storage)
+    after = int(narrowed.memory_usage(deep=True, index=False).sum())
+    return {
+        "before_bytes": before,
+        "after_bytes": after,
+        "saved_pct": round(100.0 * (before - after) / before, 1) if before else 0.0,
+        "columns": {str(col): {"from": str(df[col].dtype), "to": str(narrowed[col].dtype)}
+                    for col in df.columns if str(narrowed[col].dtype) != str(df[col].dtype)},
+    }
@@ -0,0 +1,137 @@
+"""
+Out-of-core execution of a Recipe over the FULL uploaded dataset.
+
+The data is never loaded whole. Execution runs in two kinds of passes over the chunks:
+
+1. FIT passes: each stateful step (mean, scaler, encoder...) needs statistics of the
+   data as it looks right before that step. Steps whose inputs do not depend on each
+   other are fitted together in a single pass; a step that needs the output of a step
+   that is still unfitted waits for the next pass.
+2. TRANSFORM pass: every chunk goes through all steps with the fitted params and is
+   appended to the output file.
+
+The fit passes themselves are planned in fitting.fit_recipe_on_chunks; this module
+only wires them to the session files. Both kinds of pass run the planner's optimized
+steps and read only the source columns the plan needs.
+"""
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+import pandas as pd
+
+from app.config import settings
+from app.models.recipe import Recipe
+from app.services import dtypes, file_manager, planner, recipe_cache, transformer
+from app.services.fitting import FittedRecipe, fit_recipe_on_chunks, plan_fit_passes
+from app.services.planner import Plan
+
+# on_progress(done, total): called after every chunk; units are source rows over all passes.
+# It may raise to abort the run (jobs use this for cancellation).
+ProgressCallback = Callable[[int, int], None]
+
+class _ProgressTracker:
+    """Counts rows read across all passes and reports them against the planned total."""
+
+    def __init__(self, total: int, on_progress: Optional[ProgressCallback]):
+        self.total = max(total, 1)
+        self.done = 0
+        self.on_progress = on_progress
+
+    def track(self, chunks: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        for chunk in chunks:
+            yield chunk
+            self.done += len(chunk)
+            if self.on_progress:
+                self.on_progress(min(self.done, self.total), self.total)
+
+def plan_recipe(recipe: Recipe) -> Plan:
+    """
+    Optimizes the recipe against the session's schema (column-aware rewrites need it).
+    Batched steps become single-column steps: fitting works per column.
+    """
+    steps = recipe.steps
+    if any(step.selector is not None for step in steps):
+        # Matched once on the sample, so every chunk (and every new file) gets the same columns
+        steps = transformer.bind_steps(steps, recipe_cache.load_sample(recipe.session_id))
+
+    schema = recipe_cache.load_schema(recipe.session_id)
+    source_columns = [c["name"] for c in schema["columns"]] if schema else None
+    return planner.optimize(transformer.expand_steps(steps), source_columns)
+
+def fit_file(recipe: Recipe, on_progress: Optional[ProgressCallback] = None,
+             _tracker: Optional[_ProgressTracker] = None, _plan: Optional[Plan] = None) -> FittedRecipe:
+    """Fits the recipe over the session's full original.csv and persists the result."""
+    session_dir = settings.UPLOAD_DIR / recipe.session_id
+    source_path = session_dir / "original.csv"
+    plan = _plan or plan_recipe(recipe)
+
+    if _tracker is None:
+        rows = file_manager.read_upload_meta(session_dir).get("rows", 0)
+        _tracker = _ProgressTracker(rows * len(plan_fit_passes(plan.steps)), on_progress)
+
+    def chunks():
+        return _tracker.track(file_manager.iter_dataset_chunks(source_path, settings.EXECUTOR_CHUNK_ROWS,
+                                                               columns=plan.columns))
+
+    params = fit_recipe_on_chunks(chunks, plan.steps)
+    # New files are not projected on load: they get the pruned columns' drop steps back
+    fitted = FittedRecipe(steps=plan.load_drops + plan.steps,
+                          params=[{} for _ in plan.load_drops] + params, fitted_on="full")
+    fitted.save(session_dir)
+    return fitted
+
+def transform_to_csv(fitted: FittedRecipe, chunks: Iterator[pd.DataFrame], output_path: Path) -> dict:
+    """Streams chunks through a fitted recipe into a CSV file, one chunk in memory at a time."""
+    tmp_path = output_path.with_suffix(".tmp")
+    rows_in, rows_out, columns = 0, 0, None
+
+    def counted(source):
+        nonlocal rows_in
+        for chunk in source:
+            rows_in += len(chunk)
+            yield chunk
+
+    for df in fitted.transform_chunks(counted(chunks)):
+        # Columns no step read are still in storage dtypes; write them as they were read
+        df = dtypes.widen(df)
+        if columns is None:
+            # Fitted encoders give every chunk the same columns; reindex guards the order
+            columns = list(df.columns)
+            df.iloc[0:0].to_csv(tmp_path, index=False)
+        df.reindex(columns=columns).to_csv(tmp_path, mode="a", header=False, index=False)
+        rows_out += len(df)
+
+    if columns is None:
+        tmp_path.write_text("")
+    tmp_path.replace(output_path)
+
+    return {
+        "rows_in": rows_in,
+        "rows_out": rows_out,
+        "columns": columns or [],
+        "output": output_path.name,
+    }
+
+def run_recipe_on_file(recipe: Recipe, output_path: Optional[Path] = None,
+                       on_progress: Optional[ProgressCallback] = None) -> dict:
+    """
+    Runs the recipe over the session's original.csv in bounded memory and
+    writes the result to `output_path` (default: <session>/processed.csv).
+    """
+    session_dir = settings.UPLOAD_DIR / recipe.session_id
+    source_path = session_dir / "original.csv"
+    if output_path is None:
+        output_path = session_dir / "processed.csv"
+
+    # Every fit pass plus the transform pass reads the whole file once
+    plan = plan_recipe(recipe)
+    rows = file_manager.read_upload_meta(session_dir).get("rows", 0)
+    tracker = _ProgressTracker(rows * (len(plan_fit_passes(plan.steps)) + 1), on_progress)
+
+    # 1. FIT (also persisted, so new files can be transformed with the same params)
+    fitted = fit_file(recipe, _tracker=tracker, _plan=plan)
+
+    # 2. TRANSFORM, appending chunk by chunk (the projection already did the load drops)
+    projected = FittedRecipe(steps=plan.steps, params=fitted.params[len(plan.load_drops):], fitted_on="full")
+    chunks = file_manager.iter_dataset_chunks(source_path, settings.EXECUTOR_CHUNK_ROWS, columns=plan.columns)
+    return transform_to_csv(projected, tracker.track(chunks), output_path)
@@ -1,41 +1,579 @@
-import shutil
+import hashlib
+import io
+import json
+import os
+import threading
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.feather as feather
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
-from fastapi import UploadFile, HTTPException
+from typing import Iterator, List, Optional, Tuple
+from fastapi import BackgroundTasks, HTTPException, Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
 from app.config import settings
+from app.services import analysis_cache, blob_store, cleanup, dtypes, metrics, recipe_cache, session_manifest
+from app.services.sampling import RecordSampler
 
-def save_upload_and_create_sample(session_id: str, file: UploadFile):
-    
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+UPLOAD_WRITE_BUFFER = 1024 * 1024  # Disk writes are batched to ~1 MB
+UPLOAD_META_FILE = "upload.json"
+SAMPLE_META_FILE = "sample.json"    # How sample.csv was drawn (method, size, fraction, seed)
+
+class _FilePartCollector:
+    """
+    Multipart parser callbacks that keep the bytes of the "file" field only.
+    The callbacks are sync, so data is queued here and drained by the async loop.
+    """
+
+    def __init__(self):
+        self.filename: Optional[str] = None
+        self._pending: List[bytes] = []
+        self._in_file = False
+        self._headers = {}
+        self._field = b""
+        self._value = b""
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        }
+
+    def drain(self) -> List[bytes]:
+        pending, self._pending = self._pending, []
+        return pending
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._field.lower()] = self._value
+        self._field, self._value = b"", b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._in_file = options.get(b"name") == b"file"
+        if self._in_file:
+            self.filename = options.get(b"filename", b"").decode("utf-8", errors="replace")
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self._pending.append(data[start:end])
+
+    def _on_part_end(self):
+        self._in_file = False
+
+class _UploadSink:
+    """
+    Writes the uploaded bytes to disk (in a worker thread) while hashing them
+    and feeding them to the row sampler, which also counts the rows.
+    """
+
+    def __init__(self, path: Path, max_bytes: int, sampler: RecordSampler):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.sampler = sampler
+        self.size = 0
+        self.hasher = hashlib.sha256()
+        self._buffer: List[bytes] = []
+        self._buffered = 0
+        self._file = None
+
+    async def open(self):
+        self._file = await run_in_threadpool(self.path.open, "wb")
+
+    async def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise HTTPException(status_code=413, detail=f"File exceeds the {settings.MAX_FILE_SIZE_MB} MB limit.")
+
+        self.hasher.update(data)
+        try:
+            self.sampler.feed(data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= UPLOAD_WRITE_BUFFER:
+            await self.flush()
+
+    async def flush(self):
+        if self._buffer:
+            blob = b"".join(self._buffer)
+            self._buffer, self._buffered = [], 0
+            await run_in_threadpool(self._file.write, blob)
+
+    async def close(self):
+        if self._file is not None:
+            await self.flush()
+            await run_in_threadpool(self._file.close)
+            self._file = None
+
+    async def abort(self):
+        if self._file is not None:
+            await run_in_threadpool(self._file.close)
+            self._file = None
+
+    async def finish(self):
+        self.sampler.finish()
+        await self.close()
+
+    @property
+    def rows(self) -> int:
+        return self.sampler.rows
+
+def _discard_upload(session_id: str):
+    """
+    A failed upload leaves nothing behind: not its folder, not its blob references
+    (the blobs themselves go with the next garbage collection), not a manifest row.
+    The previous upload under this id was detached already, so it goes too.
+    """
+    cleanup.delete_session(session_id, "upload failed")
+
+async def save_upload_and_create_sample(session_id: str, request: Request, background_tasks: BackgroundTasks,
+                                        sample_size: Optional[int] = None, sampling: str = "reservoir",
+                                        stratify_by: Optional[str] = None, seed: Optional[int] = None):
+    """
+    Streams a multipart CSV upload to disk without blocking the event loop.
+    Size limit, content hash, row count and the sample all come from the same
+    single pass over the incoming bytes; the file is not read back.
+    The sample is drawn from the whole file (see services/sampling.py), not its head.
+    """
+    max_bytes = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+
+    sample_size = sample_size or settings.SAMPLE_ROWS
+    if not 1 <= sample_size <= settings.SAMPLE_MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"sample_size must be between 1 and {settings.SAMPLE_MAX_ROWS}.")
+    try:
+        sampler = RecordSampler(sample_size, method=sampling, seed=seed,
+                                stratify_by=stratify_by, max_strata=settings.SAMPLE_MAX_STRATA)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 1. Reject early when the client already announces a too large body
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + 64 * 1024:
+        raise HTTPException(status_code=413, detail=f"File exceeds the {settings.MAX_FILE_SIZE_MB} MB limit.")
+
+    _, content_options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = content_options.get(b"boundary")
+    if not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload.")
+
+    if session_id == session_manifest.BLOB_DIR_NAME:
+        raise HTTPException(status_code=400, detail="Invalid session id.")
     session_folder=settings.UPLOAD_DIR/session_id
     session_folder.mkdir(parents=True, exist_ok=True)
 
     original_path = session_folder / "original.csv"
     sample_path = session_folder / "sample.csv"
 
+    # The previous upload's files may be shared with other sessions: unlink, never overwrite
+    blob_store.detach(session_folder)
+    # A columnar copy from a previous upload under this id would be stale
+    with columnar_lock(session_folder):
+        columnar_path(original_path).unlink(missing_ok=True)
+        _skipped_marker(original_path).unlink(missing_ok=True)
+    forget_columnar(session_folder)
+
+    # 2. Stream: parse multipart -> hash/count/sample -> disk
+    collector = _FilePartCollector()
+    parser = MultipartParser(boundary, collector.callbacks())
+    sink = _UploadSink(original_path, max_bytes, sampler)
+
     try:
-        with original_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        await sink.open()
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if collector.filename is not None and not collector.filename.endswith('.csv'):
+                raise HTTPException(status_code=400, detail="Only CSV files are allowed.")
+            for data in collector.drain():
+                await sink.write(data)
+        parser.finalize()
+        await sink.finish()
+
+        if collector.filename is None:
+            raise HTTPException(status_code=400, detail="No file field in the upload.")
+    except HTTPException:
+        await sink.abort()
+        _discard_upload(session_id)
+        raise
     except Exception as e:
         # cleanup if fail
-        shutil.rmtree(session_folder) 
+        await sink.abort()
+        _discard_upload(session_id)
+        raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
+
+    try:
+        # Stored once per content hash: a file uploaded before becomes a link to the stored copy
+        digest = sink.hasher.hexdigest()
+        await run_in_threadpool(blob_store.share, session_folder, "dataset", digest, ["original.csv"])
+    except Exception as e:
+        _discard_upload(session_id)
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
-    finally:
-        file.file.close() # Important: Release the file handle!
 
-    # 3. Generate the Lightweight Sample (The "Cheat" file)
+    # 3. Generate the Lightweight Sample (The "Cheat" file) from the rows the sampler kept
     try:
-        # We only read the first 1000 rows
-        df = pd.read_csv(original_path, nrows=1000)
-        
-        # Save it back to disk
-        df.to_csv(sample_path, index=False)
-        
+        df, sample_sha256, memory = await run_in_threadpool(_write_sample, session_folder, sampler.sample_bytes())
     except Exception as e:
+        _discard_upload(session_id)
         raise HTTPException(status_code=400, detail=f"File is not a valid CSV: {str(e)}")
 
+    # From here on, any failure also drops the session: it is registered last
+    try:
+        await run_in_threadpool(blob_store.share, session_folder, "sample", sample_sha256,
+                                ["sample.csv", "sample.feather", "schema.json"])
+
+        sample_meta = {**sampler.metadata(), "sample_sha256": sample_sha256}
+        (session_folder / SAMPLE_META_FILE).write_text(json.dumps(sample_meta))
+
+        meta = {
+            "filename": collector.filename,
+            "bytes": sink.size,
+            "rows": sink.rows,
+            "sha256": digest,
+        }
+        (session_folder / UPLOAD_META_FILE).write_text(json.dumps(meta))
+        metrics.UPLOAD_BYTES.observe(meta["bytes"])
+
+        # 4. The full columnar copy is built after the response; readers use the CSV until it lands
+        background_tasks.add_task(convert_csv_to_columnar, original_path,
+                                  pa.Table.from_pandas(df, preserve_index=False).schema)
+
+        # Drop any preview frames and profiles cached for a previous upload under this id
+        recipe_cache.invalidate_session(session_id)
+        analysis_cache.invalidate(session_folder)
+
+        # Index the session; once the columnar copy is counted too, older sessions
+        # make room if the disk quota is passed (background tasks run in order)
+        session_manifest.register(session_id)
+        background_tasks.add_task(session_manifest.refresh_size, session_id)
+        background_tasks.add_task(cleanup.enforce_disk_quota, session_id)
+    except Exception as e:
+        _discard_upload(session_id)
+        raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
+
     return {
         "status": "success",
         "rows_processed": len(df),
+        "rows_total": meta["rows"],
+        "bytes": meta["bytes"],
+        "sha256": meta["sha256"],
+        "sampling": sample_meta,
+        "memory": memory,
         "session_id": session_id,
         "message": "File uploaded and sampled successfully."
-    }
\ No newline at end of file
+    }
+
+def read_upload_meta(session_folder: Path) -> dict:
+    """filename / bytes / rows / sha256 recorded at upload ({} for older sessions)."""
+    try:
+        return json.loads((session_folder / UPLOAD_META_FILE).read_text())
+    except (OSError, ValueError):
+        return {}
+
+def _write_sample(session_folder: Path, sample: bytes) -> Tuple[pd.DataFrame, str, dict]:
+    sample_path = session_folder / "sample.csv"
+    df = pd.read_csv(io.BytesIO(sample))
+
+    # Save it back to disk, plus the typed columnar copy and schema
+    data = df.to_csv(index=False).encode()
+    sample_path.write_bytes(data)
+    write_columnar_copy(pa.Table.from_pandas(df, preserve_index=False), sample_path)
+    memory = write_schema(session_folder, df)
+    return df, hashlib.sha256(data).hexdigest(), memory
+
+# ====================================================
+#  COLUMNAR STORAGE (Arrow IPC / Feather v2)
+# ====================================================
+# Every server process (uvicorn workers, job and preview pools) maps the same files:
+# the pages live once in the OS page cache, however many workers serve the session.
+#
+# Lock protocol, per session: <session>/.columnar.lock (fcntl.flock)
+# - writers hold it exclusively, write a temp file and rename it over the target,
+#   so a reader never maps a half-written file
+# - readers take no lock: the rename is atomic, and a mapping stays valid after its
+#   file is replaced or deleted (it is re-opened when the file's inode/mtime changes)
+# - a reader that finds no columnar copy builds it, unless another process holds the
+#   lock (it is building it right now): then this read uses the CSV
+# A CSV linked into the blob store is resolved first: its columnar copy (and lock)
+# live next to the stored file, shared by every session that references it.
+
+COLUMNAR_LOCK_FILE = ".columnar.lock"
+MAPPED_FILES_MAX = 64   # Open mappings kept per process (a mapping costs address space, not RAM)
+
+_mapped: "OrderedDict[Path, Tuple[tuple, pa.Table]]" = OrderedDict()
+_mapped_lock = threading.Lock()
+
+def columnar_path(csv_path: Path) -> Path:
+    # sample.csv -> sample.feather, original.csv -> original.feather
+    return csv_path.with_suffix(".feather")
+
+@contextmanager
+def columnar_lock(session_folder: Path, wait: bool = True):
+    """Yields True while holding the session's writer lock; False when `wait` is off and it is taken."""
+    if fcntl is None:
+        yield True   # No flock (Windows): single-process deployments only
+        return
+    with open(session_folder / COLUMNAR_LOCK_FILE, "a+") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _skipped_marker(csv_path: Path) -> Path:
+    # Left by a conversion that failed, so readers do not retry it on every request
+    return columnar_path(csv_path).with_suffix(".feather.skipped")
+
+def _publish_columnar(table: pa.Table, csv_path: Path):
+    # Caller holds the session's columnar lock
+    target = columnar_path(csv_path)
+    tmp_target = target.with_suffix(f".feather.{os.getpid()}.tmp")
+    # Uncompressed on purpose: only uncompressed IPC files can be memory-mapped without decoding
+    feather.write_feather(table, tmp_target, compression="uncompressed")
+    tmp_target.replace(target)
+
+def write_columnar_copy(table: pa.Table, csv_path: Path):
+    csv_path = csv_path.resolve()
+    with columnar_lock(csv_path.parent):
+        _publish_columnar(table, csv_path)
+
+def _file_token(path: Path) -> tuple:
+    stat = path.stat()
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+def _is_fresh(csv_path: Path) -> bool:
+    target = columnar_path(csv_path)
+    return target.exists() and target.stat().st_mtime_ns >= csv_path.stat().st_mtime_ns
+
+def materialize_columnar(csv_path: Path, wait: bool = True) -> bool:
+    """
+    Builds the columnar copy of a session CSV once, whichever process gets there first.
+    True when the copy exists afterwards. wait=False gives up at once if another process is writing it.
+    """
+    session_folder, csv_path = csv_path.parent, csv_path.resolve()
+    if _is_fresh(csv_path):
+        return True
+    marker = _skipped_marker(csv_path)
+    if marker.exists() and marker.stat().st_mtime_ns >= csv_path.stat().st_mtime_ns:
+        return False
+    with columnar_lock(csv_path.parent, wait) as locked:
+        if not locked:
+            return False
+        if _is_fresh(csv_path):
+            return True   # Built by the process we waited for
+        if csv_path.name == "sample.csv":
+            table = pa.Table.from_pandas(pd.read_csv(csv_path, dtype=schema_dtypes(session_folder)),
+                                         preserve_index=False)
+            _publish_columnar(table, csv_path)
+        else:
+            # The full file gets the sample's types (see convert_csv_to_columnar)
+            sample = columnar_path((session_folder / "sample.csv").resolve())
+            schema = feather.read_table(sample, memory_map=True).schema if sample.exists() else None
+            _convert_csv_to_columnar(csv_path, schema)
+    return columnar_path(csv_path).exists()
+
+def open_columnar(csv_path: Path) -> Optional[pa.Table]:
+    """
+    The memory-mapped columnar copy of a session CSV (building it if missing), None
+    when there is none: the table's buffers point into the mapping, nothing is read
+    until used. A process opens each file once and reuses the mapping.
+    """
+    path = columnar_path(csv_path.resolve())
+    try:
+        token = _file_token(path)
+    except FileNotFoundError:
+        if not csv_path.exists() or not materialize_columnar(csv_path, wait=False):
+            return None
+        token = _file_token(path)
+
+    with _mapped_lock:
+        entry = _mapped.get(path)
+        if entry is not None and entry[0] == token:
+            _mapped.move_to_end(path)
+            return entry[1]
+
+    # The table's buffers keep the mapping alive
+    table = pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+    with _mapped_lock:
+        _mapped[path] = (token, table)
+        _mapped.move_to_end(path)
+        while len(_mapped) > MAPPED_FILES_MAX:
+            _mapped.popitem(last=False)
+    return table
+
+def forget_columnar(session_folder: Path):
+    """Drops this process's mappings of a session's own files, so deleted files free their disk space."""
+    with _mapped_lock:
+        for path in [path for path in _mapped if path.parent == session_folder]:
+            del _mapped[path]
+
+def prune_columnar():
+    """Drops mappings of files another process deleted or replaced (run by every process's cleanup job)."""
+    with _mapped_lock:
+        for path, (token, _) in list(_mapped.items()):
+            try:
+                if _file_token(path) == token:
+                    continue
+            except FileNotFoundError:
+                pass
+            del _mapped[path]
+
+def write_schema(session_folder: Path, df: pd.DataFrame) -> dict:
+    """
+    Stores the dtypes pandas inferred for the sample. Reads of the sample use them all; reads
+    of the whole file only its text ones (see full_read_dtypes), so a column cannot flip type
+    between two requests.
+    Also stores each column's storage dtype (see services/dtypes.py) and returns the memory
+    report of the sample before/after narrowing.
+    """
+    storage = dtypes.infer_storage_dtypes(df)
+    memory = dtypes.memory_report(df, storage)
+    schema = {
+        "columns": [{"name": str(col), "dtype": str(dtype), "storage": storage.get(str(col), str(dtype))}
+                    for col, dtype in df.dtypes.items()],
+        "memory": memory,
+    }
+    (session_folder / "schema.json").write_text(json.dumps(schema))
+    return memory
+
+def read_schema(session_folder: Path) -> Optional[dict]:
+    schema_path = session_folder / "schema.json"
+    if not schema_path.exists():
+        return None
+    return json.loads(schema_path.read_text())
+
+def convert_csv_to_columnar(csv_path: Path, schema: Optional[pa.Schema]):
+    """
+    Streams the CSV into an Arrow IPC file batch by batch (bounded memory),
+    using the sample's Arrow types so the full data gets the same dtypes as the sample.
+    If a later batch does not fit those types, the columnar copy is skipped and
+    readers fall back to the CSV. Skipped too when another process built it already
+    (or the file is in the blob store and was converted for an earlier upload).
+    """
+    csv_path = csv_path.resolve()
+    with columnar_lock(csv_path.parent):
+        if not _is_fresh(csv_path):
+            _convert_csv_to_columnar(csv_path, schema)
+
+def _convert_csv_to_columnar(csv_path: Path, schema: Optional[pa.Schema]):
+    # Caller holds the session's columnar lock
+    target = columnar_path(csv_path)
+    tmp_target = target.with_suffix(f".feather.{os.getpid()}.tmp")
+    convert_options = pa_csv.ConvertOptions(
+        column_types={field.name: field.type for field in schema or [] if not pa.types.is_null(field.type)},
+        strings_can_be_null=True,
+    )
+
+    try:
+        reader = pa_csv.open_csv(csv_path, convert_options=convert_options)
+        with pa.ipc.new_file(tmp_target, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+        tmp_target.replace(target)
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        print(f"⚠️ Columnar copy skipped for {csv_path.name}: {e}")
+        tmp_target.unlink(missing_ok=True)
+        target.unlink(missing_ok=True)
+        _skipped_marker(csv_path).touch()
+
+def schema_dtypes(session_folder: Path) -> Optional[dict]:
+    schema = read_schema(session_folder)
+    if not schema:
+        return None
+    # Datetime-like dtypes cannot be passed to read_csv's dtype=, they stay as parsed
+    return {c["name"]: c["dtype"] for c in schema["columns"]
+            if not c["dtype"].startswith("datetime")}
+
+def full_read_dtypes(session_folder: Path) -> Optional[dict]:
+    """
+    The sample dtypes that hold for every row of the file: its text columns. A column that
+    is int or bool in the sample may have missing values (or text) past it, so read_csv infers those.
+    """
+    sample_dtypes = schema_dtypes(session_folder)
+    if sample_dtypes is None:
+        return None
+    return {c: d for c, d in sample_dtypes.items() if d == "object"}
+
+def storage_dtypes(session_folder: Path) -> Optional[dict]:
+    """Column -> storage dtype, for the columns that get narrowed on load (None for older sessions)."""
+    schema = read_schema(session_folder)
+    if not schema:
+        return None
+    return {c["name"]: c["storage"] for c in schema["columns"]
+            if c.get("storage", c["dtype"]) != c["dtype"]}
+
+def read_dataset(csv_path: Path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Loads a session dataset by its CSV path, narrowed to the storage dtypes.
+    Prefers the memory-mapped columnar copy; falls back to the CSV read with the stored text dtypes.
+    """
+    storage = storage_dtypes(csv_path.parent)
+    table = open_columnar(csv_path)
+    if table is not None:
+        # select() is zero-copy; pandas gets its own (mutable) arrays
+        return dtypes.narrow(arrow_to_pandas(table if columns is None else table.select(columns)), storage)
+
+    df = pd.read_csv(csv_path, usecols=columns, dtype=full_read_dtypes(csv_path.parent))
+    return dtypes.narrow(df, storage)
+
+def iter_dataset_chunks(csv_path: Path, chunk_rows: int, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Yields the dataset in chunks of at most `chunk_rows` rows, with a global row index.
+    The memory-mapped columnar copy is sliced without loading the whole file;
+    otherwise the CSV is read with `chunksize` and the stored text dtypes.
+    Each chunk is narrowed to the storage dtypes on its own (a chunk that does not fit keeps wider ones).
+    """
+    storage = storage_dtypes(csv_path.parent)
+    table = open_columnar(csv_path)
+    if table is not None:
+        if columns is not None:
+            table = table.select(columns)
+        for offset in range(0, table.num_rows, chunk_rows):
+            chunk = dtypes.narrow(arrow_to_pandas(table.slice(offset, chunk_rows)), storage)
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            yield chunk
+        return
+
+    offset = 0
+    for chunk in pd.read_csv(csv_path, usecols=columns, dtype=full_read_dtypes(csv_path.parent), chunksize=chunk_rows):
+        chunk = dtypes.narrow(chunk, storage)
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        offset += len(chunk)
+        yield chunk
+
+def arrow_to_pandas(table: pa.Table) -> pd.DataFrame:
+    """Arrow -> pandas with read_csv's conventions (used for every columnar read)."""
+    df = table.to_pandas()
+    # Arrow gives None for missing strings where read_csv gives NaN.
+    # Keep NaN so ops like astype(str) behave exactly as on the CSV.
+    for col in df.select_dtypes(include=["object"]).columns:
+        if df[col].isna().any():
+            df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
@@ -0,0 +1,618 @@
+"""
+Fit/apply split of the transformer operations.
+
+A fitter sees the data chunk by chunk (`update`) and turns what it collected
+into plain, JSON-serialisable params (`finalize`). `transform_step` then applies
+a step with those params and never looks at global statistics again, so the
+same params give the same result on every chunk.
+
+`fit(df, recipe)` wraps this into a FittedRecipe: fit once (on the sample, or on
+the full file through the executor), then `transform` any number of batches.
+"""
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from pydantic import BaseModel
+from scipy.special import boxcox1p, expit
+from scipy.stats import boxcox_normmax
+from sklearn.impute import KNNImputer
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+from app.config import settings
+from app.models.recipe import Recipe, Step
+from app.services import transformer
+from app.services.sketches import QuantileSketch, Reservoir, RunningMoments, ValueCounter
+from app.services.step_io import describe_step
+
+ChunkSource = Callable[[], Iterator[pd.DataFrame]]
+
+# Params for a step that turned out to be a no-op (missing column, wrong dtype...)
+SKIP = {"skip": True}
+
+def _is_numeric(series: pd.Series) -> bool:
+    return np.issubdtype(series.dtype, np.number)
+
+def _to_python(value):
+    # numpy scalars -> python scalars, so params stay JSON-serialisable
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+def _nan_if_none(value):
+    return np.nan if value is None else value
+
+# ====================================================
+#  FITTERS
+# ====================================================
+
+class StepFitter:
+    """
+    Base fitter. `usable` turns False as soon as a chunk shows the step
+    would be skipped by the transformer (column missing, non-numeric...).
+    """
+    numeric_only = False
+
+    def __init__(self, step: Step):
+        self.step = step
+        self.params = step.params if step.params else {}
+        self.col = transformer.resolve_column(step)
+        self.usable = True
+
+    def update(self, df: pd.DataFrame):
+        if not self.usable:
+            return
+        if self.col not in df.columns or (self.numeric_only and not _is_numeric(df[self.col])):
+            self.usable = False
+            return
+        try:
+            self.collect(df)
+        except Exception as e:
+            # Same outcome as the transformer: the step is logged and skipped
+            print(f"⚠️ Fit Error on {self.step.operation}: {e}")
+            self.usable = False
+
+    def collect(self, df: pd.DataFrame):
+        raise NotImplementedError
+
+    def finalize(self) -> dict:
+        if not self.usable:
+            return SKIP
+        return self.result()
+
+    def result(self) -> dict:
+        raise NotImplementedError
+
+class MomentsFitter(StepFitter):
+    """fill_na_mean, drop_outliers_zscore and the scalers that only need moments."""
+    numeric_only = True
+
+    def __init__(self, step: Step):
+        super().__init__(step)
+        self.moments = RunningMoments()
+
+    def collect(self, df):
+        self.moments.update(df[self.col].to_numpy())
+
+    def result(self):
+        m = self.moments
+        op = self.step.operation
+        if op == "fill_na_mean":
+            return {"value": _to_python(m.mean) if m.count else None}
+        if op == "drop_outliers_zscore":
+            return {"mean": _to_python(m.mean) if m.count else None, "std": _to_python(m.std(ddof=1))}
+        if op == "standard_scaler":
+            std = m.std(ddof=0)
+            scale = 1.0 if not m.count or std < 10 * np.finfo(np.float64).eps else std
+            return {"mean": m.mean if m.count else None, "scale": scale}
+        if op == "minmax_scaler":
+            data_range = m.max - m.min
+            return {"min": _to_python(m.min), "scale": 1.0 if not data_range else _to_python(data_range)}
+        if op == "maxabs_scaler":
+            max_abs = max(abs(m.min), abs(m.max)) if m.count else 0.0
+            return {"scale": _to_python(max_abs) or 1.0}
+        if op == "log_transform":
+            return {"offset": abs(m.min) + 1 if m.count and m.min <= 0 else 0.0}
+        raise ValueError(op)
+
+class QuantileFitter(StepFitter):
+    """fill_na_median, robust_scaler, bin_numeric."""
+    numeric_only = True
+
+    def __init__(self, step: Step):
+        super().__init__(step)
+        self.sketch = QuantileSketch(k=settings.QUANTILE_SKETCH_K)
+        self.moments = RunningMoments()
+
+    def collect(self, df):
+        values = df[self.col].to_numpy()
+        self.sketch.update(values)
+        self.moments.update(values)
+
+    def result(self):
+        op = self.step.operation
+        if op == "fill_na_median":
+            return {"value": _to_python(self.sketch.quantile(0.5))}
+        if op == "robust_scaler":
+            q25, q50, q75 = self.sketch.quantiles([0.25, 0.5, 0.75])
+            iqr = q75 - q25
+            return {"center": _to_python(q50), "scale": 1.0 if not iqr or np.isnan(iqr) else _to_python(iqr)}
+        if op == "bin_numeric":
+            return {"edges": self._bin_edges()}
+        raise ValueError(op)
+
+    def _bin_edges(self) -> list:
+        bins = int(self.params.get('bins', 5))
+        if self.params.get('strategy', 'quantile') == 'quantile':
+            # Same as pd.qcut(..., duplicates='drop')
+            edges = self.sketch.quantiles(np.linspace(0, 1, bins + 1))
+            # The outer edges are exact even once the sketch is approximate
+            edges[0], edges[-1] = self.moments.min, self.moments.max
+            return np.unique(edges).tolist()
+
+        # Same as pd.cut with an integer number of bins
+        mn, mx = self.moments.min, self.moments.max
+        if mn == mx:
+            mn -= 0.001 * abs(mn) if mn != 0 else 0.001
+            mx += 0.001 * abs(mx) if mx != 0 else 0.001
+            return np.linspace(mn, mx, bins + 1).tolist()
+        edges = np.linspace(mn, mx, bins + 1)
+        edges[0] -= (mx - mn) * 0.001
+        return edges.tolist()
+
+class VocabularyFitter(StepFitter):
+    """fill_na_mode and the vocabulary-based encoders."""
+
+    def __init__(self, step: Step):
+        super().__init__(step)
+        self.counter = ValueCounter(dropna=True)
+
+    def collect(self, df):
+        values = df[self.col]
+        if self.step.operation == "label_encode":
+            values = values.astype(str)
+        self.counter.update(values)
+
+    def result(self):
+        op = self.step.operation
+        if op == "fill_na_mode":
+            return {"value": _to_python(self.counter.mode())}
+        return {"categories": [_to_python(v) for v in self.counter.values()]}
+
+class BoxCoxFitter(StepFitter):
+    numeric_only = True
+
+    def __init__(self, step: Step):
+        super().__init__(step)
+        self.moments = RunningMoments()
+        self.sketch = QuantileSketch(k=settings.QUANTILE_SKETCH_K)
+        self.reservoir = Reservoir(settings.BOXCOX_SAMPLE_ROWS)
+
+    def collect(self, df):
+        values = df[self.col]
+        self.moments.update(values.to_numpy())
+        self.sketch.update(values.to_numpy())
+        self.reservoir.update(values.dropna().to_frame())
+
+    def result(self):
+        try:
+            m = self.moments
+            shift = abs(m.min) + 1 if m.min <= 0 else 0.0
+            clean = self.reservoir.rows[self.col].astype("float64") + shift
+            lambda_val = boxcox_normmax(clean)
+            return {"lambda": _to_python(lambda_val), "median": _to_python(self.sketch.quantile(0.5)), "shift": _to_python(shift)}
+        except Exception as e:
+            print(f"⚠️ Box-Cox failed on {self.col}, falling back to Log1p. Error: {e}")
+            return {"fallback": True}
+
+class KNNFitter(StepFitter):
+    """Keeps a uniform sample of the numeric rows as the neighbour reference set."""
+    numeric_only = True
+
+    def __init__(self, step: Step):
+        super().__init__(step)
+        self.columns = None
+        self.reservoir = Reservoir(settings.KNN_REFERENCE_ROWS)
+
+    def collect(self, df):
+        numeric_df = df.select_dtypes(include=[np.number])
+        if self.columns is None:
+            self.columns = list(numeric_df.columns)
+        self.reservoir.update(numeric_df[self.columns])
+
+    def result(self):
+        rows = self.reservoir.rows
+        if rows is None or rows.empty:
+            return SKIP
+        return {
+            "columns": self.columns,
+            "reference": [[_to_python(v) for v in row] for row in rows.itertuples(index=False)],
+        }
+
+class GroupByFitter(StepFitter):
+    """
+    fill_na_groupby. Besides the per-group value it also tracks how many missing
+    cells each group will fill, so the global fallback is computed on the filled column
+    exactly like the transformer does.
+    """
+
+    def __init__(self, step: Step):
+        super().__init__(step)
+        self.group_col = self.params.get('group_col')
+        self.strategy = self.params.get('strategy', 'median')
+        self.sums = pd.Series(dtype="float64")
+        self.counts = pd.Series(dtype="int64")
+        self.missing = pd.Series(dtype="int64")
+        self.sketches: Dict = {}
+        # Whole-column stats (rows with a missing group key count too)
+        self.column_moments = RunningMoments()
+        self.column_sketch = QuantileSketch(k=settings.QUANTILE_SKETCH_K)
+        self.pair_counts: Optional[pd.Series] = None
+        self.values = ValueCounter(dropna=True)
+
+    def collect(self, df):
+        if self.group_col not in df.columns or self.strategy not in ['mean', 'median', 'mode']:
+            self.usable = False
+            return
+        if self.strategy in ['mean', 'median'] and not _is_numeric(df[self.col]):
+            self.usable = False
+            return
+
+        values, groups = df[self.col], df[self.group_col]
+        self.missing = self.missing.add(groups[values.isna()].value_counts(), fill_value=0)
+
+        if self.strategy == 'mean':
+            self.column_moments.update(values.to_numpy())
+            grouped = values.groupby(groups)
+            self.sums = self.sums.add(grouped.sum(), fill_value=0)
+            self.counts = self.counts.add(grouped.count(), fill_value=0)
+        elif self.strategy == 'median':
+            self.column_sketch.update(values.to_numpy())
+            for key, group_values in values.groupby(groups):
+                self.sketches.setdefault(key, QuantileSketch(k=settings.QUANTILE_SKETCH_K)).update(group_values.to_numpy())
+        else:
+            # value_counts() on the pair drops rows where either side is missing
+            pairs = pd.DataFrame({"group": groups, "value": values}).value_counts()
+            self.pair_counts = pairs if self.pair_counts is None else self.pair_counts.add(pairs, fill_value=0)
+        self.values.update(values)
+
+    def result(self):
+        # 1. Per-group fill value
+        if self.strategy == 'mean':
+            per_group = (self.sums / self.counts.where(self.counts > 0)).dropna()
+        elif self.strategy == 'median':
+            per_group = pd.Series({k: s.quantile(0.5) for k, s in self.sketches.items() if s.count})
+        else:
+            best = {}
+            pair_counts = self.pair_counts if self.pair_counts is not None else pd.Series(dtype="int64")
+            for (key, value), count in pair_counts.items():
+                current = best.get(key)
+                if current is None or count > current[1] or (count == current[1] and value < current[0]):
+                    best[key] = (value, count)
+            per_group = pd.Series({k: v for k, (v, _) in best.items()}, dtype="object")
+
+        # 2. Global fallback on the column AFTER the group fill
+        filled = self.missing.reindex(per_group.index).fillna(0).astype("int64")
+        fallback = None
+        if self.strategy == 'mean':
+            m = self.column_moments
+            total = m.mean * m.count + (filled * per_group).sum()
+            n = m.count + filled.sum()
+            fallback = total / n if n else None
+        elif self.strategy == 'median':
+            # On a copy: result() may be called again
+            merged = self.column_sketch.copy()
+            for key, n in filled.items():
+                merged.update_repeated(float(per_group[key]), int(n))
+            fallback = merged.quantile(0.5) if merged.count else None
+        else:
+            counts = self.values.counts.copy()
+            for key, n in filled.items():
+                if n:
+                    counts[per_group[key]] = counts.get(per_group[key], 0) + n
+            counter = ValueCounter()
+            counter.counts = counts
+            fallback = counter.mode()
+
+        return {
+            "mapping": [[_to_python(k), _to_python(v)] for k, v in per_group.items()],
+            "fallback": _to_python(fallback),
+        }
+
+class TargetEncodingFitter(StepFitter):
+    """Mirrors category_encoders.TargetEncoder defaults (min_samples_leaf=20, smoothing=10)."""
+    MIN_SAMPLES_LEAF = 20
+    SMOOTHING = 10
+
+    def __init__(self, step: Step):
+        super().__init__(step)
+        self.target_col = self.params.get('target_col')
+        self.sums = pd.Series(dtype="float64")
+        self.counts = pd.Series(dtype="int64")
+        self.target = RunningMoments()
+
+    def collect(self, df):
+        if self.target_col not in df.columns or df[self.target_col].isna().any():
+            # The encoder refuses missing targets, so the transformer skips the step
+            self.usable = False
+            return
+        target = df[self.target_col].astype("float64")
+        # Missing categories form their own group, like in category_encoders
+        keys = df[self.col].astype(object).where(df[self.col].notna(), "__nan__")
+        grouped = target.groupby(keys)
+        self.sums = self.sums.add(grouped.sum(), fill_value=0)
+        self.counts = self.counts.add(grouped.count(), fill_value=0)
+        self.target.update(target.to_numpy())
+
+    def result(self):
+        prior = self.target.mean
+        smoove = expit((self.counts - self.MIN_SAMPLES_LEAF) / self.SMOOTHING)
+        encoded = prior * (1 - smoove) + (self.sums / self.counts) * smoove
+        missing = encoded.pop("__nan__") if "__nan__" in encoded.index else prior
+        return {
+            "mapping": [[_to_python(k), _to_python(v)] for k, v in encoded.items()],
+            "missing": _to_python(missing),
+            "prior": _to_python(prior),
+        }
+
+FITTERS = {
+    "fill_na_mean": MomentsFitter,
+    "drop_outliers_zscore": MomentsFitter,
+    "standard_scaler": MomentsFitter,
+    "minmax_scaler": MomentsFitter,
+    "maxabs_scaler": MomentsFitter,
+    "log_transform": MomentsFitter,
+    "fill_na_median": QuantileFitter,
+    "robust_scaler": QuantileFitter,
+    "bin_numeric": QuantileFitter,
+    "fill_na_mode": VocabularyFitter,
+    "one_hot_encode": VocabularyFitter,
+    "label_encode": VocabularyFitter,
+    "ordinal_encode": VocabularyFitter,
+    "box_cox_transform": BoxCoxFitter,
+    "fill_na_knn": KNNFitter,
+    "fill_na_groupby": GroupByFitter,
+    "target_encode": TargetEncodingFitter,
+}
+
+STATEFUL_OPS = set(FITTERS)
+
+def make_fitter(step: Step) -> Optional[StepFitter]:
+    fitter_cls = FITTERS.get(step.operation)
+    return fitter_cls(step) if fitter_cls else None
+
+# ====================================================
+#  APPLY WITH FITTED PARAMS
+# ====================================================
+
+class DuplicateFilter:
+    """Remembers row hashes across chunks, so drop_duplicates works on the whole stream."""
+
+    def __init__(self):
+        self.seen = np.empty(0, dtype="uint64")
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        keep = ~pd.Series(hashes).duplicated().to_numpy()
+        keep &= ~np.isin(hashes, self.seen, assume_unique=False)
+        self.seen = np.union1d(self.seen, hashes[keep])
+        return df[keep]
+
+def transform_step(df: pd.DataFrame, step: Step, params: Optional[dict],
+                   duplicates: Optional[DuplicateFilter] = None) -> pd.DataFrame:
+    """
+    Applies one step with already fitted params. Stateless steps go straight
+    to the transformer. `duplicates` carries drop_duplicates state across chunks.
+    """
+    op = step.operation
+    step_params = step.params if step.params else {}
+    df = transformer.widen_inputs(df, step)
+
+    if op == "drop_duplicates" and duplicates is not None:
+        return duplicates.apply(df)
+    if op not in STATEFUL_OPS:
+        return transformer.apply_step(df, step)
+    if not params or params.get("skip"):
+        return df
+
+    col = transformer.resolve_column(step)
+    if col not in df.columns:
+        print(f"⚠️ SKIPPING {op}: Column '{col}' not found in data.")
+        return df
+
+    try:
+        if op in ["fill_na_mean", "fill_na_median", "fill_na_mode"]:
+            df[col] = df[col].fillna(_nan_if_none(params["value"]))
+
+        elif op == "drop_outliers_zscore":
+            mean, std = _nan_if_none(params["mean"]), _nan_if_none(params["std"])
+            if std != 0:
+                df = df[np.abs((df[col] - mean) / std) < float(step_params.get('threshold', 3))]
+
+        elif op == "fill_na_knn":
+            columns = params["columns"]
+            imputer = KNNImputer(n_neighbors=5)
+            imputer.fit(pd.DataFrame(params["reference"], columns=columns, dtype="float64"))
+            imputed = imputer.transform(df[columns])
+            df[col] = imputed[:, columns.index(col)]
+
+        elif op == "fill_na_groupby":
+            mapping = dict((k, v) for k, v in params["mapping"])
+            group_col = step_params.get('group_col')
+            df[col] = df[col].fillna(df[group_col].map(mapping))
+            df[col] = df[col].fillna(_nan_if_none(params["fallback"]))
+
+        elif op == "bin_numeric":
+            labels = step_params.get('labels', False)
+            if str(labels) == "False": labels = False
+            include_lowest = step_params.get('strategy', 'quantile') == 'quantile'
+            res = pd.cut(df[col], bins=params["edges"], labels=labels, include_lowest=include_lowest)
+            df[col] = res.cat.codes if hasattr(res, 'cat') else res
+
+        elif op == "log_transform":
+            df[col] = np.log1p(df[col] + params["offset"])
+
+        elif op == "box_cox_transform":
+            if params.get("fallback"):
+                df[col] = np.log1p(df[col])
+            else:
+                clean_col = df[col].fillna(_nan_if_none(params["median"])) + params["shift"]
+                df[col] = boxcox1p(clean_col, params["lambda"])
+
+        elif op == "standard_scaler":
+            df[col] = (df[col] - _nan_if_none(params["mean"])) / params["scale"]
+
+        elif op == "minmax_scaler":
+            df[col] = (df[col] - _nan_if_none(params["min"])) / params["scale"]
+
+        elif op == "robust_scaler":
+            df[col] = (df[col] - _nan_if_none(params["center"])) / params["scale"]
+
+        elif op == "maxabs_scaler":
+            df[col] = df[col] / params["scale"]
+
+        elif op == "one_hot_encode":
+            # Fixed categories: every chunk gets the same dummy columns
+            df[col] = pd.Categorical(df[col], categories=params["categories"])
+            df = pd.get_dummies(df, columns=[col], drop_first=True)
+
+        elif op == "label_encode":
+            codes = {v: i for i, v in enumerate(params["categories"])}
+            df[col] = df[col].astype(str).map(codes).fillna(-1).astype("int64")
+
+        elif op == "ordinal_encode":
+            codes = {v: float(i) for i, v in enumerate(params["categories"])}
+            df[col] = df[col].map(codes).astype("float64")
+
+        elif op == "target_encode":
+            mapping = dict((k, v) for k, v in params["mapping"])
+            encoded = df[col].map(mapping).fillna(params["prior"])
+            df[col] = encoded.where(df[col].notna(), params["missing"])
+
+    except Exception as e:
+        print(f"⚠️ Transformer Error on {op}: {e}")
+
+    return df
+
+# ====================================================
+#  FIT PASSES
+# ====================================================
+
+def _next_fit_group(steps: List[Step], params: List[Optional[dict]]) -> List[int]:
+    """
+    Indices of unfitted steps that can share the next fit pass.
+    A step joins if nothing it reads can be changed by an earlier unfitted step
+    (directly, or through a fitted step that consumes an unfitted output).
+    """
+    group: List[int] = []
+    changed: Set[str] = set()   # Columns whose value depends on an unfitted step
+    changed_all = False         # Rows (or unknown columns) depend on an unfitted step
+
+    for i, step in enumerate(steps):
+        pending = params[i] is None
+        if not group and not pending:
+            continue
+
+        io = describe_step(step)
+        depends = changed_all or io.reads_all or bool(io.reads & changed)
+
+        if pending:
+            if group and depends:
+                break
+            group.append(i)
+
+        if pending or depends:
+            changed |= io.touched
+            changed_all = changed_all or io.changes_rows or io.dynamic_writes
+
+    return group
+
+def plan_fit_passes(steps: List[Step]) -> List[List[int]]:
+    """The groups of step indices fitted together, one list per pass over the data."""
+    params: List[Optional[dict]] = [None if s.operation in STATEFUL_OPS else {} for s in steps]
+    passes = []
+    while any(p is None for p in params):
+        group = _next_fit_group(steps, params)
+        for i in group:
+            params[i] = {}
+        passes.append(group)
+    return passes
+
+def fit_recipe_on_chunks(chunks: ChunkSource, steps: List[Step],
+                         on_pass: Optional[Callable[[int, List[int]], None]] = None) -> List[dict]:
+    """
+    Returns one params dict per step ({} for stateless steps).
+    `chunks` is called once per pass and must yield the source data from the start.
+    """
+    params: List[Optional[dict]] = [None if s.operation in STATEFUL_OPS else {} for s in steps]
+
+    for n_pass, group in enumerate(plan_fit_passes(steps)):
+        fitters = {i: make_fitter(steps[i]) for i in group}
+        last = max(group)
+        duplicates: dict = {}
+
+        if on_pass:
+            on_pass(n_pass, group)
+
+        for chunk in chunks():
+            df = chunk
+            for i in range(last + 1):
+                if i in fitters:
+                    fitters[i].update(transformer.widen_inputs(df, steps[i]))
+                else:
+                    df = transform_step(df, steps[i], params[i], duplicates.setdefault(i, DuplicateFilter()))
+
+        for i, fitter in fitters.items():
+            try:
+                params[i] = fitter.finalize()
+            except Exception as e:
+                print(f"⚠️ Fit failed on {steps[i].operation}: {e}")
+                params[i] = SKIP
+
+    return params
+
+# ====================================================
+#  FITTED RECIPE
+# ====================================================
+
+FITTED_RECIPE_FILE = "fitted_recipe.json"
+
+class FittedRecipe(BaseModel):
+    """
+    A Recipe plus every parameter it learned. `transform` never refits,
+    so train, test and new files all get the same scaling/encoding.
+    """
+    steps: List[Step]
+    params: List[dict]
+    fitted_on: str = "sample"   # "sample" or "full"
+
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        df_result = df.copy()
+        for step, params in zip(self.steps, self.params):
+            df_result = transform_step(df_result, step, params)
+        return df_result
+
+    def transform_chunks(self, chunks: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """Like transform, but drop_duplicates sees the whole stream, not just one chunk."""
+        duplicates: Dict[int, DuplicateFilter] = {}
+        for chunk in chunks:
+            for i, (step, params) in enumerate(zip(self.steps, self.params)):
+                chunk = transform_step(chunk, step, params, duplicates.setdefault(i, DuplicateFilter()))
+            yield chunk
+
+    def save(self, session_dir: Path):
+        (session_dir / FITTED_RECIPE_FILE).write_text(self.model_dump_json())
+
+    @classmethod
+    def load(cls, session_dir: Path) -> Optional["FittedRecipe"]:
+        path = session_dir / FITTED_RECIPE_FILE
+        if not path.exists():
+            return None
+        return cls.model_validate_json(path.read_text())
+
+def fit(df: pd.DataFrame, recipe: Recipe) -> FittedRecipe:
+    """Fits every step of the recipe on an in-memory frame (batched steps are fitted column by column)."""
+    steps = transformer.expand_steps(transformer.bind_steps(recipe.steps, df))
+    params = fit_recipe_on_chunks(lambda: iter([df.copy()]), steps)
+    return FittedRecipe(steps=steps, params=params, fitted_on="sample")
@@ -0,0 +1,346 @@
+"""
+Background jobs: full-data work (export, fit, profile) runs on a bounded
+process pool instead of inside the request handler.
+
+A job's state lives in <session>/jobs/<job_id>.json and is rewritten atomically
+by whoever owns the job at that moment: the API while it is queued, the worker
+while it runs. It therefore survives a worker crash or a server restart; on
+startup, unfinished jobs are requeued.
+
+Cancellation and the time limit are cooperative: the worker checks them every
+time a chunk is processed. A time limit also arms SIGALRM for long single steps.
+
+Every server process (one per uvicorn worker) may requeue a job on startup, so a
+job is claimed before it runs: the runner holds <job_id>.lock (fcntl.flock) for the
+whole run. The OS releases it when the runner dies, which is how a stale job is told
+apart from one a live sibling is running; a second runner of the same job gives up.
+"""
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.models.job import Job
+from app.models.recipe import Recipe
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+JOB_KINDS = ["export", "fit", "profile"]
+ACTIVE_STATUSES = ["queued", "running"]
+PROGRESS_WRITE_INTERVAL = 0.5   # Seconds between progress writes from a worker
+CLAIM_ATTEMPTS = 20              # A claim retries for ~1s: resume_jobs probes leases briefly
+
+class JobCancelled(Exception):
+    pass
+
+class JobTimeout(Exception):
+    pass
+
+# ====================================================
+#  STATE FILES
+# ====================================================
+
+def jobs_dir(session_dir: Path) -> Path:
+    return session_dir / "jobs"
+
+def _state_path(session_dir: Path, job_id: str) -> Path:
+    return jobs_dir(session_dir) / f"{job_id}.json"
+
+def _cancel_path(session_dir: Path, job_id: str) -> Path:
+    return jobs_dir(session_dir) / f"{job_id}.cancel"
+
+def _lease_path(session_dir: Path, job_id: str) -> Path:
+    return jobs_dir(session_dir) / f"{job_id}.lock"
+
+@contextmanager
+def _lease(session_dir: Path, job_id: str, attempts: int = 1):
+    """Yields True while this process holds the job's lease, False if another process holds it."""
+    if fcntl is None:
+        yield True   # No flock (Windows): single-process deployments only
+        return
+    with open(_lease_path(session_dir, job_id), "a+") as lease_file:
+        for attempt in range(attempts):
+            try:
+                fcntl.flock(lease_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if attempt + 1 == attempts:
+                    yield False
+                    return
+                time.sleep(0.05)
+        try:
+            yield True
+        finally:
+            fcntl.flock(lease_file, fcntl.LOCK_UN)
+
+def is_leased(session_dir: Path, job_id: str) -> bool:
+    """True while some live process runs the job."""
+    with _lease(session_dir, job_id) as acquired:
+        return not acquired
+
+def output_path(session_dir: Path, job_id: str) -> Path:
+    """Where an export job writes its CSV (one file per job, so jobs never clash)."""
+    return jobs_dir(session_dir) / f"{job_id}.csv"
+
+def read_job(session_dir: Path, job_id: str) -> Optional[Job]:
+    try:
+        job = Job.model_validate_json(_state_path(session_dir, job_id).read_text())
+    except (OSError, ValueError):
+        return None
+    if job.status in ACTIVE_STATUSES and _cancel_path(session_dir, job_id).exists():
+        # Until the worker sees the flag. Not written to the state file: the worker owns it
+        job.message = "Cancellation requested."
+    return job
+
+def list_jobs(session_dir: Path) -> List[Job]:
+    if not jobs_dir(session_dir).exists():
+        return []
+    jobs = [read_job(session_dir, path.stem) for path in jobs_dir(session_dir).glob("*.json")]
+    return sorted([job for job in jobs if job], key=lambda job: job.created_at)
+
+def _write_job(session_dir: Path, job: Job):
+    path = _state_path(session_dir, job.job_id)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(job.model_dump_json())
+    tmp.replace(path)
+
+# ====================================================
+#  API SIDE (pool, submit, cancel, resume)
+# ====================================================
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_futures: Dict[str, Future] = {}
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: a fork of a threaded server process can deadlock
+            _pool = ProcessPoolExecutor(max_workers=settings.JOB_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"),
+                                        max_tasks_per_child=settings.JOB_MAX_TASKS_PER_CHILD)
+        return _pool
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def submit_job(recipe: Recipe, kind: str) -> Job:
+    session_dir = settings.UPLOAD_DIR / recipe.session_id
+    jobs_dir(session_dir).mkdir(exist_ok=True)
+
+    job = Job(job_id=uuid.uuid4().hex, session_id=recipe.session_id, kind=kind,
+              recipe=recipe, created_at=time.time())
+    _write_job(session_dir, job)
+    _enqueue(session_dir, job.job_id)
+    return job
+
+def _enqueue(session_dir: Path, job_id: str):
+    future = _get_pool().submit(_run_job, str(session_dir), job_id)
+    _futures[job_id] = future
+    future.add_done_callback(lambda f: _on_done(session_dir, job_id, f))
+
+def _on_done(session_dir: Path, job_id: str, future: Future):
+    _futures.pop(job_id, None)
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is None:
+        return
+
+    # The worker died without writing a final state (killed, out of memory...)
+    job = read_job(session_dir, job_id)
+    if job and job.status in ACTIVE_STATUSES:
+        job.status, job.error, job.finished_at = "failed", f"Worker crashed: {error!r}", time.time()
+        _write_job(session_dir, job)
+    if isinstance(error, BrokenProcessPool):
+        _reset_pool()
+
+def cancel_job(session_dir: Path, job_id: str) -> Optional[Job]:
+    job = read_job(session_dir, job_id)
+    if job is None or job.status not in ACTIVE_STATUSES:
+        return job
+
+    future = _futures.get(job_id)
+    if future is not None and future.cancel():
+        # Never started: the API still owns the state
+        job.status, job.finished_at, job.message = "cancelled", time.time(), "Cancelled before start."
+        _write_job(session_dir, job)
+        return job
+
+    # Running: the worker sees the flag at its next chunk (read_job reports it until then)
+    _cancel_path(session_dir, job_id).touch()
+    return read_job(session_dir, job_id)
+
+def resume_jobs():
+    """Startup: requeue jobs a previous server process left queued or running."""
+    if not settings.UPLOAD_DIR.exists():
+        return
+    for session_dir in settings.UPLOAD_DIR.iterdir():
+        if not jobs_dir(session_dir).is_dir():
+            continue
+        for job in list_jobs(session_dir):
+            if job.status not in ACTIVE_STATUSES or is_leased(session_dir, job.job_id):
+                # Finished, or a sibling server process is running it right now
+                continue
+            if job.attempts >= settings.JOB_MAX_ATTEMPTS:
+                job.status, job.error, job.finished_at = "failed", "Interrupted too many times.", time.time()
+                _write_job(session_dir, job)
+                continue
+            job.status, job.message = "queued", "Requeued after restart."
+            _write_job(session_dir, job)
+            _enqueue(session_dir, job.job_id)
+            print(f"🔁 Requeued job {job.job_id} ({job.kind}) for session {job.session_id}")
+
+def shutdown():
+    _reset_pool()
+
+# ====================================================
+#  WORKER SIDE
+# ====================================================
+
+class _Reporter:
+    """
+    The on_progress callback handed to the executor / profiler.
+    Writes progress (throttled) and aborts on cancel or when over the time limit.
+    """
+
+    def __init__(self, session_dir: Path, job: Job, deadline: Optional[float]):
+        self.session_dir = session_dir
+        self.job = job
+        self.deadline = deadline
+        self._last_write = 0.0
+
+    def __call__(self, done: int, total: int):
+        self.check()
+        self.job.progress = round(100.0 * done / max(total, 1), 1)
+        now = time.monotonic()
+        if now - self._last_write >= PROGRESS_WRITE_INTERVAL:
+            self._last_write = now
+            _write_job(self.session_dir, self.job)
+
+    def check(self):
+        if _cancel_path(self.session_dir, self.job.job_id).exists():
+            raise JobCancelled()
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise JobTimeout()
+
+def _raise_timeout(signum, frame):
+    raise JobTimeout()
+
+@contextmanager
+def _limits(time_limit: Optional[float], memory_limit_mb: Optional[int]):
+    """SIGALRM for the wall-clock limit, RLIMIT_AS for memory (both Unix only)."""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+
+    old_as = None
+    if memory_limit_mb and resource is not None:
+        # Relative to what the worker already maps (interpreter, numpy, sklearn...)
+        with open("/proc/self/statm") as f:
+            mapped = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+        old_as = resource.getrlimit(resource.RLIMIT_AS)
+        limit = mapped + memory_limit_mb * 1024 * 1024
+        if old_as[1] != resource.RLIM_INFINITY:
+            limit = min(limit, old_as[1])
+        resource.setrlimit(resource.RLIMIT_AS, (limit, old_as[1]))
+
+    old_handler = None
+    if time_limit and hasattr(signal, "SIGALRM"):
+        old_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, time_limit)
+    try:
+        yield
+    finally:
+        if old_handler is not None:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, old_handler)
+        if old_as is not None:
+            resource.setrlimit(resource.RLIMIT_AS, old_as)
+
+def _run_export(job: Job, session_dir: Path, reporter: _Reporter) -> dict:
+    from app.services import executor
+    result = executor.run_recipe_on_file(job.recipe, output_path(session_dir, job.job_id), on_progress=reporter)
+    return {**result, "download_url": f"/api/jobs/{job.session_id}/{job.job_id}/result"}
+
+def _run_fit(job: Job, session_dir: Path, reporter: _Reporter) -> dict:
+    from app.services import executor
+    fitted = executor.fit_file(job.recipe, on_progress=reporter)
+    return {"fitted_on": fitted.fitted_on, "steps": len(fitted.steps)}
+
+def _run_profile(job: Job, session_dir: Path, reporter: _Reporter) -> dict:
+    from app.services import analysis_cache, analyzer
+    stats = analyzer.analyze_full_dataset(session_dir / "original.csv", on_progress=reporter)
+    if "error" in stats:
+        raise ValueError(stats["error"])
+    # Stored where GET /analyze?mode=full looks, so the result is served from there
+    analysis_cache.store(session_dir, "full", analysis_cache.content_key(session_dir, "full"), stats)
+    return {"total_rows": stats["total_rows"], "total_cols": stats["total_cols"]}
+
+_RUNNERS = {"export": _run_export, "fit": _run_fit, "profile": _run_profile}
+
+def _run_job(session_dir_str: str, job_id: str):
+    """Entry point in the worker process."""
+    session_dir = Path(session_dir_str)
+    # A spawned worker starts from the default config; follow the API's storage dir
+    settings.UPLOAD_DIR = session_dir.parent
+
+    with _lease(session_dir, job_id, CLAIM_ATTEMPTS) as claimed:
+        if not claimed:
+            return   # Requeued by another server process too, and it got there first
+        _run_claimed(session_dir, job_id)
+
+def _run_claimed(session_dir: Path, job_id: str):
+    # Read under the lease: a duplicate that claims it after the real run sees the final state
+    job = read_job(session_dir, job_id)
+    if job is None or job.status not in ACTIVE_STATUSES:
+        return
+
+    job.attempts += 1
+    job.status, job.started_at, job.message = "running", time.time(), ""
+    _write_job(session_dir, job)
+
+    limit = settings.JOB_TIME_LIMIT_SECONDS
+    deadline = time.monotonic() + limit if limit else None
+    reporter = _Reporter(session_dir, job, deadline)
+
+    try:
+        reporter.check()
+        with _limits(limit, settings.JOB_MEMORY_LIMIT_MB):
+            job.result = _RUNNERS[job.kind](job, session_dir, reporter)
+        job.status, job.progress = "succeeded", 100.0
+    except JobCancelled:
+        job.status, job.message = "cancelled", "Cancelled while running."
+    except JobTimeout:
+        job.status, job.error = "failed", f"Time limit of {limit}s exceeded."
+    except MemoryError:
+        job.status, job.error = "failed", f"Memory limit of {settings.JOB_MEMORY_LIMIT_MB} MB exceeded."
+    except Exception as e:
+        print(f"⚠️ Job {job_id} ({job.kind}) failed: {e}")
+        job.status, job.error = "failed", str(e)
+
+    job.finished_at = time.time()
+    _write_job(session_dir, job)
+    _cancel_path(session_dir, job_id).unlink(missing_ok=True)
+    if job.status != "succeeded" and job.kind == "export":
+        output_path(session_dir, job_id).unlink(missing_ok=True)
+
+    from app.services import session_manifest
+    session_manifest.refresh_size(job.session_id)
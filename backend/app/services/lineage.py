@@ -0,0 +1,139 @@
+"""
+Column-level lineage for preview replays.
+
+Every column of the working frame carries a version key: a hash of the step
+that last wrote it, of the versions of the columns that step read, and of the
+row set at that point. The row set has its own version, which every row
+filter (drop_outliers_*, drop_duplicates) advances, and which is part of every
+column key downstream of it.
+
+A step's output depends only on its signature, its input column versions and
+the row set, so outputs are cached under that "input key". After an edit, a step
+whose inputs did not change gets its output columns (or kept rows) straight from
+the cache; only the columns downstream of the edit are recomputed. With one
+column per step, an edit costs about one step, however long the recipe is.
+"""
+import hashlib
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from app.models.recipe import Step
+from app.services import metrics, transformer
+from app.services.recipe_cache import OutputCache, PrefixCache, step_signature
+from app.services.step_io import StepIO, describe_step
+
+_MISSING = "missing"
+
+def _hash(*parts) -> str:
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(str(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def _is_barrier(io: StepIO) -> bool:
+    # Unknown operations: describe_step assumes they can do anything
+    return io.changes_rows and io.dynamic_writes
+
+class LineageState:
+    """The version of every column of the current frame (in frame order) and of its row set."""
+
+    def __init__(self, columns: Dict[str, str], rows: str):
+        self.columns = columns
+        self.rows = rows
+
+    @classmethod
+    def source(cls, df: pd.DataFrame, source_key: str) -> "LineageState":
+        return cls({c: _hash(source_key, c) for c in df.columns}, source_key)
+
+    def input_key(self, step: Step, io: StepIO) -> str:
+        if io.reads_all:
+            inputs = list(self.columns.items())
+        else:
+            # Written columns count too: a step skipped at runtime leaves their old values
+            inputs = [(c, self.columns.get(c, _MISSING)) for c in sorted(io.reads | io.touched, key=str)]
+        return _hash(step_signature(step), self.rows, inputs)
+
+    def advance(self, key: str, io: StepIO, columns: List[str], changed: List[str]) -> "LineageState":
+        """State after a step with input `key` that left `columns` and (re)wrote `changed`."""
+        if io.changes_rows:
+            # New row set: every column is a different array now, even if untouched
+            return LineageState({c: _hash(key, self.columns.get(c, _MISSING)) for c in columns}, key)
+        changed = set(changed)
+        return LineageState({c: _hash(key, c) if c in changed else self.columns.get(c, _hash(key, c))
+                             for c in columns}, self.rows)
+
+def _state_key(prefix_key: str) -> str:
+    return f"state:{prefix_key}"
+
+def load_state(cache: PrefixCache, prefix_key: str) -> Optional[LineageState]:
+    return cache.outputs.get(_state_key(prefix_key))
+
+class StepLineage:
+    """
+    Drives one replay: `reuse` serves a step from cached outputs when its inputs
+    are unchanged, `record` stores the output of a step that had to run.
+    """
+
+    def __init__(self, outputs: OutputCache, state: LineageState):
+        self.outputs = outputs
+        self.state = state
+
+    def reuse(self, df: pd.DataFrame, step: Step) -> Optional[pd.DataFrame]:
+        io = describe_step(step)
+        if _is_barrier(io) or step.operation == "drop_column":
+            return None   # drop_column is cheaper to run than to look up
+        key = self.state.input_key(step, io)
+        entry = self.outputs.get(key)
+        metrics.cache_lookup("step_outputs", entry is not None)
+        if entry is None:
+            return None
+
+        # The step would have widened its inputs from storage dtypes before running
+        df = transformer.widen_inputs(df, step)
+        if io.changes_rows:
+            df = df.iloc[entry["positions"]]
+            changed: List[str] = []
+        else:
+            for col, values in entry["columns"].items():
+                df[col] = values.copy()
+            if entry["dropped"]:
+                df = df.drop(columns=entry["dropped"])
+            changed = list(entry["columns"])
+
+        self.state = self.state.advance(key, io, list(df.columns), changed)
+        return df
+
+    def record(self, step: Step, before_columns: List[str], before_index: pd.Index, df: pd.DataFrame):
+        """`before_*` describe the frame the step ran on (taken before it ran: steps mutate in place)."""
+        io = describe_step(step)
+        key = self.state.input_key(step, io)
+
+        if _is_barrier(io) or not df.columns.is_unique:
+            # Nothing is known about what changed (or a name no longer points to one column,
+            # e.g. polynomial_features run twice): every column gets a new version
+            self.state = LineageState({c: _hash(key, c) for c in df.columns}, key)
+            return
+
+        before = set(before_columns)
+        if io.changes_rows:
+            changed: List[str] = []
+            if before_index.is_unique:
+                positions = before_index.get_indexer(df.index)
+                self.outputs.put(key, {"positions": positions}, positions.nbytes)
+        else:
+            changed = [c for c in df.columns if c not in before or c in io.writes]
+            after = set(df.columns)
+            dropped = [c for c in before_columns if c not in after]
+            if step.operation != "drop_column":
+                columns = {c: df[c].copy() for c in changed}
+                size = int(sum(s.memory_usage(deep=True) for s in columns.values()))
+                self.outputs.put(key, {"columns": columns, "dropped": dropped}, size)
+
+        self.state = self.state.advance(key, io, list(df.columns), changed)
+
+    def checkpoint(self, cache: PrefixCache, prefix_key: str, df: pd.DataFrame):
+        """Caches the frame with its state, so a later replay can resume from there."""
+        cache.put(prefix_key, df)
+        self.outputs.put(_state_key(prefix_key), self.state, 64 * (len(self.state.columns) + 1))
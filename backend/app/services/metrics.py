@@ -0,0 +1,208 @@
+"""
+Process-wide metrics in the Prometheus text format (served on GET /metrics),
+plus the per-step profiler used by preview replays.
+
+Counters and histograms live in this process only: the preview pool reports the
+CPU time of offloaded steps back with their result, but background jobs run in
+their own processes and are not counted here.
+"""
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from app.models.recipe import Step
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = tuple(2 ** p for p in range(10, 29, 2))   # 1 KB .. 256 MB
+
+# ====================================================
+#  COUNTERS / HISTOGRAMS
+# ====================================================
+
+_registry: List["_Metric"] = []
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_labels(self.label_names, key)} {value}" for key, value in self._values.items()]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DURATION_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, list] = {}   # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, series in self._series.items():
+                bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+                for bound, count in zip(bounds, series[:-2] + series[-1:]):
+                    le = 'le="%s"' % bound
+                    lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, key)} {series[-1]}")
+        return lines
+
+def render() -> str:
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+# --- The metrics themselves ---
+STEP_SECONDS = Histogram("prima_step_duration_seconds", "Wall time of one preview step.", ["operation", "source"])
+STEP_CPU_SECONDS = Histogram("prima_step_cpu_seconds", "CPU time of one preview step.", ["operation", "source"])
+STEP_ROWS = Counter("prima_step_rows_total", "Rows fed into preview steps.", ["operation"])
+PREVIEW_SECONDS = Histogram("prima_preview_duration_seconds", "Wall time of a /preview request.", ["status"])
+UPLOAD_BYTES = Histogram("prima_upload_size_bytes", "Size of uploaded files.", buckets=SIZE_BUCKETS)
+ANALYZE_SECONDS = Histogram("prima_analyze_duration_seconds", "Wall time of /analyze.", ["mode", "cache"])
+CACHE_REQUESTS = Counter("prima_cache_requests_total", "Cache lookups by cache and result.", ["cache", "result"])
+CACHE_EVICTIONS = Counter("prima_session_cache_evictions_total",
+                          "Entries dropped from the session cache (session: over its share, budget: process full).",
+                          ["reason"])
+
+def cache_lookup(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+# ====================================================
+#  STEP PROFILER
+# ====================================================
+
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+
+def _start_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracing_users += 1
+
+def _stop_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+def peak_memory_start() -> int:
+    """Resets the traced peak; returns the current traced size (0 when not tracing)."""
+    if not tracemalloc.is_tracing():
+        return 0
+    tracemalloc.reset_peak()
+    return tracemalloc.get_traced_memory()[0]
+
+def peak_memory_delta(start: int) -> Optional[int]:
+    if not tracemalloc.is_tracing():
+        return None
+    return max(tracemalloc.get_traced_memory()[1] - start, 0)
+
+class StepProfiler:
+    """
+    Times every step of one replay and feeds the step histograms.
+    With `detailed`, also keeps one entry per step for the response, with the
+    peak memory delta (tracemalloc: Python and numpy allocations, approximate
+    when other requests allocate at the same time).
+    """
+
+    def __init__(self, detailed: bool = False):
+        self.detailed = detailed
+        self.entries: List[dict] = []
+        self._tracing = detailed
+        if detailed:
+            _start_tracing()
+
+    def start(self, df: pd.DataFrame) -> tuple:
+        memory_start = peak_memory_start() if self.detailed else 0
+        return time.perf_counter(), time.thread_time(), memory_start, len(df), list(df.columns)
+
+    def stop(self, token: tuple, step: Step, df: pd.DataFrame, source: str,
+             cpu: Optional[float] = None, peak_memory: Optional[int] = None):
+        """`source`: "inline", "pool" or "lineage". A pool step reports its worker's cpu / peak memory."""
+        wall_start, cpu_start, memory_start, rows_in, columns_in = token
+        wall = time.perf_counter() - wall_start
+        if cpu is None:
+            cpu = time.thread_time() - cpu_start
+        if peak_memory is None and source != "pool" and self.detailed:
+            peak_memory = peak_memory_delta(memory_start)
+
+        STEP_SECONDS.observe(wall, operation=step.operation, source=source)
+        STEP_CPU_SECONDS.observe(cpu, operation=step.operation, source=source)
+        STEP_ROWS.inc(rows_in, operation=step.operation)
+        if not self.detailed:
+            return
+
+        before, after = set(columns_in), set(df.columns)
+        self.entries.append({
+            "step_id": step.id,
+            "operation": step.operation,
+            "source": source,
+            "wall_ms": round(wall * 1000, 3),
+            "cpu_ms": round(cpu * 1000, 3),
+            "peak_memory_bytes": peak_memory,
+            "rows_in": rows_in,
+            "rows_out": len(df),
+            "columns_added": [str(c) for c in df.columns if c not in before],
+            "columns_removed": [str(c) for c in columns_in if c not in after],
+        })
+
+    def close(self):
+        if self._tracing:
+            self._tracing = False
+            _stop_tracing()
@@ -0,0 +1,282 @@
+"""
+Recipe planner: rewrites the steps of a Recipe into an equivalent, cheaper plan
+before they run. Preview and full-data execution both run the plan, not the
+literal recipe.
+
+Rewrites (each one only where it cannot change the result):
+1. MISSING COLUMNS: a step on a column that cannot exist at that point is dropped
+   up front; the transformer would skip it at runtime anyway.
+2. FUSION: a scaler directly followed by a shift/scale-invariant scaler on the same
+   column is redundant (equal up to float rounding); so is a fill after fill_na_const.
+3. DEAD STEPS: a step whose every output is dropped before anything reads it.
+4. PUSHDOWN: drop_column moves up to right after the last step that uses the
+   column; row filters move up past row-local steps, so later steps see fewer rows.
+5. PROJECTION: source columns dropped before anything uses them are not loaded.
+
+Everything is derived from step_io.describe_step, the same static view the fit
+planner uses, so an op it does not know about is never moved or removed.
+"""
+from typing import List, Optional, Set
+
+from app.models.recipe import Step
+from app.services.step_io import describe_step
+from app.services.transformer import OPS_WITHOUT_COL, is_batched, resolve_column
+
+# Positive affine maps of a column (x -> a*x + b, a > 0)
+AFFINE_SCALERS = ["standard_scaler", "minmax_scaler", "robust_scaler", "maxabs_scaler"]
+# Scalers whose output does not change under such a map of their input. Not robust_scaler:
+# with a zero IQR sklearn scales by 1, so its output keeps the input's scale
+SHIFT_INVARIANT_SCALERS = ["standard_scaler", "minmax_scaler"]
+# Fills that are plain fillna on their column, i.e. no-ops once it has no missing values
+PLAIN_FILLS = ["fill_na_mean", "fill_na_median", "fill_na_mode", "fill_na_const", "fill_na_groupby"]
+# Steps whose value for a row depends on that row only, and that cannot fail because of
+# other rows (polynomial_features can: sklearn rejects NaN): a row filter commutes with them
+ROW_LOCAL_OPS = ["fill_na_const", "create_interaction"]
+ROW_FILTERS = ["drop_outliers_zscore", "drop_outliers_manual"]
+
+class Plan:
+    """The optimized steps, the source columns to load, and why it differs from the recipe."""
+
+    def __init__(self, original: List[Step], steps: List[Step], source_columns: Optional[List[str]],
+                 columns: Optional[List[str]], load_drops: List[Step], rewrites: List[dict]):
+        self.original = original
+        self.steps = steps                  # Run these on the source restricted to `columns`
+        self.source_columns = source_columns
+        self.columns = columns              # usecols for loading; None means every column
+        self.load_drops = load_drops        # drop_column steps the projection already does
+        self.rewrites = rewrites
+
+    @property
+    def pruned_columns(self) -> List[str]:
+        if self.columns is None:
+            return []
+        kept = set(self.columns)
+        return [c for c in self.source_columns if c not in kept]
+
+    def explain(self) -> dict:
+        return {
+            "original_steps": len(self.original),
+            "planned_steps": len(self.steps),
+            "steps": [_describe(step) for step in self.steps],
+            "load_columns": self.columns,
+            "pruned_columns": self.pruned_columns,
+            "rewrites": self.rewrites,
+        }
+
+def _describe(step: Step) -> dict:
+    io = describe_step(step)
+    names = lambda cols: sorted(str(c) for c in cols if c)
+    return {
+        "id": step.id,
+        "operation": step.operation,
+        "column": step.column if is_batched(step) else resolve_column(step),
+        "selector": step.selector,
+        "reads": ["*"] if io.reads_all else names(io.reads),
+        "writes": names(io.writes),
+        "drops": names(io.drops),
+        "changes_rows": io.changes_rows,
+    }
+
+def _column(step: Step) -> Optional[str]:
+    """The single column a step acts on; None for batched steps, which the column rewrites leave alone."""
+    return None if is_batched(step) else resolve_column(step)
+
+def _may_create(step: Step, io, col: str) -> bool:
+    """Whether a step with data-dependent outputs could create `col` (one-hot only makes '<col>_*')."""
+    if not io.dynamic_writes:
+        return False
+    if step.operation == "one_hot_encode" and step.selector is None:
+        sources = step.column if isinstance(step.column, list) else [resolve_column(step)]
+        return any(str(col).startswith(f"{source}_") for source in sources)
+    return True
+
+def _rewrite(rule: str, step: Step, detail: str) -> dict:
+    return {"rule": rule, "step_id": step.id, "operation": step.operation, "detail": detail}
+
+# ====================================================
+#  1. MISSING COLUMNS
+# ====================================================
+
+def _prune_missing(steps: List[Step], source_columns: List[str], rewrites: List[dict]) -> List[Step]:
+    known = set(source_columns)   # Columns that may exist at this point (an upper bound)
+    creators = []                 # Earlier steps whose output columns depend on the data
+
+    kept = []
+    for step in steps:
+        col = _column(step)
+        if (col is not None and step.operation not in OPS_WITHOUT_COL and col not in known
+                and not any(_may_create(s, io, col) for s, io in creators)):
+            rewrites.append(_rewrite("missing_column", step, f"Column '{col}' does not exist at this point."))
+            continue
+        kept.append(step)
+
+        io = describe_step(step)
+        known |= io.writes
+        # Only drop_column cannot fail; any other dropping step may leave the column in place
+        if step.operation == "drop_column":
+            known -= io.drops
+        if io.dynamic_writes:
+            creators.append((step, io))
+    return kept
+
+# ====================================================
+#  2. FUSION
+# ====================================================
+
+def _previous_use(steps: List[Step], col: str) -> Optional[int]:
+    """Index of the last step that reads or changes `col`; None if an opaque step comes first."""
+    for i in range(len(steps) - 1, -1, -1):
+        io = describe_step(steps[i])
+        if io.reads_all or io.dynamic_writes:
+            return None
+        if col in io.reads or col in io.touched:
+            return i
+    return None
+
+def _fuse(steps: List[Step], rewrites: List[dict]) -> List[Step]:
+    kept: List[Step] = []
+    for step in steps:
+        op, col = step.operation, _column(step)
+        if col is None:
+            kept.append(step)
+            continue
+
+        # --- a. scaler after scaler: the first one cannot change the second one's output ---
+        if op in AFFINE_SCALERS:
+            while True:
+                i = _previous_use(kept, col)
+                if i is None or _column(kept[i]) != col:
+                    break
+                prev = kept[i].operation
+                if not (prev in AFFINE_SCALERS and (op in SHIFT_INVARIANT_SCALERS or prev == op == "maxabs_scaler")):
+                    break
+                rewrites.append(_rewrite("fuse", kept[i], f"'{prev}' is redundant before '{op}' on '{col}'."))
+                del kept[i]
+
+        # --- b. fill after fill_na_const: nothing left to fill ---
+        if op in PLAIN_FILLS:
+            i = _previous_use(kept, col)
+            if (i is not None and kept[i].operation == "fill_na_const" and _column(kept[i]) == col
+                    and (kept[i].params or {}).get('value', 0) is not None):
+                rewrites.append(_rewrite("fuse", step, f"'{col}' has no missing values after fill_na_const."))
+                continue
+
+        kept.append(step)
+    return kept
+
+# ====================================================
+#  3. DEAD STEPS
+# ====================================================
+
+def _eliminate_dead(steps: List[Step], rewrites: List[dict]) -> List[Step]:
+    """Backwards liveness: a column is dead if it is dropped later and nothing reads it before."""
+    dead: Set[str] = set()
+    kept: List[Step] = []
+
+    for step in reversed(steps):
+        io = describe_step(step)
+        removable = (step.operation != "drop_column" and not io.changes_rows and not io.dynamic_writes
+                     and io.touched and io.touched <= dead)
+        if removable:
+            rewrites.append(_rewrite("dead_step", step, f"Output {sorted(map(str, io.touched))} is dropped before use."))
+            continue
+
+        kept.append(step)
+        if step.operation == "drop_column":
+            dead |= io.drops
+        elif io.reads_all:
+            dead.clear()
+        else:
+            dead -= io.reads
+
+    kept.reverse()
+    return kept
+
+# ====================================================
+#  4. PUSHDOWN
+# ====================================================
+
+def _blocks_drop(step: Step, io, col: str) -> bool:
+    return io.reads_all or _may_create(step, io, col) or col in io.reads or col in io.touched
+
+def _blocks_filter(step: Step, io, col: str) -> bool:
+    return step.operation not in ROW_LOCAL_OPS or col in io.touched
+
+def _push_down(steps: List[Step], rewrites: List[dict]) -> List[Step]:
+    steps = list(steps)
+    for step in list(steps):
+        op, col = step.operation, _column(step)
+        if col is None or (op != "drop_column" and op not in ROW_FILTERS):
+            continue
+        j = next(i for i, s in enumerate(steps) if s is step)
+
+        target = j
+        while target > 0:
+            prev = steps[target - 1]
+            io = describe_step(prev)
+            if op == "drop_column" and _blocks_drop(prev, io, col):
+                break
+            if op in ROW_FILTERS and _blocks_filter(prev, io, col):
+                break
+            target -= 1
+
+        # Passing another drop gains nothing; only count moves past real work
+        if any(s.operation != "drop_column" for s in steps[target:j]):
+            steps.insert(target, steps.pop(j))
+            rewrites.append(_rewrite("pushdown", step, f"Moved from position {j + 1} to {target + 1}."))
+    return steps
+
+# ====================================================
+#  5. PROJECTION
+# ====================================================
+
+def _split_load_drops(steps: List[Step], source_columns: List[str]):
+    """Drops of source columns nothing has used yet become a projection at load time."""
+    untouched = set(source_columns)
+    pruned: List[str] = []
+    load_drops: List[Step] = []
+    kept: List[Step] = []
+
+    for step in steps:
+        io = describe_step(step)
+        col = _column(step)
+        if step.operation == "drop_column" and col in untouched:
+            untouched.discard(col)
+            pruned.append(col)
+            load_drops.append(step)
+            continue
+        kept.append(step)
+        if io.reads_all:
+            untouched.clear()
+        untouched -= io.reads | io.touched
+        untouched -= {c for c in untouched if _may_create(step, io, c)}
+
+    columns = [c for c in source_columns if c not in set(pruned)] if pruned else None
+    return kept, columns, load_drops
+
+# ====================================================
+#  ENTRY POINT
+# ====================================================
+
+def optimize(steps: List[Step], source_columns: Optional[List[str]] = None) -> Plan:
+    """
+    Builds the plan. Without `source_columns` (schema unknown) the column-aware
+    rewrites (1 and 5) are skipped; the others only need the steps.
+    """
+    rewrites: List[dict] = []
+    planned = list(steps)
+    if source_columns is not None:
+        planned = _prune_missing(planned, source_columns, rewrites)
+
+    # Each rewrite can enable another (a pushed-up drop kills a step, which frees the drop again)
+    for _ in range(len(planned) + 1):
+        before = [id(s) for s in planned]
+        planned = _push_down(_eliminate_dead(_fuse(planned, rewrites), rewrites), rewrites)
+        if [id(s) for s in planned] == before:
+            break
+
+    columns, load_drops = None, []
+    if source_columns is not None:
+        planned, columns, load_drops = _split_load_drops(planned, source_columns)
+
+    return Plan(list(steps), planned, source_columns, columns, load_drops, rewrites)
@@ -0,0 +1,88 @@
+"""
+Serialization of one page of a preview frame.
+
+Only the requested rows are sanitized and serialized; the rest of the
+transformed frame is never touched. Three formats, picked from the Accept header:
+
+- records (default, application/json):  [{col: value, ...}, ...] - the original shape
+- columns (application/vnd.prima.columns+json):  {col: [values...]} - each name once
+- arrow (application/vnd.apache.arrow.stream):  an Arrow IPC stream; the JSON
+  fields of the response (status, rows...) travel in the schema metadata
+"""
+import json
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from app.services import dtypes
+
+MEDIA_RECORDS = "application/json"
+MEDIA_COLUMNS = "application/vnd.prima.columns+json"
+MEDIA_ARROW = "application/vnd.apache.arrow.stream"
+FORMATS = {"records": MEDIA_RECORDS, "columns": MEDIA_COLUMNS, "arrow": MEDIA_ARROW}
+ARROW_META_KEY = b"prima.preview"
+
+def negotiate(accept: Optional[str]) -> str:
+    """Format for an Accept header: the first listed media type we serve wins, records otherwise."""
+    for part in (accept or "").split(","):
+        media = part.split(";")[0].strip().lower()
+        for fmt, fmt_media in FORMATS.items():
+            if media == fmt_media:
+                return fmt
+    return "records"
+
+def page(df: pd.DataFrame, offset: int, limit: int) -> pd.DataFrame:
+    # Copy: the page is sanitized in place, the frame may be shared with the session cache
+    return dtypes.widen(df.iloc[offset:offset + limit].copy())
+
+def _sanitize(df: pd.DataFrame) -> pd.DataFrame:
+    """JSON-safe values: inf and NaN become None, datetimes become strings."""
+    # Math ops (like Log/Division) can create 'inf', which JSON cannot hold
+    df = df.replace([np.inf, -np.inf], None)
+    df = df.replace({np.nan: None})
+    # Pandas Timestamps sometimes break JSON serialization
+    for col in df.select_dtypes(include=['datetime', 'datetimetz']).columns:
+        df[col] = df[col].astype(str)
+    return df
+
+def _json_response(content: dict, media_type: str) -> Response:
+    try:
+        # Sanitized values are plain Python types: skip FastAPI's recursive encoder
+        return JSONResponse(content, media_type=media_type)
+    except (TypeError, ValueError):
+        return JSONResponse(jsonable_encoder(content), media_type=media_type)
+
+def records_response(meta: dict, rows: pd.DataFrame) -> Response:
+    return _json_response({**meta, "data": _sanitize(rows).to_dict(orient="records")}, MEDIA_RECORDS)
+
+def columns_response(meta: dict, rows: pd.DataFrame) -> Response:
+    clean = _sanitize(rows)
+    data = {str(col): clean[col].tolist() for col in clean.columns}
+    return _json_response({**meta, "data": data}, MEDIA_COLUMNS)
+
+def _to_arrow(rows: pd.DataFrame) -> pa.Table:
+    try:
+        return pa.Table.from_pandas(rows, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        # Mixed-type object columns: send them as text
+        mixed = rows.select_dtypes(include=["object"]).columns
+        rows = rows.astype({col: str for col in mixed})
+        return pa.Table.from_pandas(rows, preserve_index=False)
+
+def arrow_response(meta: dict, rows: pd.DataFrame) -> Response:
+    table = _to_arrow(rows)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           ARROW_META_KEY: json.dumps(jsonable_encoder(meta)).encode()})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return Response(content=sink.getvalue().to_pybytes(), media_type=MEDIA_ARROW)
+
+RESPONDERS = {"records": records_response, "columns": columns_response, "arrow": arrow_response}
+
+def respond(fmt: str, meta: dict, rows: pd.DataFrame) -> Response:
+    return RESPONDERS[fmt](meta, rows)
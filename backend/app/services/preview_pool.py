@@ -0,0 +1,273 @@
+"""
+Preview execution with CPU-heavy steps offloaded to a warm process pool.
+
+KNN imputation, Box-Cox, polynomial features, groupby imputation and target
+encoding hold the GIL for long stretches; run in the API process they starve
+every other request. Those steps run in worker processes that import sklearn /
+scipy / category_encoders once at start-up. Cheap steps stay inline, where a
+round trip would cost more than the step.
+
+Frames cross the process boundary through shared memory as Arrow IPC streams
+(pickle only for frames Arrow cannot represent, e.g. mixed-type object columns).
+
+Before a step runs, its column lineage is checked: a step whose input columns
+did not change since an earlier preview is served from the session's cached
+step outputs instead (see lineage.py).
+
+Each heavy step waits at most until the request deadline. On timeout the preview
+returns the frame up to the last finished step; the abandoned step keeps running
+and its result still lands in the session's prefix cache for the next preview.
+"""
+import multiprocessing
+import pickle
+import threading
+import time
+import tracemalloc
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+
+from app.config import settings
+from app.models.recipe import Recipe, Step
+from app.services import lineage, metrics, recipe_cache, transformer
+from app.services.file_manager import arrow_to_pandas
+from app.services.recipe_cache import PrefixCache
+
+HEAVY_OPS = {"fill_na_knn", "box_cox_transform", "polynomial_features", "fill_na_groupby", "target_encode"}
+
+_FORMAT_ARROW = b"A"
+_FORMAT_PICKLE = b"P"
+
+# ====================================================
+#  SHARED-MEMORY FRAME TRANSPORT
+# ====================================================
+
+def _write_frame(df: pd.DataFrame) -> Tuple[str, int]:
+    """Copies a frame into a new shared memory block; returns (name, size). The reader unlinks it."""
+    try:
+        table = pa.Table.from_pandas(df)
+        sink = pa.MockOutputStream()
+        _write_table(sink, table)
+        fmt, size, payload = _FORMAT_ARROW, sink.size(), table
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, TypeError, ValueError):
+        data = pickle.dumps(df, protocol=5)
+        fmt, size, payload = _FORMAT_PICKLE, len(data), data
+
+    shm = shared_memory.SharedMemory(create=True, size=size + 1)
+    view = shm.buf[1:size + 1]
+    try:
+        shm.buf[0:1] = fmt
+        if fmt == _FORMAT_ARROW:
+            _write_table(pa.FixedSizeBufferWriter(pa.py_buffer(view)), payload)
+        else:
+            view[:] = payload
+        return shm.name, size
+    finally:
+        # Arrow's views of the block must be gone before it can be closed
+        view.release()
+        shm.close()
+
+def _write_table(sink, table: pa.Table):
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+def _read_frame(name: str, size: int, unlink: bool) -> pd.DataFrame:
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        # One copy out of the block, so no column can point into it once it is closed
+        fmt, data = bytes(shm.buf[0:1]), bytes(shm.buf[1:size + 1])
+    finally:
+        shm.close()
+        if unlink:
+            shm.unlink()
+
+    if fmt == _FORMAT_ARROW:
+        return arrow_to_pandas(pa.ipc.open_stream(pa.py_buffer(data)).read_all())
+    return pickle.loads(data)
+
+def _discard(name: str):
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+        shm.close()
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+# ====================================================
+#  WORKER SIDE
+# ====================================================
+
+def _warm_worker():
+    """Pays the heavy imports once per worker, not once per request."""
+    import category_encoders  # noqa: F401
+    import scipy.special  # noqa: F401
+    import scipy.stats  # noqa: F401
+    import sklearn.impute  # noqa: F401
+    import sklearn.preprocessing  # noqa: F401
+
+def _ping() -> bool:
+    return True
+
+def _apply_step_shared(name: str, size: int, step_json: str, trace_memory: bool = False) -> Tuple[str, int, float, Optional[int]]:
+    """Returns the output block plus the step's CPU time and (when traced) peak memory delta."""
+    # The parent owns (and unlinks) the input block; the output block is unlinked by the parent too
+    df = _read_frame(name, size, unlink=False)
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    memory_start = metrics.peak_memory_start()
+    cpu_start = time.process_time()
+    df = transformer.apply_step(df, Step.model_validate_json(step_json))
+    cpu, peak = time.process_time() - cpu_start, metrics.peak_memory_delta(memory_start)
+    return (*_write_frame(df), cpu, peak)
+
+# ====================================================
+#  API SIDE
+# ====================================================
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if settings.PREVIEW_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=settings.PREVIEW_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_warm_worker)
+        return _pool
+
+def start():
+    """Startup: spawn and warm every worker now, so the first heavy preview does not pay for it."""
+    pool = _get_pool()
+    if pool is not None:
+        for _ in range(settings.PREVIEW_WORKERS):
+            pool.submit(_ping)
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def _replace_broken(pool: ProcessPoolExecutor):
+    """A worker died: drop that pool (its futures failed already), the next preview spawns a new one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            # Another request may have replaced it already; never shut down a healthy pool
+            _pool.shutdown(wait=False)
+            _pool = None
+
+def _submit_step(pool: ProcessPoolExecutor, df: pd.DataFrame, step: Step, trace_memory: bool = False) -> Future:
+    name, size = _write_frame(df)
+    try:
+        future = pool.submit(_apply_step_shared, name, size, step.model_dump_json(), trace_memory)
+    except Exception:
+        _discard(name)
+        raise
+    future.add_done_callback(lambda _: _discard(name))
+    return future
+
+def _collect(future: Future, timeout: Optional[float]) -> Tuple[pd.DataFrame, float, Optional[int]]:
+    """(frame, worker CPU seconds, worker peak memory delta) of a finished step."""
+    out_name, out_size, cpu, peak = future.result(timeout=timeout)
+    return _read_frame(out_name, out_size, unlink=True), cpu, peak
+
+def _cache_when_done(future: Future, cache: PrefixCache, key: str, tracker: lineage.StepLineage,
+                     step: Step, before_columns: List[str], before_index: pd.Index):
+    """A timed-out step is not wasted: its result is cached whenever it arrives."""
+    def callback(f: Future):
+        try:
+            if not f.cancelled() and f.exception() is None:
+                df, _, _ = _collect(f, timeout=0)
+                tracker.record(step, before_columns, before_index, df)
+                tracker.checkpoint(cache, key, df)
+        except Exception as e:
+            print(f"⚠️ Late preview step result dropped: {e}")
+    future.add_done_callback(callback)
+
+def apply_recipe(df: pd.DataFrame, recipe: Recipe, cache: PrefixCache,
+                 timeout: Optional[float] = None,
+                 source_key: str = recipe_cache.SOURCE_KEY,
+                 profiler: Optional[metrics.StepProfiler] = None) -> Tuple[pd.DataFrame, Optional[Step], int]:
+    """
+    Same result as transformer.apply_recipe(df, recipe, cache), with heavy steps
+    run in the pool. Returns (frame, timed_out_step, completed_steps); on timeout
+    the frame is the result of the first `completed_steps` steps.
+    `source_key` names `df` in the cache when it is not the raw sample (e.g. a projection).
+    Every step that runs or is reused goes through `profiler` (a plain one by default).
+    """
+    profiler = profiler or metrics.StepProfiler()
+    steps: List[Step] = recipe.steps
+    keys = recipe_cache.prefix_keys(steps, source_key)
+    start, df_result = cache.longest_prefix(keys)
+    state = lineage.load_state(cache, keys[start]) if df_result is not None else None
+    metrics.cache_lookup("preview_prefix", state is not None and start > 0)
+    if state is None:
+        # No lineage for that prefix (e.g. a late pool result): replay from the source, mostly from cache
+        start, df_result = 0, df.copy()
+        state = lineage.LineageState.source(df, source_key)
+    tracker = lineage.StepLineage(cache.outputs, state)
+
+    timeout = settings.PREVIEW_TIMEOUT_SECONDS if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    pool = _get_pool()
+
+    for i in range(start, len(steps)):
+        token = profiler.start(df_result)
+        # A selector is matched against the frame as it is now, so lineage sees real columns
+        step = transformer.bind_step(steps[i], df_result)
+
+        # Inputs unchanged since an earlier preview: take the step's output columns from the cache
+        reused = tracker.reuse(df_result, step)
+        if reused is not None:
+            df_result = reused
+            profiler.stop(token, step, df_result, "lineage")
+            continue
+
+        before_columns, before_index = list(df_result.columns), df_result.index
+        source, cpu, peak = "inline", None, None
+        if pool is not None and step.operation in HEAVY_OPS:
+            try:
+                future = _submit_step(pool, df_result, step, trace_memory=profiler.detailed)
+            except Exception as e:
+                print(f"⚠️ Preview pool unavailable ({e}), running {step.operation} inline")
+                if isinstance(e, BrokenProcessPool):
+                    _replace_broken(pool)
+                pool = None
+                df_result = transformer.apply_step(df_result, step)
+            else:
+                try:
+                    df_result, cpu, peak = _collect(future, timeout=max(deadline - time.monotonic(), 0))
+                    source = "pool"
+                except TimeoutError:
+                    tracker.checkpoint(cache, keys[i], df_result)
+                    _cache_when_done(future, cache, keys[i + 1], tracker, step, before_columns, before_index)
+                    return df_result, step, i
+                except BrokenProcessPool as e:
+                    # A worker died (e.g. OOM-killed): later previews get a fresh pool
+                    print(f"⚠️ Preview pool broken ({e}), running {step.operation} inline")
+                    _replace_broken(pool)
+                    pool = None
+                    df_result = transformer.apply_step(df_result, step)
+                except Exception as e:
+                    # Only this step failed (e.g. a frame that failed to cross over): the pool stays up
+                    print(f"⚠️ Offloaded {step.operation} failed ({e}), running it inline")
+                    df_result = transformer.apply_step(df_result, step)
+        else:
+            df_result = transformer.apply_step(df_result, step)
+        tracker.record(step, before_columns, before_index, df_result)
+        profiler.stop(token, step, df_result, source, cpu=cpu, peak_memory=peak)
+
+    # Only the end result is kept whole; lineage rebuilds any other prefix from column outputs
+    tracker.checkpoint(cache, keys[-1], df_result)
+    return df_result, None, len(steps)
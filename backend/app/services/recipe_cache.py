@@ -0,0 +1,257 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from itertools import islice
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from app.config import settings
+from app.models.recipe import Step
+from app.services import file_manager, metrics
+
+# Key of the raw (untransformed) sample, i.e. the empty prefix
+SOURCE_KEY = hashlib.sha1(b"source").hexdigest()
+
+def step_signature(step: Step) -> str:
+    """
+    Stable text form of what a step does (operation, column, params).
+    The frontend `id` is left out on purpose: two steps doing the same thing share cache entries.
+    """
+    payload = {
+        "operation": step.operation,
+        "column": step.column,
+        "selector": step.selector,
+        "params": step.params if step.params else {},
+    }
+    return json.dumps(payload, sort_keys=True, default=str)
+
+def projection_key(columns: Optional[List[str]]) -> str:
+    """Key of the raw sample restricted to `columns` (None: every column, i.e. SOURCE_KEY)."""
+    if columns is None:
+        return SOURCE_KEY
+    digest = hashlib.sha1()
+    digest.update(SOURCE_KEY.encode())
+    digest.update(json.dumps(list(columns)).encode())
+    return digest.hexdigest()
+
+def prefix_keys(steps: List[Step], source_key: str = SOURCE_KEY) -> List[str]:
+    """
+    keys[i] identifies the frame after the first i steps (keys[0] is the raw sample).
+    Each key chains the previous one, so a change in step k changes every key after k.
+    """
+    keys = [source_key]
+    for step in steps:
+        digest = hashlib.sha1()
+        digest.update(keys[-1].encode())
+        digest.update(step_signature(step).encode())
+        keys.append(digest.hexdigest())
+    return keys
+
+# ====================================================
+#  PROCESS-WIDE STORE
+# ====================================================
+# Every session's cached values (the loaded sample, its schema, intermediate frames,
+# step outputs) share ONE byte budget, SESSION_CACHE_MAX_MB. Entries are evicted least
+# recently used first, looking at the _EVICTION_WINDOW oldest ones and dropping the
+# biggest of them: a large cold frame goes before the small schemas and lineage states
+# next to it. One session holds at most PREVIEW_CACHE_MAX_MB, then its own entries go.
+
+_EVICTION_WINDOW = 8
+
+_store: "OrderedDict[Tuple[str, str, str], Tuple[object, int]]" = OrderedDict()
+_session_bytes: Dict[str, int] = {}
+_session_tokens: Dict[str, str] = {}
+_store_lock = threading.Lock()
+_total_bytes = 0
+
+def _max_bytes() -> int:
+    return settings.SESSION_CACHE_MAX_MB * 1024 * 1024
+
+def _session_max_bytes() -> int:
+    return min(settings.PREVIEW_CACHE_MAX_MB * 1024 * 1024, _max_bytes())
+
+def _drop(key: Tuple[str, str, str]):
+    global _total_bytes
+    _, size = _store.pop(key)
+    _total_bytes -= size
+    remaining = _session_bytes[key[0]] - size
+    if remaining > 0:
+        _session_bytes[key[0]] = remaining
+    else:
+        _session_bytes.pop(key[0], None)
+
+def _evict(session_id: str):
+    # 1. The session over its own share gives back its least recently used entries
+    while _session_bytes.get(session_id, 0) > _session_max_bytes():
+        _drop(next(key for key in _store if key[0] == session_id))
+        metrics.CACHE_EVICTIONS.inc(reason="session")
+
+    # 2. The process over budget: the biggest of the oldest entries goes first
+    while _total_bytes > _max_bytes():
+        oldest = list(islice(_store.items(), _EVICTION_WINDOW))
+        _drop(max(oldest, key=lambda item: item[1][1])[0])
+        metrics.CACHE_EVICTIONS.inc(reason="budget")
+
+def _get(session_id: str, namespace: str, key: str):
+    with _store_lock:
+        entry = _store.get((session_id, namespace, key))
+        if entry is None:
+            return None
+        _store.move_to_end((session_id, namespace, key))
+        return entry[0]
+
+def _put(session_id: str, namespace: str, key: str, value, size: int):
+    if size > _session_max_bytes():
+        return  # Would evict everything else and still not fit
+
+    global _total_bytes
+    with _store_lock:
+        full_key = (session_id, namespace, key)
+        if full_key in _store:
+            _drop(full_key)
+        _store[full_key] = (value, size)
+        _session_bytes[session_id] = _session_bytes.get(session_id, 0) + size
+        _total_bytes += size
+        _evict(session_id)
+
+def _contains(session_id: str, namespace: str, key: str) -> bool:
+    with _store_lock:
+        full_key = (session_id, namespace, key)
+        if full_key in _store:
+            _store.move_to_end(full_key)
+            return True
+        return False
+
+def frame_size(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True).sum())
+
+class OutputCache:
+    """
+    Single-step outputs (column arrays, kept row positions, lineage state) of ONE
+    session, in the process-wide store. Entries are stored as given; the caller
+    copies anything the transformer could mutate.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+
+    def get(self, key: str):
+        return _get(self.session_id, "output", key)
+
+    def put(self, key: str, value, size: int):
+        _put(self.session_id, "output", key, value, size)
+
+class PrefixCache:
+    """
+    Intermediate DataFrames of ONE session, in the process-wide store.
+    Frames are copied on the way in and on the way out, because the transformer mutates in place.
+    `outputs` holds per-step column outputs for lineage-based replays.
+    """
+
+    def __init__(self, session_id: str, source_token: str):
+        self.session_id = session_id
+        self.source_token = source_token
+        self.outputs = OutputCache(session_id)
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        df = _get(self.session_id, "frame", key)
+        return None if df is None else df.copy()
+
+    def put(self, key: str, df: pd.DataFrame):
+        if _contains(self.session_id, "frame", key):
+            return
+        _put(self.session_id, "frame", key, df.copy(), frame_size(df))
+
+    def longest_prefix(self, keys: List[str]) -> Tuple[int, Optional[pd.DataFrame]]:
+        """
+        Returns (n_steps_done, frame) for the longest cached prefix of `keys`.
+        keys[0] (the raw sample) counts as a prefix of length 0.
+        """
+        for i in range(len(keys) - 1, -1, -1):
+            df = self.get(keys[i])
+            if df is not None:
+                return i, df
+        return 0, None
+
+# ====================================================
+#  SESSIONS
+# ====================================================
+
+def _source_token(source_path: Path) -> str:
+    # A re-upload rewrites the file, which changes its mtime/size and therefore the token
+    stat = source_path.stat()
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+def get_session_cache(session_id: str, source_path: Path) -> PrefixCache:
+    token = _source_token(source_path)
+    with _store_lock:
+        if _session_tokens.get(session_id) != token:
+            # Entries of an older upload under this id can never be hit again
+            _invalidate(session_id)
+            _session_tokens[session_id] = token
+    return PrefixCache(session_id, token)
+
+def load_sample(session_id: str) -> pd.DataFrame:
+    """
+    The session's sample.csv as read_dataset loads it, from the cache when possible
+    (a copy: callers may modify it). FileNotFoundError for an unknown session.
+    """
+    sample_path = settings.UPLOAD_DIR / session_id / "sample.csv"
+    cache = get_session_cache(session_id, sample_path)
+    df = cache.get(SOURCE_KEY)
+    metrics.cache_lookup("session_sample", df is not None)
+    if df is None:
+        df = file_manager.read_dataset(sample_path)
+        cache.put(SOURCE_KEY, df)
+    return df
+
+def load_schema(session_id: str) -> Optional[dict]:
+    """file_manager.read_schema of the session, cached under the sample's token (None without one)."""
+    session_dir = settings.UPLOAD_DIR / session_id
+    sample_path = session_dir / "sample.csv"
+    if not sample_path.exists():
+        return file_manager.read_schema(session_dir)
+
+    get_session_cache(session_id, sample_path)
+    text = _get(session_id, "schema", "schema.json")
+    metrics.cache_lookup("session_schema", text is not None)
+    if text is None:
+        schema = file_manager.read_schema(session_dir)
+        if schema is None:
+            return None
+        text = json.dumps(schema)
+        _put(session_id, "schema", "schema.json", text, len(text))
+    # Parsed per call: every caller gets its own dict
+    return json.loads(text)
+
+def _invalidate(session_id: str):
+    for key in [key for key in _store if key[0] == session_id]:
+        _drop(key)
+    _session_tokens.pop(session_id, None)
+
+def invalidate_session(session_id: str):
+    with _store_lock:
+        _invalidate(session_id)
+
+def stats() -> dict:
+    """Size and hit/miss counts of the process-wide cache (this process only)."""
+    with _store_lock:
+        sessions = len(_session_bytes)
+        entries = len(_store)
+        total_bytes = _total_bytes
+    lookups = {}
+    for cache in ["session_sample", "session_schema", "preview_prefix", "step_outputs"]:
+        lookups[cache] = {result: int(metrics.CACHE_REQUESTS.value(cache=cache, result=result))
+                          for result in ["hit", "miss"]}
+    return {
+        "bytes": total_bytes,
+        "max_bytes": _max_bytes(),
+        "session_max_bytes": _session_max_bytes(),
+        "sessions": sessions,
+        "entries": entries,
+        "evictions": {reason: int(metrics.CACHE_EVICTIONS.value(reason=reason)) for reason in ["session", "budget"]},
+        "lookups": lookups,
+    }
@@ -0,0 +1,213 @@
+"""
+One-pass row sampling over a CSV byte stream.
+
+The upload is fed in as raw byte chunks. Records are split on newlines outside
+quoted fields, so a quoted value containing a newline stays one row. Only the
+selected records are ever copied; everything else is just counted.
+"""
+import csv
+import io
+import itertools
+import math
+import random
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+SAMPLING_METHODS = ["reservoir", "stratified", "head"]
+
+class RecordSampler:
+    """
+    Splits a CSV byte stream into records and keeps a sample of them.
+
+    - "head":       the first `size` rows (the old behaviour)
+    - "reservoir":  a uniform random sample (Algorithm L: O(size) random draws, not O(n))
+    - "stratified": one reservoir per value of `stratify_by`, then a proportional
+                    allocation of `size` across strata. Falls back to the plain
+                    reservoir when the column has more than `max_strata` values.
+    """
+
+    def __init__(self, size: int, method: str = "reservoir", seed: Optional[int] = None,
+                 stratify_by: Optional[str] = None, max_strata: int = 1000):
+        if method not in SAMPLING_METHODS:
+            raise ValueError(f"Unknown sampling method '{method}'.")
+        if method == "stratified" and not stratify_by:
+            raise ValueError("Stratified sampling needs a 'stratify_by' column.")
+
+        self.size = size
+        self.method = method
+        self.seed = seed if seed is not None else random.SystemRandom().randrange(2 ** 32)
+        self.stratify_by = stratify_by
+        self.max_strata = max_strata
+
+        self.header: Optional[bytes] = None
+        self.rows = 0
+        self._partial = b""
+        self._rng = random.Random(self.seed)
+        self._np_rng = np.random.default_rng(self.seed)
+
+        # Plain reservoir (also the fallback for stratified)
+        self._reservoir: List[Tuple[int, bytes]] = []
+        self._w = math.exp(math.log(self._rng.random()) / size) if size else 0.0
+        self._next = size + self._skip() if size else -1
+
+        # Stratified state
+        self._key_index: Optional[int] = None
+        self._strata: Dict[str, List[Tuple[int, bytes]]] = {}
+        self._strata_counts: Dict[str, int] = {}
+        self._too_many_strata = False
+
+    # --- STREAM ---
+
+    def feed(self, data: bytes):
+        buf = self._partial + data
+        if not buf:
+            return
+        arr = np.frombuffer(buf, dtype=np.uint8)
+
+        # A record always starts outside quotes, so parity restarts at 0 on every buffer
+        newlines = arr == ord("\n")
+        if b'"' in buf:
+            newlines &= np.cumsum(arr == ord('"')) % 2 == 0
+        breaks = np.flatnonzero(newlines)
+
+        if breaks.size == 0:
+            self._partial = buf
+            return
+
+        starts = np.concatenate([[0], breaks[:-1] + 1])
+        self._partial = buf[breaks[-1] + 1:]
+        self._take(buf, starts, breaks)
+
+    def finish(self):
+        # Last record without a trailing newline
+        if self._partial.strip():
+            self._take(self._partial + b"\n", np.array([0]), np.array([len(self._partial)]))
+        self._partial = b""
+
+    def _take(self, buf: bytes, starts: np.ndarray, ends: np.ndarray):
+        if self.header is None:
+            self.header = buf[starts[0]:ends[0]]
+            starts, ends = starts[1:], ends[1:]
+            if self.method == "stratified":
+                self._key_index = self._find_key_index()
+        if starts.size == 0:
+            return
+
+        first = self.rows
+        self.rows += starts.size
+
+        if self.method == "head":
+            n = max(min(self.size - first, starts.size), 0)
+            self._reservoir.extend((first + i, buf[starts[i]:ends[i]]) for i in range(n))
+            return
+
+        self._take_reservoir(buf, starts, ends, first)
+        if self.method == "stratified" and not self._too_many_strata:
+            self._take_stratified(buf, starts, ends, first)
+
+    def _skip(self) -> int:
+        return int(math.floor(math.log(self._rng.random()) / math.log(1 - self._w)))
+
+    def _take_reservoir(self, buf: bytes, starts: np.ndarray, ends: np.ndarray, first: int):
+        # 1. Fill
+        i = 0
+        while len(self._reservoir) < self.size and i < starts.size:
+            self._reservoir.append((first + i, buf[starts[i]:ends[i]]))
+            i += 1
+
+        # 2. Algorithm L: jump straight to the next record that enters the reservoir
+        last = first + starts.size
+        while 0 <= self._next < last:
+            i = self._next - first
+            self._reservoir[self._rng.randrange(self.size)] = (self._next, buf[starts[i]:ends[i]])
+            self._w *= math.exp(math.log(self._rng.random()) / self.size)
+            self._next += self._skip() + 1
+
+    def _find_key_index(self) -> int:
+        header = next(csv.reader([self.header.decode("utf-8", errors="replace").rstrip("\r")]))
+        if self.stratify_by not in header:
+            raise ValueError(f"Stratify column '{self.stratify_by}' not found in the file.")
+        return header.index(self.stratify_by)
+
+    def _take_stratified(self, buf: bytes, starts: np.ndarray, ends: np.ndarray, first: int):
+        # 1. Stratum key of every record (the csv module handles quoting)
+        text = buf[starts[0]:ends[-1]].decode("utf-8", errors="replace")
+        k = self._key_index
+        keys = [fields[k] if k < len(fields) else ""
+                for fields in itertools.islice(csv.reader(io.StringIO(text)), starts.size)]
+        codes, uniques = pd.factorize(pd.Series(keys, dtype="object"))
+
+        for key in uniques:
+            self._strata_counts.setdefault(key, 0)
+        if len(self._strata_counts) > self.max_strata:
+            # High-cardinality column: stop stratifying, the plain reservoir takes over
+            self._too_many_strata = True
+            self._strata.clear()
+            return
+
+        # 2. Algorithm R per stratum, vectorised: position of each record inside its stratum
+        seen = np.array([self._strata_counts[key] for key in uniques], dtype="int64")
+        positions = seen[codes] + pd.Series(codes).groupby(codes).cumcount().to_numpy()
+        slots = np.where(positions < self.size, positions,
+                         (self._np_rng.random(codes.size) * (positions + 1)).astype("int64"))
+
+        # Only the records that enter a reservoir are touched in Python
+        for i in np.flatnonzero(slots < self.size):
+            stratum = self._strata.setdefault(uniques[codes[i]], [])
+            item = (first + int(i), buf[starts[i]:ends[i]])
+            if slots[i] == len(stratum):
+                stratum.append(item)
+            else:
+                stratum[slots[i]] = item
+
+        for key, n in zip(uniques, np.bincount(codes, minlength=len(uniques))):
+            self._strata_counts[key] += int(n)
+
+    # --- RESULT ---
+
+    def sample_bytes(self) -> bytes:
+        """Header + sampled records, in their original file order."""
+        records = self._selected()
+        records.sort(key=lambda item: item[0])
+        return b"\n".join([self.header or b""] + [record for _, record in records]) + b"\n"
+
+    def _selected(self) -> List[Tuple[int, bytes]]:
+        if self.method != "stratified" or self._too_many_strata:
+            return list(self._reservoir)
+
+        # Proportional allocation (largest remainder), at least one row per stratum
+        total = sum(self._strata_counts.values())
+        quotas = {k: self.size * n / total for k, n in self._strata_counts.items()}
+        alloc = {k: max(int(q), 1) for k, q in quotas.items()}
+        leftover = self.size - sum(alloc.values())
+        for k in sorted(quotas, key=lambda k: quotas[k] - int(quotas[k]), reverse=True):
+            if leftover <= 0:
+                break
+            alloc[k] += 1
+            leftover -= 1
+
+        selected = []
+        for key, stratum in self._strata.items():
+            n = min(alloc[key], len(stratum))
+            selected.extend(self._rng.sample(stratum, n))
+        return selected
+
+    def metadata(self) -> dict:
+        n_sample = min(self.size, self.rows)
+        method = self.method
+        if method == "stratified" and self._too_many_strata:
+            method = "reservoir"
+        meta = {
+            "method": method,
+            "requested_method": self.method,
+            "sample_size": n_sample,
+            "rows_total": self.rows,
+            "sample_fraction": round(n_sample / self.rows, 6) if self.rows else 0.0,
+            "seed": self.seed,
+        }
+        if self.method == "stratified":
+            meta["stratify_by"] = self.stratify_by
+            meta["strata"] = None if self._too_many_strata else len(self._strata_counts)
+        return meta
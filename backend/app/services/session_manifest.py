@@ -0,0 +1,218 @@
+"""
+Session manifest: one row per upload session in an SQLite index next to the
+uploads (<UPLOAD_DIR>/sessions.db), with its creation and last-access times and
+its bytes on disk. Cleanup reads it instead of listing and stat-ing every folder:
+
+- TTL: sessions not accessed for SESSION_TTL_HOURS come from an index range scan (O(expired))
+- quota: a running total (kept by triggers) says when SESSION_DISK_QUOTA_MB is passed,
+  then the least recently accessed sessions are read off the same index
+
+Requests `touch` their session; the write happens at most once per
+SESSION_TOUCH_INTERVAL_SECONDS per session. The database is in WAL mode, so
+several server processes and job workers share it.
+
+It also indexes the shared blobs (see blob_store.py): their bytes count towards
+the quota once, and `session_blobs` holds the references that make up `refs`.
+"""
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from app.config import settings
+
+MANIFEST_FILE = "sessions.db"
+BLOB_DIR_NAME = "blobs"   # <UPLOAD_DIR>/blobs holds the blob store, it is not a session
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    bytes INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access);
+
+CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL);
+INSERT OR IGNORE INTO totals VALUES (0, 0);
+
+CREATE TRIGGER IF NOT EXISTS sessions_insert AFTER INSERT ON sessions
+BEGIN UPDATE totals SET bytes = bytes + NEW.bytes; END;
+CREATE TRIGGER IF NOT EXISTS sessions_resize AFTER UPDATE OF bytes ON sessions
+BEGIN UPDATE totals SET bytes = bytes + NEW.bytes - OLD.bytes; END;
+CREATE TRIGGER IF NOT EXISTS sessions_delete AFTER DELETE ON sessions
+BEGIN UPDATE totals SET bytes = bytes - OLD.bytes; END;
+
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    refs INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS blobs_refs ON blobs (refs);
+CREATE TABLE IF NOT EXISTS session_blobs (
+    session_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (session_id, kind)
+);
+
+CREATE TRIGGER IF NOT EXISTS blobs_insert AFTER INSERT ON blobs
+BEGIN UPDATE totals SET bytes = bytes + NEW.bytes; END;
+CREATE TRIGGER IF NOT EXISTS blobs_resize AFTER UPDATE OF bytes ON blobs
+BEGIN UPDATE totals SET bytes = bytes + NEW.bytes - OLD.bytes; END;
+CREATE TRIGGER IF NOT EXISTS blobs_delete AFTER DELETE ON blobs
+BEGIN UPDATE totals SET bytes = bytes - OLD.bytes; END;
+CREATE TRIGGER IF NOT EXISTS session_blobs_insert AFTER INSERT ON session_blobs
+BEGIN UPDATE blobs SET refs = refs + 1 WHERE digest = NEW.digest; END;
+CREATE TRIGGER IF NOT EXISTS session_blobs_delete AFTER DELETE ON session_blobs
+BEGIN UPDATE blobs SET refs = refs - 1 WHERE digest = OLD.digest; END;
+"""
+
+_lock = threading.Lock()
+_connections: Dict[Path, sqlite3.Connection] = {}
+_last_touch: Dict[str, float] = {}
+
+def manifest_path() -> Path:
+    return settings.UPLOAD_DIR / MANIFEST_FILE
+
+def _connection() -> sqlite3.Connection:
+    # One connection per database per process (settings.UPLOAD_DIR can move, e.g. in job workers)
+    path = manifest_path()
+    conn = _connections.get(path)
+    if conn is None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _connections[path] = conn
+    return conn
+
+def _execute(sql: str, params: tuple = ()) -> List[tuple]:
+    with _lock:
+        return _connection().execute(sql, params).fetchall()
+
+def session_bytes(session_dir: Path) -> int:
+    """
+    Bytes of every file under the session folder (one folder, not the whole upload dir).
+    Links into the blob store count as the link only: the blob is counted once, on its own.
+    """
+    total = 0
+    for root, _, files in os.walk(session_dir):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass   # Deleted while we walked (e.g. a job's temp file)
+    return total
+
+# ====================================================
+#  WRITES
+# ====================================================
+
+def register(session_id: str):
+    """A (re-)upload: the session starts over, with its current size."""
+    now = time.time()
+    size = session_bytes(settings.UPLOAD_DIR / session_id)
+    _execute("INSERT INTO sessions (session_id, created_at, last_access, bytes) VALUES (?, ?, ?, ?) "
+             "ON CONFLICT (session_id) DO UPDATE SET created_at = excluded.created_at, "
+             "last_access = excluded.last_access, bytes = excluded.bytes",
+             (session_id, now, now, size))
+    _last_touch[session_id] = now
+
+def refresh_size(session_id: str):
+    """After something was written into the session or its blobs (columnar copy, export, profile...)."""
+    session_dir = settings.UPLOAD_DIR / session_id
+    if session_dir.is_dir():
+        _execute("UPDATE sessions SET bytes = ? WHERE session_id = ?", (session_bytes(session_dir), session_id))
+    for digest, path in session_blobs(session_id).items():
+        _execute("UPDATE blobs SET bytes = ? WHERE digest = ?", (session_bytes(path), digest))
+
+def touch(session_id: str, force: bool = False):
+    """Records an access. Throttled per process: reads must not turn into one write each."""
+    now = time.time()
+    if not force and now - _last_touch.get(session_id, 0.0) < settings.SESSION_TOUCH_INTERVAL_SECONDS:
+        return
+    _last_touch[session_id] = now
+    _execute("UPDATE sessions SET last_access = ? WHERE session_id = ?", (now, session_id))
+
+def remove(session_id: str):
+    # Drops the session's blob references too (the refs triggers count them down)
+    _execute("DELETE FROM session_blobs WHERE session_id = ?", (session_id,))
+    _execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+    _last_touch.pop(session_id, None)
+
+def add_blob(digest: str, size: int):
+    _execute("INSERT OR IGNORE INTO blobs (digest, created_at, bytes) VALUES (?, ?, ?)", (digest, time.time(), size))
+
+def reference_blob(session_id: str, kind: str, digest: str):
+    """The session's `kind` ("dataset", "sample") is now `digest`; a previous one is released."""
+    _execute("DELETE FROM session_blobs WHERE session_id = ? AND kind = ?", (session_id, kind))
+    _execute("INSERT INTO session_blobs (session_id, kind, digest) VALUES (?, ?, ?)", (session_id, kind, digest))
+
+def remove_blob(digest: str):
+    _execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+
+# ====================================================
+#  READS
+# ====================================================
+
+def get(session_id: str) -> Optional[dict]:
+    rows = _execute("SELECT created_at, last_access, bytes FROM sessions WHERE session_id = ?", (session_id,))
+    if not rows:
+        return None
+    created_at, last_access, size = rows[0]
+    return {"session_id": session_id, "created_at": created_at, "last_access": last_access, "bytes": size}
+
+def session_blobs(session_id: str) -> Dict[str, Path]:
+    """digest -> blob folder of every blob the session references."""
+    from app.services import blob_store
+    rows = _execute("SELECT digest FROM session_blobs WHERE session_id = ?", (session_id,))
+    return {row[0]: blob_store.blob_path(row[0]) for row in rows}
+
+def session_ids() -> Set[str]:
+    return {row[0] for row in _execute("SELECT session_id FROM sessions")}
+
+def unreferenced_blobs() -> List[str]:
+    return [row[0] for row in _execute("SELECT digest FROM blobs WHERE refs <= 0")]
+
+def blob_refs(digest: str) -> Optional[int]:
+    rows = _execute("SELECT refs FROM blobs WHERE digest = ?", (digest,))
+    return rows[0][0] if rows else None
+
+def total_bytes() -> int:
+    return _execute("SELECT bytes FROM totals WHERE id = 0")[0][0]
+
+def expired(now: Optional[float] = None) -> List[str]:
+    """Sessions idle for longer than the TTL, oldest first."""
+    cutoff = (now or time.time()) - settings.SESSION_TTL_HOURS * 3600
+    rows = _execute("SELECT session_id FROM sessions WHERE last_access < ? ORDER BY last_access", (cutoff,))
+    return [row[0] for row in rows]
+
+def least_recent(limit: int) -> List[tuple]:
+    """(session_id, bytes) of the `limit` least recently accessed sessions."""
+    return _execute("SELECT session_id, bytes FROM sessions ORDER BY last_access LIMIT ?", (limit,))
+
+def sync():
+    """
+    Startup: brings the index in line with the upload dir (sessions from before the
+    manifest, uploads killed before they registered, or folders removed by hand).
+    The only full listing of the upload dir: folders it indexes expire like any session.
+    """
+    upload_dir = settings.UPLOAD_DIR
+    if not upload_dir.exists():
+        return
+    on_disk = {path.name: path for path in upload_dir.iterdir()
+               if path.is_dir() and path.name != BLOB_DIR_NAME}
+    indexed = session_ids()
+
+    for session_id in indexed - set(on_disk):
+        remove(session_id)
+    for session_id in set(on_disk) - indexed:
+        # Best guess for an untracked session: its folder's mtime
+        mtime = on_disk[session_id].stat().st_mtime
+        _execute("INSERT OR IGNORE INTO sessions (session_id, created_at, last_access, bytes) VALUES (?, ?, ?, ?)",
+                 (session_id, mtime, mtime, session_bytes(on_disk[session_id])))
@@ -0,0 +1,309 @@
+"""
+Mergeable, bounded-memory statistics used by the chunked executor and the
+full-file profiler. Every accumulator takes one chunk at a time through `update()` and never
+keeps more than a fixed number of values per column.
+"""
+import copy
+
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+class RunningMoments:
+    """
+    Count / mean / variance / min / max with Welford-Chan merging.
+    NaN values are ignored, like pandas does.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.nan
+        self.max = np.nan
+
+    def update(self, values):
+        x = np.asarray(values, dtype="float64")
+        x = x[~np.isnan(x)]
+        if x.size == 0:
+            return
+
+        chunk_mean = float(x.mean())
+        chunk_m2 = float(((x - chunk_mean) ** 2).sum())
+        self._merge(x.size, chunk_mean, chunk_m2, float(x.min()), float(x.max()))
+
+    def merge(self, other: "RunningMoments"):
+        if other.count:
+            self._merge(other.count, other.mean, other.m2, other.min, other.max)
+
+    def _merge(self, n_b, mean_b, m2_b, min_b, max_b):
+        n_a = self.count
+        n = n_a + n_b
+        delta = mean_b - self.mean
+        self.mean = self.mean + delta * n_b / n
+        self.m2 = self.m2 + m2_b + delta ** 2 * n_a * n_b / n
+        self.count = n
+        self.min = min_b if n_a == 0 else min(self.min, min_b)
+        self.max = max_b if n_a == 0 else max(self.max, max_b)
+
+    def var(self, ddof: int = 1) -> float:
+        if self.count - ddof <= 0:
+            return np.nan
+        return self.m2 / (self.count - ddof)
+
+    def std(self, ddof: int = 1) -> float:
+        return float(np.sqrt(self.var(ddof)))
+
+class QuantileSketch:
+    """
+    KLL-style quantile sketch. Values are exact until more than `k` of them
+    have been seen; after that, full levels are sorted and every other item
+    is promoted to the next level with doubled weight.
+    Memory is O(k * log(n / k)) regardless of n.
+    """
+
+    def __init__(self, k: int = 4096, seed: int = 0):
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0, dtype="float64")]
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        x = np.asarray(values, dtype="float64")
+        x = x[~np.isnan(x)]
+        if x.size == 0:
+            return
+        self.count += x.size
+        self.levels[0] = np.concatenate([self.levels[0], x])
+        self._compress()
+
+    def update_repeated(self, value: float, n: int):
+        """`n` copies of `value`, in O(log n) memory: one item at each level whose bit is set in n."""
+        if n <= 0 or np.isnan(value):
+            return
+        if self.is_exact and self.levels[0].size + n <= self.k:
+            # Still small: stay exact
+            self.update(np.full(n, value, dtype="float64"))
+            return
+        self.count += n
+        h = 0
+        while n:
+            if n & 1:
+                while h >= len(self.levels):
+                    self.levels.append(np.empty(0, dtype="float64"))
+                self.levels[h] = np.append(self.levels[h], value)
+            n >>= 1
+            h += 1
+        self._compress()
+
+    def copy(self) -> "QuantileSketch":
+        return copy.deepcopy(self)
+
+    def merge(self, other: "QuantileSketch"):
+        for h, items in enumerate(other.levels):
+            if h >= len(self.levels):
+                self.levels.append(np.empty(0, dtype="float64"))
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.count += other.count
+        self._compress()
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            if self.levels[h].size > self.k:
+                items = np.sort(self.levels[h])
+                offset = int(self._rng.integers(0, 2))
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0, dtype="float64"))
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], items[offset::2]])
+                self.levels[h] = np.empty(0, dtype="float64")
+            h += 1
+
+    @property
+    def is_exact(self) -> bool:
+        return len(self.levels) == 1
+
+    def quantiles(self, qs) -> np.ndarray:
+        qs = np.asarray(qs, dtype="float64")
+        if self.count == 0:
+            return np.full(qs.shape, np.nan)
+
+        # Nothing compacted yet: same linear interpolation as pandas / numpy
+        if self.is_exact:
+            return np.quantile(self.levels[0], qs)
+
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(level.size, 2 ** h, dtype="float64")
+                                  for h, level in enumerate(self.levels)])
+        order = np.argsort(values)
+        values, weights = values[order], weights[order]
+        # Midpoint ranks, normalised to [0, 1]
+        ranks = (np.cumsum(weights) - weights / 2) / weights.sum()
+        return np.interp(qs, ranks, values)
+
+    def quantile(self, q: float) -> float:
+        return float(self.quantiles([q])[0])
+
+    def cdf(self, points, strict: bool = False) -> np.ndarray:
+        """Estimated fraction of values <= each point (< each point when `strict`)."""
+        points = np.asarray(points, dtype="float64")
+        if self.count == 0:
+            return np.zeros(points.shape)
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(level.size, 2 ** h, dtype="float64")
+                                  for h, level in enumerate(self.levels)])
+        order = np.argsort(values)
+        cum = np.cumsum(weights[order])
+        idx = np.searchsorted(values[order], points, side="left" if strict else "right")
+        return np.where(idx > 0, cum[np.maximum(idx - 1, 0)], 0.0) / weights.sum()
+
+class ValueCounter:
+    """
+    Exact value counts, merged chunk by chunk. Memory grows with the
+    column's cardinality (not its length), which is what encoders need anyway.
+    """
+
+    def __init__(self, dropna: bool = True):
+        self.dropna = dropna
+        self.counts = pd.Series(dtype="int64")
+
+    def update(self, values: pd.Series):
+        chunk_counts = values.value_counts(dropna=self.dropna)
+        self.counts = self.counts.add(chunk_counts, fill_value=0).astype("int64")
+
+    def mode(self):
+        """Most frequent value; ties resolve to the smallest value, like Series.mode()[0]."""
+        if self.counts.empty:
+            return None
+        top = self.counts[self.counts == self.counts.max()]
+        return sorted(top.index.tolist())[0]
+
+    def values(self) -> list:
+        return sorted(self.counts.index.tolist())
+
+class Reservoir:
+    """
+    Uniform random sample of at most `size` rows (Algorithm R, vectorised per chunk).
+    Used for fits that need raw rows, e.g. the KNN reference set and the Box-Cox lambda.
+    """
+
+    def __init__(self, size: int, seed: int = 0):
+        self.size = size
+        self.seen = 0
+        self.rows: Optional[pd.DataFrame] = None
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, chunk: pd.DataFrame):
+        chunk = chunk.reset_index(drop=True)
+        n = len(chunk)
+        if n == 0:
+            return
+
+        if self.rows is None:
+            self.rows = chunk.iloc[0:0].copy()
+
+        # 1. Fill the reservoir first
+        free = max(self.size - len(self.rows), 0)
+        if free:
+            self.rows = pd.concat([self.rows, chunk.iloc[:free]], ignore_index=True)
+        rest = chunk.iloc[free:]
+
+        # 2. Item i (0-based global position) replaces a random slot with probability size / (i + 1)
+        if len(rest):
+            positions = np.arange(self.seen + free, self.seen + n)
+            slots = (self._rng.random(len(rest)) * (positions + 1)).astype("int64")
+            keep = slots < self.size
+            if keep.any():
+                # Later rows win on repeated slots, exactly like the sequential algorithm
+                slot_rows = pd.Series(np.flatnonzero(keep), index=slots[keep])
+                slot_rows = slot_rows[~slot_rows.index.duplicated(keep="last")]
+                targets, sources = slot_rows.index.to_numpy(), slot_rows.to_numpy()
+                # Column by column, so every column keeps its own dtype
+                for j in range(chunk.shape[1]):
+                    self.rows.iloc[targets, j] = rest.iloc[sources, j].to_numpy()
+
+        self.seen += n
+
+class HyperLogLog:
+    """
+    Distinct-count estimate in 2^p one-byte registers (16 KB at p=14, ~0.8% error).
+    Small cardinalities fall back to linear counting, which is near exact.
+    Values are hashed with pandas' stable 64-bit hash, so chunks merge consistently.
+    """
+
+    def __init__(self, p: int = 14):
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype="uint8")
+
+    def update(self, values: pd.Series):
+        values = values.dropna()
+        if values.empty:
+            return
+        self.update_hashes(pd.util.hash_pandas_object(values, index=False).to_numpy())
+
+    def update_hashes(self, hashes: np.ndarray):
+        hashes = np.asarray(hashes, dtype="uint64")
+        idx = (hashes >> np.uint64(64 - self.p)).astype("int64")
+        rest = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        # Rank = position of the first 1-bit in the remaining 64-p bits
+        bit_length = np.zeros(rest.shape, dtype="int64")
+        nonzero = rest > 0
+        bit_length[nonzero] = np.floor(np.log2(rest[nonzero].astype("float64"))).astype("int64") + 1
+        rank = (64 - self.p - bit_length + 1).astype("uint8")
+        np.maximum.at(self.registers, idx, rank)
+
+    def merge(self, other: "HyperLogLog"):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype("float64")))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+class HeavyHitters:
+    """
+    Misra-Gries summary: keeps at most `capacity` counters. Any value whose
+    frequency exceeds n / capacity is guaranteed to be kept; kept counts are
+    lower bounds, off by at most `error`. Exact while cardinality <= capacity.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.error = 0
+        self.counts = pd.Series(dtype="int64")
+
+    def update(self, values: pd.Series):
+        self._absorb(values.value_counts())
+
+    def merge(self, other: "HeavyHitters"):
+        self.error += other.error
+        self._absorb(other.counts)
+
+    def _absorb(self, counts: pd.Series):
+        self.counts = self.counts.add(counts, fill_value=0).astype("int64")
+        if len(self.counts) > self.capacity:
+            # Subtract the (capacity+1)-th largest count from everyone, drop what hits zero
+            cut = int(self.counts.nlargest(self.capacity + 1).iloc[-1])
+            self.counts = self.counts - cut
+            self.counts = self.counts[self.counts > 0]
+            self.error += cut
+
+    @property
+    def is_exact(self) -> bool:
+        return self.error == 0
+
+    def top(self, n: int) -> pd.Series:
+        """Most frequent values, like value_counts().head(n)."""
+        return self.counts.sort_values(ascending=False, kind="stable").head(n)
+
+    def mode(self):
+        """Most frequent value; ties resolve to the smallest value, like Series.mode()[0]."""
+        if self.counts.empty:
+            return None
+        top = self.counts[self.counts == self.counts.max()]
+        return sorted(top.index.tolist())[0]
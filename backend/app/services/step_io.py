@@ -0,0 +1,86 @@
+from typing import Set
+from app.models.recipe import Step
+from app.services.transformer import expand_step, resolve_column
+
+DATE_PART_SUFFIXES = ["year", "month", "day", "dow"]
+
+class StepIO:
+    """
+    Static description of which columns a step reads and writes.
+    It is an upper bound: a step that gets skipped at runtime touches nothing.
+    """
+
+    def __init__(self, reads: Set[str] = None, writes: Set[str] = None, drops: Set[str] = None,
+                 reads_all: bool = False, changes_rows: bool = False, dynamic_writes: bool = False):
+        self.reads = reads or set()
+        self.writes = writes or set()        # Columns created or overwritten
+        self.drops = drops or set()          # Columns removed from the frame
+        self.reads_all = reads_all           # Result depends on every column (e.g. drop_duplicates)
+        self.changes_rows = changes_rows     # Filters/deduplicates rows
+        self.dynamic_writes = dynamic_writes # Output columns depend on the data (e.g. one-hot)
+
+    @property
+    def touched(self) -> Set[str]:
+        return self.writes | self.drops
+
+def describe_step(step: Step) -> StepIO:
+    if step.selector is not None:
+        # Matched against the frame only when the step runs: until then it could be anything
+        return StepIO(reads_all=True, changes_rows=True, dynamic_writes=True)
+    if isinstance(step.column, list):
+        # Column by column is the reference behaviour of a batched step
+        parts = [describe_step(single) for single in expand_step(step)]
+        return StepIO(reads=set().union(*(p.reads for p in parts)),
+                      writes=set().union(*(p.writes for p in parts)),
+                      drops=set().union(*(p.drops for p in parts)),
+                      reads_all=any(p.reads_all for p in parts),
+                      changes_rows=any(p.changes_rows for p in parts),
+                      dynamic_writes=any(p.dynamic_writes for p in parts))
+
+    op = step.operation
+    params = step.params if step.params else {}
+    col = resolve_column(step)
+
+    if op == "drop_column":
+        return StepIO(drops={col})
+
+    if op == "drop_duplicates":
+        return StepIO(reads_all=True, changes_rows=True)
+
+    if op in ["drop_outliers_zscore", "drop_outliers_manual"]:
+        return StepIO(reads={col}, changes_rows=True)
+
+    if op == "fill_na_knn":
+        # Neighbours are searched over every numeric column
+        return StepIO(reads_all=True, writes={col})
+
+    if op == "fill_na_groupby":
+        return StepIO(reads={col, params.get('group_col')}, writes={col})
+
+    if op == "extract_date_parts":
+        new_cols = {f"{col}_{part}" for part in DATE_PART_SUFFIXES}
+        if str(params.get('drop_original')) == "True":
+            return StepIO(reads={col}, writes=new_cols, drops={col})
+        return StepIO(reads={col}, writes=new_cols | {col})
+
+    if op == "create_interaction":
+        return StepIO(reads={params.get('col1'), params.get('col2')}, writes={params.get('new_name')})
+
+    if op == "polynomial_features":
+        degree = int(params.get('degree', 2))
+        return StepIO(reads={col}, writes={f"{col}_poly_{i}" for i in range(2, degree + 1)})
+
+    if op == "one_hot_encode":
+        return StepIO(reads={col}, drops={col}, dynamic_writes=True)
+
+    if op == "target_encode":
+        return StepIO(reads={col, params.get('target_col')}, writes={col})
+
+    if op in ["fill_na_mean", "fill_na_median", "fill_na_mode", "fill_na_const",
+              "bin_numeric", "log_transform", "box_cox_transform",
+              "standard_scaler", "minmax_scaler", "robust_scaler", "maxabs_scaler",
+              "label_encode", "ordinal_encode"]:
+        return StepIO(reads={col}, writes={col})
+
+    # Unknown operation: assume the worst
+    return StepIO(reads_all=True, changes_rows=True, dynamic_writes=True)
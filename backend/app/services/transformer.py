@@ -1,3 +1,4 @@
+import re
 import pandas as pd
 import numpy as np
 from scipy.stats import skew, boxcox_normmax
@@ -7,235 +8,444 @@ from sklearn.preprocessing import (StandardScaler, MinMaxScaler, RobustScaler,
                                    MaxAbsScaler, LabelEncoder, OrdinalEncoder, 
                                    PolynomialFeatures)
 import category_encoders as ce 
+from typing import Callable, Dict, List, Optional
 
-from app.models.recipe import Recipe
+from app.models.recipe import Recipe, Step
+from app.services import dtypes, recipe_cache
+from app.services.recipe_cache import PrefixCache
 
-def apply_recipe(df: pd.DataFrame, recipe: Recipe) -> pd.DataFrame:
+# Operations that do not act on `step.column` (they name their columns in params, or use all of them)
+OPS_WITHOUT_COL = ["drop_duplicates", "create_interaction"]
+
+def resolve_column(step: Step) -> str:
+    """
+    The frontend stores the target column both in `step.column` and in
+    `params['col']`. The param wins when it is set.
+    """
+    params = step.params if step.params else {}
+    if 'col' in params and params['col']:
+        return params['col']
+    return step.column
+
+# ====================================================
+#  BATCHED STEPS (column lists and selectors)
+# ====================================================
+
+def is_batched(step: Step) -> bool:
+    return step.selector is not None or isinstance(step.column, list)
+
+def select_columns(df: pd.DataFrame, selector: str) -> List[str]:
+    """Columns of `df` matched by a step selector (see Step.selector), by their read_csv dtypes."""
+    if selector == "all":
+        return list(df.columns)
+    view = dtypes.compute_view(df)
+    if selector == "numeric":
+        return [c for c in view.columns if np.issubdtype(view[c].dtype, np.number)]
+    if selector == "categorical":
+        return list(view.select_dtypes(include=["object", "category", "string"]).columns)
+    if selector == "datetime":
+        return list(view.select_dtypes(include=["datetime", "datetimetz"]).columns)
+    if selector.startswith("dtype:"):
+        return list(view.select_dtypes(include=[selector[len("dtype:"):]]).columns)
+    if selector.startswith("regex:"):
+        return list(df.filter(regex=selector[len("regex:"):]).columns)
+    raise ValueError(f"Unknown column selector '{selector}'.")
+
+def bind_step(step: Step, df: pd.DataFrame) -> Step:
+    """Resolves a selector against the frame the step is about to run on (other steps are returned as is)."""
+    if step.selector is None:
+        return step
+    try:
+        cols = select_columns(df, step.selector)
+    except (ValueError, re.error) as e:
+        # Like an unconfigured column: the step is skipped
+        print(f"⚠️ SKIPPING {step.operation}: {e}")
+        cols = []
+    return step.model_copy(update={"column": cols, "selector": None})
+
+def bind_steps(steps: List[Step], df: pd.DataFrame) -> List[Step]:
+    """Binds every selector by replaying the steps on `df` (a sample is enough), so each sees the right dtypes."""
+    if not any(step.selector is not None for step in steps):
+        return list(steps)
+    bound = []
     df_result = df.copy()
+    for step in steps:
+        step = bind_step(step, df_result)
+        bound.append(step)
+        df_result = apply_step(df_result, step)
+    return bound
+
+def expand_step(step: Step) -> List[Step]:
+    """A column-list step as the equivalent single-column steps (same id)."""
+    if not isinstance(step.column, list):
+        return [step]
+    params = {k: v for k, v in (step.params or {}).items() if k != 'col'}
+    return [step.model_copy(update={"column": col, "params": params}) for col in dict.fromkeys(step.column)]
+
+def expand_steps(steps: List[Step]) -> List[Step]:
+    return [single for step in steps for single in expand_step(step)]
+
+def _numeric_columns(df: pd.DataFrame, cols: List[str]) -> List[str]:
+    return [c for c in cols if np.issubdtype(df[c].dtype, np.number)]
+
+def _block_drop(df: pd.DataFrame, cols: List[str], params: dict) -> pd.DataFrame:
+    df.drop(columns=cols, inplace=True)
+    return df
+
+def _block_fill(statistic: str):
+    def fill(df: pd.DataFrame, cols: List[str], params: dict) -> pd.DataFrame:
+        num = _numeric_columns(df, cols)
+        if num:
+            block = df[num]
+            values = getattr(block, statistic)()
+            # Columns without missing values would come back unchanged
+            filled = {c: df[c].fillna(values[c]) for c in block.columns[block.isna().any().to_numpy()]}
+            for c, column in filled.items():
+                df[c] = column
+        return df
+    return fill
+
+def _block_fill_const(df: pd.DataFrame, cols: List[str], params: dict) -> pd.DataFrame:
+    value = params.get('value', 0)
+    block = df[cols]
+    filled = {c: df[c].fillna(value) for c in block.columns[block.isna().any().to_numpy()]}
+    for c, column in filled.items():
+        df[c] = column
+    return df
+
+def _block_log(df: pd.DataFrame, cols: List[str], params: dict) -> pd.DataFrame:
+    num = _numeric_columns(df, cols)
+    if num:
+        block = df[num]
+        # Per column: shift by |min| + 1 only if it has values <= 0
+        offsets = (block.min().abs() + 1).where((block <= 0).any(), 0)
+        logged = np.log1p(block + offsets)
+        for c in num:
+            df[c] = logged[c]
+    return df
+
+def _block_scaler(scaler_cls):
+    def scale(df: pd.DataFrame, cols: List[str], params: dict) -> pd.DataFrame:
+        num = _numeric_columns(df, cols)
+        if num:
+            # One fit over the contiguous 2D block instead of one scaler per column
+            scaled = scaler_cls().fit_transform(df[num])
+            for i, c in enumerate(num):
+                df[c] = scaled[:, i]
+        return df
+    return scale
+
+def _block_ordinal(df: pd.DataFrame, cols: List[str], params: dict) -> pd.DataFrame:
+    encoded = OrdinalEncoder().fit_transform(df[cols])
+    for i, c in enumerate(cols):
+        df[c] = encoded[:, i]
+    return df
+
+def _block_one_hot(df: pd.DataFrame, cols: List[str], params: dict) -> pd.DataFrame:
+    return pd.get_dummies(df, columns=cols, drop_first=True)
+
+# Ops with a block form that gives the same result as running the op column by column.
+# Each computes every new column before assigning any, so one that fails while computing (and
+# then runs column by column) leaves the frame untouched; the assignments themselves are not atomic.
+BLOCK_OPS: Dict[str, Callable[[pd.DataFrame, List[str], dict], pd.DataFrame]] = {
+    "drop_column": _block_drop,
+    "fill_na_mean": _block_fill("mean"),
+    "fill_na_median": _block_fill("median"),
+    "fill_na_const": _block_fill_const,
+    "log_transform": _block_log,
+    "standard_scaler": _block_scaler(StandardScaler),
+    "minmax_scaler": _block_scaler(MinMaxScaler),
+    "robust_scaler": _block_scaler(RobustScaler),
+    "maxabs_scaler": _block_scaler(MaxAbsScaler),
+    "ordinal_encode": _block_ordinal,
+    "one_hot_encode": _block_one_hot,
+}
 
-    for step in recipe.steps:
+def _apply_batched(df_result: pd.DataFrame, step: Step) -> pd.DataFrame:
+    """
+    A step over several columns. Ops in BLOCK_OPS run once on the 2D block;
+    the others (and a block op that fails) run column by column.
+    """
+    op = step.operation
+    cols = list(dict.fromkeys(bind_step(step, df_result).column))
+    present = [c for c in cols if c in df_result.columns]
+    for col in cols:
+        if col not in df_result.columns:
+            print(f"⚠️ SKIPPING {op}: Column '{col}' not found in data.")
+    if not present:
+        return df_result
+
+    if op in BLOCK_OPS:
         try:
-            op = step.operation
-            # Safety: handle None params
-            params = step.params if step.params else {}
-
-            # --- 1. SYNC PARAM TO COLUMN ---
-            col = step.column
-            if 'col' in params and params['col']:
-                col = params['col']
-
-            # --- 2. VALIDATION ---
-            ops_without_col = ["drop_duplicates", "create_interaction"]
-            if op not in ops_without_col and col not in df_result.columns:
-                # This log is normal for unconfigured steps
-                print(f"⚠️ SKIPPING {op}: Column '{col}' not found in data.")
-                continue
-
-            # ====================================================
-            #  GROUP 1: CLEANING
-            # ====================================================
-            if op == "drop_column":
-                df_result.drop(columns=[col], inplace=True)
+            return BLOCK_OPS[op](df_result, present, step.params if step.params else {})
+        except Exception as e:
+            print(f"⚠️ Block {op} failed ({e}), running it column by column")
 
-            elif op == "drop_duplicates":
-                df_result.drop_duplicates(inplace=True)
-
-            elif op == "drop_outliers_zscore":
-                if np.issubdtype(df_result[col].dtype, np.number):
-                    threshold = float(params.get('threshold', 3))
-                    mean = df_result[col].mean()
-                    std = df_result[col].std()
-                    if std != 0:
-                        df_result = df_result[np.abs((df_result[col] - mean) / std) < threshold]
-
-            elif op == "drop_outliers_manual":
-                if np.issubdtype(df_result[col].dtype, np.number):
-                    val = float(params.get('value', 0))
-                    df_result = df_result[df_result[col] < val]
-
-            # ====================================================
-            #  GROUP 2: IMPUTATION
-            # ====================================================
-            elif op == "fill_na_mean":
-                if np.issubdtype(df_result[col].dtype, np.number):
-                    df_result[col] = df_result[col].fillna(df_result[col].mean())
+    for single in expand_step(step.model_copy(update={"column": present, "selector": None})):
+        df_result = apply_step(df_result, single)
+    return df_result
+
+def apply_recipe(df: pd.DataFrame, recipe: Recipe, cache: Optional[PrefixCache] = None) -> pd.DataFrame:
+    """
+    Replays the recipe on a copy of `df`.
+    If a session `cache` is given, resumes from the longest cached step prefix
+    and stores every new intermediate frame back into it.
+    """
+    steps = recipe.steps
+    start = 0
+    df_result = None
+
+    if cache is not None:
+        keys = recipe_cache.prefix_keys(steps)
+        start, df_result = cache.longest_prefix(keys)
+
+    if df_result is None:
+        df_result = df.copy()
+
+    for i in range(start, len(steps)):
+        df_result = apply_step(df_result, steps[i])
+        if cache is not None:
+            cache.put(keys[i + 1], df_result)
+
+    return df_result
+
+def widen_inputs(df: pd.DataFrame, step: Step) -> pd.DataFrame:
+    """Widens the columns `step` reads or writes back from their storage dtypes (see dtypes.py), in place."""
+    from app.services.step_io import describe_step  # step_io imports this module
+
+    io = describe_step(bind_step(step, df))
+    if io.reads_all:
+        return dtypes.widen(df)
+    return dtypes.widen(df, io.reads | io.touched)
+
+def apply_step(df_result: pd.DataFrame, step: Step) -> pd.DataFrame:
+    """
+    Applies a single step. May mutate `df_result` in place, always returns the result.
+    Unconfigured or failing steps are logged and skipped.
+    """
+    op = step.operation
+    try:
+        # A selector or dtype widening that fails is a failing step like any other
+        df_result = widen_inputs(df_result, step)
+        if is_batched(step):
+            return _apply_batched(df_result, step)
+
+        # Safety: handle None params
+        params = step.params if step.params else {}
+
+        # --- 1. SYNC PARAM TO COLUMN ---
+        col = resolve_column(step)
+
+        # --- 2. VALIDATION ---
+        if op not in OPS_WITHOUT_COL and col not in df_result.columns:
+            # This log is normal for unconfigured steps
+            print(f"⚠️ SKIPPING {op}: Column '{col}' not found in data.")
+            return df_result
+
+        # ====================================================
+        #  GROUP 1: CLEANING
+        # ====================================================
+        if op == "drop_column":
+            df_result.drop(columns=[col], inplace=True)
 
-            elif op == "fill_na_median":
-                if np.issubdtype(df_result[col].dtype, np.number):
+        elif op == "drop_duplicates":
+            df_result.drop_duplicates(inplace=True)
+
+        elif op == "drop_outliers_zscore":
+            if np.issubdtype(df_result[col].dtype, np.number):
+                threshold = float(params.get('threshold', 3))
+                mean = df_result[col].mean()
+                std = df_result[col].std()
+                if std != 0:
+                    df_result = df_result[np.abs((df_result[col] - mean) / std) < threshold]
+
+        elif op == "drop_outliers_manual":
+            if np.issubdtype(df_result[col].dtype, np.number):
+                val = float(params.get('value', 0))
+                df_result = df_result[df_result[col] < val]
+
+        # ====================================================
+        #  GROUP 2: IMPUTATION
+        # ====================================================
+        elif op == "fill_na_mean":
+            if np.issubdtype(df_result[col].dtype, np.number):
+                df_result[col] = df_result[col].fillna(df_result[col].mean())
+
+        elif op == "fill_na_median":
+            if np.issubdtype(df_result[col].dtype, np.number):
+                df_result[col] = df_result[col].fillna(df_result[col].median())
+
+        elif op == "fill_na_mode":
+            if not df_result[col].mode().empty:
+                df_result[col] = df_result[col].fillna(df_result[col].mode()[0])
+
+        elif op == "fill_na_const":
+            val = params.get('value', 0)
+            df_result[col] = df_result[col].fillna(val)
+
+        elif op == "fill_na_knn":
+             if np.issubdtype(df_result[col].dtype, np.number):
+                numeric_df = df_result.select_dtypes(include=[np.number])
+                if not numeric_df.empty:
+                    imputer = KNNImputer(n_neighbors=5)
+                    imputed_data = imputer.fit_transform(numeric_df)
+                    if col in numeric_df.columns:
+                        col_idx = numeric_df.columns.get_loc(col)
+                        df_result[col] = imputed_data[:, col_idx]
+
+        elif op == "fill_na_groupby":
+            group_col = params.get('group_col')
+            if group_col in df_result.columns:
+                strategy = params.get('strategy', 'median')
+                
+                if strategy == 'mean':
+                    mapper = df_result.groupby(group_col)[col].transform('mean')
+                elif strategy == 'median':
+                    mapper = df_result.groupby(group_col)[col].transform('median')
+                elif strategy == 'mode':
+                    mapper = df_result.groupby(group_col)[col].transform(lambda x: x.mode()[0] if not x.mode().empty else np.nan)
+                
+                df_result[col] = df_result[col].fillna(mapper)
+
+                # Global Fallback
+                if strategy == 'mean':
+                    df_result[col] = df_result[col].fillna(df_result[col].mean())
+                elif strategy == 'median':
                     df_result[col] = df_result[col].fillna(df_result[col].median())
+                elif strategy == 'mode':
+                    if not df_result[col].mode().empty:
+                        df_result[col] = df_result[col].fillna(df_result[col].mode()[0])
 
-            elif op == "fill_na_mode":
-                if not df_result[col].mode().empty:
-                    df_result[col] = df_result[col].fillna(df_result[col].mode()[0])
-
-            elif op == "fill_na_const":
-                val = params.get('value', 0)
-                df_result[col] = df_result[col].fillna(val)
-
-            elif op == "fill_na_knn":
-                 if np.issubdtype(df_result[col].dtype, np.number):
-                    numeric_df = df_result.select_dtypes(include=[np.number])
-                    if not numeric_df.empty:
-                        imputer = KNNImputer(n_neighbors=5)
-                        imputed_data = imputer.fit_transform(numeric_df)
-                        if col in numeric_df.columns:
-                            col_idx = numeric_df.columns.get_loc(col)
-                            df_result[col] = imputed_data[:, col_idx]
-
-            elif op == "fill_na_groupby":
-                group_col = params.get('group_col')
-                if group_col in df_result.columns:
-                    strategy = params.get('strategy', 'median')
-                    
-                    if strategy == 'mean':
-                        mapper = df_result.groupby(group_col)[col].transform('mean')
-                    elif strategy == 'median':
-                        mapper = df_result.groupby(group_col)[col].transform('median')
-                    elif strategy == 'mode':
-                        mapper = df_result.groupby(group_col)[col].transform(lambda x: x.mode()[0] if not x.mode().empty else np.nan)
-                    
-                    df_result[col] = df_result[col].fillna(mapper)
-
-                    # Global Fallback
-                    if strategy == 'mean':
-                        df_result[col] = df_result[col].fillna(df_result[col].mean())
-                    elif strategy == 'median':
-                        df_result[col] = df_result[col].fillna(df_result[col].median())
-                    elif strategy == 'mode':
-                        if not df_result[col].mode().empty:
-                            df_result[col] = df_result[col].fillna(df_result[col].mode()[0])
-
-            # ====================================================
-            #  GROUP 3: DATES
-            # ====================================================
-            elif op == "extract_date_parts":
-                df_result[col] = pd.to_datetime(df_result[col], errors='coerce')
-                df_result[f"{col}_year"] = df_result[col].dt.year
-                df_result[f"{col}_month"] = df_result[col].dt.month
-                df_result[f"{col}_day"] = df_result[col].dt.day
-                df_result[f"{col}_dow"] = df_result[col].dt.dayofweek
+        # ====================================================
+        #  GROUP 3: DATES
+        # ====================================================
+        elif op == "extract_date_parts":
+            df_result[col] = pd.to_datetime(df_result[col], errors='coerce')
+            df_result[f"{col}_year"] = df_result[col].dt.year
+            df_result[f"{col}_month"] = df_result[col].dt.month
+            df_result[f"{col}_day"] = df_result[col].dt.day
+            df_result[f"{col}_dow"] = df_result[col].dt.dayofweek
+            
+            if str(params.get('drop_original')) == "True":
+                df_result.drop(columns=[col], inplace=True)
+
+        # ====================================================
+        #  GROUP 4: MATH & BINNING
+        # ====================================================
+        elif op == "bin_numeric":
+            if np.issubdtype(df_result[col].dtype, np.number):
+                bins = int(params.get('bins', 5))
+                labels = params.get('labels', False)
+                if str(labels) == "False": labels = False
                 
-                if str(params.get('drop_original')) == "True":
-                    df_result.drop(columns=[col], inplace=True)
-
-            # ====================================================
-            #  GROUP 4: MATH & BINNING
-            # ====================================================
-            elif op == "bin_numeric":
-                if np.issubdtype(df_result[col].dtype, np.number):
-                    bins = int(params.get('bins', 5))
-                    labels = params.get('labels', False)
-                    if str(labels) == "False": labels = False
-                    
-                    strategy = params.get('strategy', 'quantile')
+                strategy = params.get('strategy', 'quantile')
+                
+                # 1. Run Binning
+                if strategy == 'quantile':
+                    res = pd.qcut(df_result[col], q=bins, labels=labels, duplicates='drop')
+                else:
+                    res = pd.cut(df_result[col], bins=bins, labels=labels)
+                
+                # 2. Safe Assignment (Fix for .cat error)
+                if hasattr(res, 'cat'):
+                    df_result[col] = res.cat.codes
+                else:
+                    df_result[col] = res
+
+        elif op == "log_transform":
+            if np.issubdtype(df_result[col].dtype, np.number):
+                if (df_result[col] <= 0).any():
+                    offset = abs(df_result[col].min()) + 1
+                    df_result[col] = np.log1p(df_result[col] + offset)
+                else:
+                    df_result[col] = np.log1p(df_result[col])
+
+        elif op == "box_cox_transform":
+            if np.issubdtype(df_result[col].dtype, np.number):
+                # Wrap in Try/Except (Fix for Optimizer Error)
+                try:
+                    clean_series = df_result[col].dropna()
+                    if clean_series.min() <= 0:
+                        clean_series = clean_series + abs(clean_series.min()) + 1
                     
-                    # 1. Run Binning
-                    if strategy == 'quantile':
-                        res = pd.qcut(df_result[col], q=bins, labels=labels, duplicates='drop')
-                    else:
-                        res = pd.cut(df_result[col], bins=bins, labels=labels)
+                    lambda_val = boxcox_normmax(clean_series)
                     
-                    # 2. Safe Assignment (Fix for .cat error)
-                    if hasattr(res, 'cat'):
-                        df_result[col] = res.cat.codes
-                    else:
-                        df_result[col] = res
-
-            elif op == "log_transform":
-                if np.issubdtype(df_result[col].dtype, np.number):
-                    if (df_result[col] <= 0).any():
-                        offset = abs(df_result[col].min()) + 1
-                        df_result[col] = np.log1p(df_result[col] + offset)
-                    else:
-                        df_result[col] = np.log1p(df_result[col])
-
-            elif op == "box_cox_transform":
-                if np.issubdtype(df_result[col].dtype, np.number):
-                    # Wrap in Try/Except (Fix for Optimizer Error)
-                    try:
-                        clean_series = df_result[col].dropna()
-                        if clean_series.min() <= 0:
-                            clean_series = clean_series + abs(clean_series.min()) + 1
+                    clean_col = df_result[col].fillna(df_result[col].median())
+                    if clean_col.min() <= 0:
+                        clean_col = clean_col + abs(clean_col.min()) + 1
                         
-                        lambda_val = boxcox_normmax(clean_series)
-                        
-                        clean_col = df_result[col].fillna(df_result[col].median())
-                        if clean_col.min() <= 0:
-                            clean_col = clean_col + abs(clean_col.min()) + 1
-                            
-                        df_result[col] = boxcox1p(clean_col, lambda_val)
-                    except Exception as e:
-                        print(f"⚠️ Box-Cox failed on {col}, falling back to Log1p. Error: {e}")
-                        # Fallback
-                        df_result[col] = np.log1p(df_result[col])
-
-            elif op == "create_interaction":
-                c1, c2 = params.get('col1'), params.get('col2')
-                new_name = params.get('new_name')
-                math_op = params.get('math_op', '+')
-                
-                if c1 in df_result.columns and c2 in df_result.columns:
-                    if math_op == '+':
-                        df_result[new_name] = df_result[c1] + df_result[c2]
-                    elif math_op == '*':
-                        df_result[new_name] = df_result[c1] * df_result[c2]
-                    elif math_op == '-':
-                        df_result[new_name] = df_result[c1] - df_result[c2]
-                    elif math_op == '/':
-                        df_result[new_name] = df_result[c1] / (df_result[c2].replace(0, np.nan))
-
-            elif op == "polynomial_features":
-                if np.issubdtype(df_result[col].dtype, np.number):
-                    degree = int(params.get('degree', 2))
-                    poly = PolynomialFeatures(degree=degree, include_bias=False)
-                    poly_data = poly.fit_transform(df_result[[col]])
-                    new_cols = [f"{col}_poly_{i}" for i in range(1, degree + 1)]
-                    df_poly = pd.DataFrame(poly_data, columns=new_cols, index=df_result.index)
-                    if degree >= 2:
-                        df_result = pd.concat([df_result, df_poly.iloc[:, 1:]], axis=1)
-
-            # ====================================================
-            #  GROUP 5 & 6: SCALERS & ENCODING
-            # ====================================================
-            elif op == "standard_scaler":
-                if np.issubdtype(df_result[col].dtype, np.number):
-                    scaler = StandardScaler()
-                    df_result[col] = scaler.fit_transform(df_result[[col]])
-            
-            elif op == "minmax_scaler":
-                if np.issubdtype(df_result[col].dtype, np.number):
-                    scaler = MinMaxScaler()
-                    df_result[col] = scaler.fit_transform(df_result[[col]])
-            
-            elif op == "robust_scaler":
-                if np.issubdtype(df_result[col].dtype, np.number):
-                    scaler = RobustScaler()
-                    df_result[col] = scaler.fit_transform(df_result[[col]])
-            
-            elif op == "maxabs_scaler":
-                if np.issubdtype(df_result[col].dtype, np.number):
-                    scaler = MaxAbsScaler()
-                    df_result[col] = scaler.fit_transform(df_result[[col]])
+                    df_result[col] = boxcox1p(clean_col, lambda_val)
+                except Exception as e:
+                    print(f"⚠️ Box-Cox failed on {col}, falling back to Log1p. Error: {e}")
+                    # Fallback
+                    df_result[col] = np.log1p(df_result[col])
 
-            elif op == "one_hot_encode":
-                df_result = pd.get_dummies(df_result, columns=[col], drop_first=True)
-            
-            elif op == "label_encode":
-                le = LabelEncoder()
-                df_result[col] = le.fit_transform(df_result[col].astype(str))
+        elif op == "create_interaction":
+            c1, c2 = params.get('col1'), params.get('col2')
+            new_name = params.get('new_name')
+            math_op = params.get('math_op', '+')
             
-            elif op == "ordinal_encode":
-                oe = OrdinalEncoder()
-                df_result[col] = oe.fit_transform(df_result[[col]])
+            if c1 in df_result.columns and c2 in df_result.columns:
+                if math_op == '+':
+                    df_result[new_name] = df_result[c1] + df_result[c2]
+                elif math_op == '*':
+                    df_result[new_name] = df_result[c1] * df_result[c2]
+                elif math_op == '-':
+                    df_result[new_name] = df_result[c1] - df_result[c2]
+                elif math_op == '/':
+                    df_result[new_name] = df_result[c1] / (df_result[c2].replace(0, np.nan))
 
-            elif op == "target_encode":
-                target_col = params.get('target_col')
-                if target_col in df_result.columns:
-                    encoder = ce.TargetEncoder(cols=[col])
-                    df_result[col] = encoder.fit_transform(df_result[col], df_result[target_col])
+        elif op == "polynomial_features":
+            if np.issubdtype(df_result[col].dtype, np.number):
+                degree = int(params.get('degree', 2))
+                poly = PolynomialFeatures(degree=degree, include_bias=False)
+                poly_data = poly.fit_transform(df_result[[col]])
+                new_cols = [f"{col}_poly_{i}" for i in range(1, degree + 1)]
+                df_poly = pd.DataFrame(poly_data, columns=new_cols, index=df_result.index)
+                if degree >= 2:
+                    df_result = pd.concat([df_result, df_poly.iloc[:, 1:]], axis=1)
 
-        except Exception as e:
-            print(f"⚠️ Transformer Error on {op}: {e}")
-            continue
+        # ====================================================
+        #  GROUP 5 & 6: SCALERS & ENCODING
+        # ====================================================
+        elif op == "standard_scaler":
+            if np.issubdtype(df_result[col].dtype, np.number):
+                scaler = StandardScaler()
+                df_result[col] = scaler.fit_transform(df_result[[col]])
+        
+        elif op == "minmax_scaler":
+            if np.issubdtype(df_result[col].dtype, np.number):
+                scaler = MinMaxScaler()
+                df_result[col] = scaler.fit_transform(df_result[[col]])
+        
+        elif op == "robust_scaler":
+            if np.issubdtype(df_result[col].dtype, np.number):
+                scaler = RobustScaler()
+                df_result[col] = scaler.fit_transform(df_result[[col]])
+        
+        elif op == "maxabs_scaler":
+            if np.issubdtype(df_result[col].dtype, np.number):
+                scaler = MaxAbsScaler()
+                df_result[col] = scaler.fit_transform(df_result[[col]])
+
+        elif op == "one_hot_encode":
+            df_result = pd.get_dummies(df_result, columns=[col], drop_first=True)
+        
+        elif op == "label_encode":
+            le = LabelEncoder()
+            df_result[col] = le.fit_transform(df_result[col].astype(str))
+        
+        elif op == "ordinal_encode":
+            oe = OrdinalEncoder()
+            df_result[col] = oe.fit_transform(df_result[[col]])
+
+        elif op == "target_encode":
+            target_col = params.get('target_col')
+            if target_col in df_result.columns:
+                encoder = ce.TargetEncoder(cols=[col])
+                df_result[col] = encoder.fit_transform(df_result[col], df_result[target_col])
+
+    except Exception as e:
+        print(f"⚠️ Transformer Error on {op}: {e}")
 
     return df_result
\ No newline at end of file
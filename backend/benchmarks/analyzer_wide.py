@@ -0,0 +1,109 @@
+"""
+Wide-frame benchmark for the sample analyzer.
+
+Compares analyzer.profile_frame against the previous column-by-column loop
+(kept below as the reference) and checks both return the same profile.
+
+    cd backend && python -m benchmarks.analyzer_wide --rows 1000 --cols 500 2000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.services import analyzer
+
+def legacy_profile(df: pd.DataFrame) -> dict:
+    """The analyzer before vectorisation: one Python iteration per column."""
+    total_rows = len(df)
+    memory_usage = int(df.memory_usage(deep=True).sum())
+    duplicate_rows = int(df.duplicated().sum())
+    column_stats = []
+
+    for col in df.columns:
+        col_type = "numeric" if np.issubdtype(df[col].dtype, np.number) else "categorical"
+        missing_count = int(df[col].isna().sum())
+        stat_item = {
+            "name": col,
+            "type": col_type,
+            "missing": missing_count,
+            "missing_pct": round((missing_count / total_rows) * 100, 1),
+            "unique": int(df[col].nunique()),
+            "distribution": []
+        }
+        if col_type == "numeric":
+            clean_series = df[col].dropna()
+            if not clean_series.empty:
+                stat_item["mean"] = round(float(clean_series.mean()), 2)
+                stat_item["median"] = round(float(clean_series.median()), 2)
+                stat_item["std_dev"] = round(float(clean_series.std()), 2)
+                stat_item["min"] = round(float(clean_series.min()), 2)
+                stat_item["max"] = round(float(clean_series.max()), 2)
+                counts, bin_edges = np.histogram(clean_series, bins=10)
+                for i in range(len(counts)):
+                    stat_item["distribution"].append({
+                        "label": f"{bin_edges[i]:.1f}-{bin_edges[i+1]:.1f}",
+                        "value": int(counts[i])
+                    })
+        else:
+            clean_series = df[col].dropna().astype(str)
+            if not clean_series.empty:
+                top_val = clean_series.mode().iloc[0] if not clean_series.mode().empty else "N/A"
+                freq = int(clean_series.value_counts().iloc[0]) if not clean_series.value_counts().empty else 0
+                stat_item["top_value"] = str(top_val)
+                stat_item["freq"] = freq
+                for cat_name, count in clean_series.value_counts().head(20).items():
+                    stat_item["distribution"].append({"label": str(cat_name), "value": int(count)})
+        column_stats.append(stat_item)
+
+    return {
+        "total_rows": total_rows,
+        "total_cols": len(df.columns),
+        "memory_usage": memory_usage,
+        "duplicate_rows": duplicate_rows,
+        "columns": column_stats
+    }
+
+def make_wide_frame(rows: int, cols: int, seed: int = 0) -> pd.DataFrame:
+    """Kaggle-like mix: 70% numeric (some ints, some with NaN), 30% low-cardinality strings."""
+    rng = np.random.default_rng(seed)
+    data = {}
+    for j in range(cols):
+        kind = j % 10
+        if kind < 4:
+            values = rng.normal(rng.uniform(-100, 100), rng.uniform(1, 50), rows)
+            values[rng.random(rows) < 0.05] = np.nan
+        elif kind < 7:
+            values = rng.integers(0, rng.integers(2, 1000), rows)
+        else:
+            values = rng.choice([f"cat_{k}" for k in range(rng.integers(2, 60))], rows).astype(object)
+            values[rng.random(rows) < 0.05] = np.nan
+        data[f"f{j}"] = values
+    return pd.DataFrame(data)
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--cols", type=int, nargs="+", default=[50, 500, 2000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'cols':>6} {'legacy (s)':>11} {'vectorised (s)':>15} {'speedup':>8}  same output")
+    for cols in args.cols:
+        df = make_wide_frame(args.rows, cols)
+        same = legacy_profile(df) == analyzer.profile_frame(df)
+        legacy = best_of(lambda: legacy_profile(df), args.repeat)
+        current = best_of(lambda: analyzer.profile_frame(df), args.repeat)
+        print(f"{cols:>6} {legacy:>11.3f} {current:>15.3f} {legacy / current:>7.1f}x  {same}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Execution backends side by side: checks that every operation gives the same
+values on each backend as on pandas, and times both.
+
+    cd backend && python -m benchmarks.backends --rows 200000 --cols 20
+
+Exits with status 1 when a backend disagrees with pandas.
+"""
+import argparse
+import sys
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from app.models.recipe import Recipe
+from app.services import backends
+from benchmarks.datasets import make_dataset
+from benchmarks.suite import MAX_ROWS, operation_steps
+
+def mismatch(expected: pd.DataFrame, result: pd.DataFrame) -> Optional[str]:
+    """Why two results differ in value (dtypes may differ), or None."""
+    if list(expected.columns) != list(result.columns):
+        return f"columns {list(expected.columns)} != {list(result.columns)}"
+    if len(expected) != len(result):
+        return f"{len(expected)} rows != {len(result)}"
+    for col in expected.columns:
+        a, b = expected[col].reset_index(drop=True), result[col].reset_index(drop=True)
+        if pd.api.types.is_numeric_dtype(a) and pd.api.types.is_numeric_dtype(b):
+            if not np.allclose(a.astype("float64"), b.astype("float64"), rtol=1e-9, atol=1e-12, equal_nan=True):
+                return f"values of {col}"
+        elif not a.astype(str).replace("None", "nan").equals(b.astype(str).replace("None", "nan")):
+            return f"values of {col}"
+    return None
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--cols", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    df = make_dataset(args.rows, args.cols, seed=args.seed)
+    pandas = backends.get_backend("pandas")
+    others = [backends.get_backend(name) for name in backends.available_backends() if name != "pandas"]
+    if not others:
+        sys.exit("Only the pandas backend is installed.")
+
+    failures = 0
+    steps = operation_steps(df)
+    # Every operation alone, then all of them in one recipe
+    recipes = [(op, [step]) for op, step in steps.items() if args.rows <= MAX_ROWS.get(op, args.rows)]
+    recipes.append(("all", [step for op, step in steps.items() if op not in MAX_ROWS]))
+
+    print(f"{'recipe':<24} {'pandas (s)':>10} " + " ".join(f"{b.name + ' (s)':>12}" for b in others))
+    for name, recipe_steps in recipes:
+        recipe = Recipe(session_id="bench", steps=recipe_steps)
+        expected = pandas.apply_recipe(df, recipe)
+        line = f"{name:<24} {best_of(lambda: pandas.apply_recipe(df, recipe), args.repeat):>10.4f}"
+        for backend in others:
+            problem = mismatch(expected, backend.apply_recipe(df, recipe))
+            timing = best_of(lambda: backend.apply_recipe(df, recipe), args.repeat)
+            line += f" {timing:>12.4f}" + (f"  ⚠️ {problem}" if problem else "")
+            failures += problem is not None
+        print(line)
+
+    print(f"{failures} mismatches")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
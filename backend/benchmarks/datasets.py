@@ -0,0 +1,77 @@
+"""
+Synthetic datasets for the benchmarks.
+
+Columns cycle through four kinds, so every operation finds a column it works on:
+- num_*   normal floats (with missing values)
+- skew_*  positive, right-skewed floats (lognormal; `skew` is the sigma)
+- int_*   integers in [0, cardinality)
+- cat_*   strings with `cardinality` distinct values (with missing values)
+plus `date_cols` ISO date columns (date_*).
+
+    cd backend && python -m benchmarks.datasets --rows 100000 --cols 50 --out /tmp/bench.csv
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+KINDS = ["num", "skew", "int", "cat"]
+
+def make_dataset(rows: int, cols: int, missing_rate: float = 0.05, cardinality: int = 50,
+                 skew: float = 1.0, date_cols: int = 1, seed: int = 0) -> pd.DataFrame:
+    """A frame of `rows` x `cols` (date columns included in `cols`), the same for the same arguments."""
+    rng = np.random.default_rng(seed)
+    date_cols = min(date_cols, cols)
+    data = {}
+
+    for j in range(cols - date_cols):
+        kind = KINDS[j % len(KINDS)]
+        if kind == "num":
+            values = rng.normal(rng.uniform(-100, 100), rng.uniform(1, 50), rows)
+        elif kind == "skew":
+            values = rng.lognormal(0.0, skew, rows)
+        elif kind == "int":
+            values = rng.integers(0, cardinality, rows)
+        else:
+            labels = np.array([f"{kind}{j}_{k}" for k in range(cardinality)], dtype=object)
+            values = labels[rng.integers(0, cardinality, rows)]
+
+        # Integers stay complete: a missing value would turn them into floats
+        if kind != "int" and missing_rate > 0:
+            values = values.astype(object if kind == "cat" else "float64")
+            values[rng.random(rows) < missing_rate] = np.nan
+        data[f"{kind}_{j}"] = values
+
+    start = np.datetime64("2015-01-01")
+    for j in range(date_cols):
+        days = rng.integers(0, 3650, rows)
+        data[f"date_{j}"] = np.datetime_as_string(start + days.astype("timedelta64[D]"), unit="D").astype(object)
+
+    return pd.DataFrame(data)
+
+def first_column(df: pd.DataFrame, kind: str, nth: int = 0) -> str:
+    """The nth column of a kind ("num", "skew", "int", "cat", "date"); falls back to any numeric one."""
+    names = [c for c in df.columns if c.startswith(f"{kind}_")]
+    if len(names) > nth:
+        return names[nth]
+    numeric = [c for c in df.columns if c.split("_")[0] in ["num", "skew", "int"]]
+    return numeric[min(nth, len(numeric) - 1)] if numeric else df.columns[0]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--cols", type=int, default=20)
+    parser.add_argument("--missing-rate", type=float, default=0.05)
+    parser.add_argument("--cardinality", type=int, default=50)
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument("--date-cols", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    df = make_dataset(args.rows, args.cols, args.missing_rate, args.cardinality, args.skew, args.date_cols, args.seed)
+    df.to_csv(args.out, index=False)
+    print(f"Wrote {args.out}: {len(df)} rows x {len(df.columns)} columns")
+
+if __name__ == "__main__":
+    main()
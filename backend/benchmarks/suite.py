@@ -0,0 +1,303 @@
+"""
+Benchmark suite: every operation of /api/options through transformer.apply_recipe,
+plus the analyzer, ingestion (file_manager) and code generation, over a grid of
+synthetic datasets (see benchmarks/datasets.py).
+
+    cd backend
+    python -m benchmarks.suite run --preset quick --output base.json
+    python -m benchmarks.suite run --rows 1000 100000 --cols 10 200 --output new.json
+    python -m benchmarks.suite compare base.json new.json --threshold 0.15
+
+`compare` exits with status 1 when a benchmark got slower than the threshold.
+Timings are the min and median of --repeat runs; each run of an operation
+includes the frame copy apply_recipe makes (see the "recipe.copy" baseline).
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from app.models.recipe import Recipe, Step
+from app.routers.preview import get_pipeline_options
+from app.services import analyzer, code_generator, dtypes, file_manager, transformer
+from benchmarks.datasets import first_column, make_dataset
+
+SUITES = ["ops", "analyzer", "ingest", "codegen"]
+
+# (rows, cols) grids
+PRESETS = {
+    "quick": [(1_000, 10), (10_000, 10), (1_000, 100)],
+    "rows": [(1_000, 10), (100_000, 10), (1_000_000, 10), (10_000_000, 10)],
+    "cols": [(1_000, 10), (1_000, 200), (1_000, 2000), (10_000, 2000)],
+}
+PRESETS["full"] = PRESETS["rows"] + PRESETS["cols"][1:]
+
+# Operations that do not scale to any size: above this many rows they are skipped
+MAX_ROWS = {
+    "fill_na_knn": 20_000,          # Pairwise distances: quadratic in rows
+    "box_cox_transform": 2_000_000,
+}
+
+# Column kind each operation's main column should have (numeric otherwise)
+COLUMN_KIND = {
+    "extract_date_parts": "date",
+    "one_hot_encode": "cat",
+    "label_encode": "cat",
+    "ordinal_encode": "cat",
+    "target_encode": "cat",
+    "fill_na_mode": "cat",
+    "log_transform": "skew",
+    "box_cox_transform": "skew",
+    "polynomial_features": "int",   # Rejects missing values
+}
+
+# ====================================================
+#  STEPS FOR EVERY OPERATION
+# ====================================================
+
+def _param_value(op: str, param: dict, df: pd.DataFrame):
+    name, kind = param["name"], param["type"]
+    if kind == "column_select":
+        if name == "col":
+            return first_column(df, COLUMN_KIND.get(op, "num"))
+        if name == "group_col":
+            return first_column(df, "cat")
+        if name == "col2":
+            return first_column(df, "num", 1)
+        if name == "target_col":
+            return first_column(df, "int")
+        return first_column(df, "num")
+    if "default" in param:
+        return param["default"]
+    if kind == "select":
+        return param["options"][0]
+    if kind == "number":
+        return 0
+    return "bench_new"
+
+def operation_steps(df: pd.DataFrame) -> Dict[str, Step]:
+    """One step per operation id of /api/options, configured on columns of `df` it applies to."""
+    steps = {}
+    for option in get_pipeline_options()["operations"]:
+        op = option["id"]
+        params = {param["name"]: _param_value(op, param, df) for param in option["params"]}
+        steps[op] = Step(id=op, operation=op, column=params.get("col", ""), params=params)
+    return steps
+
+# ====================================================
+#  TIMING
+# ====================================================
+
+def measure(fn: Callable[[], object], repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        # The transformer prints a line for every skipped step
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+        timings.append(time.perf_counter() - start)
+    return {"min_s": min(timings), "median_s": statistics.median(timings),
+            "mean_s": statistics.fmean(timings), "repeat": repeat}
+
+def _result(name: str, rows: int, cols: int, timing: Optional[dict] = None, skipped: str = "") -> dict:
+    result = {"name": name, "rows": rows, "cols": cols}
+    if skipped:
+        result["skipped"] = skipped
+    else:
+        result.update(timing)
+    return result
+
+def bench_ops(df: pd.DataFrame, repeat: int, only: Optional[List[str]]) -> List[dict]:
+    rows, cols = df.shape
+    results = [_result("recipe.copy", rows, cols,
+                       measure(lambda: transformer.apply_recipe(df, Recipe(session_id="bench", steps=[])), repeat))]
+    for op, step in operation_steps(df).items():
+        if only and op not in only:
+            continue
+        if rows > MAX_ROWS.get(op, rows):
+            results.append(_result(f"op.{op}", rows, cols, skipped=f"more than {MAX_ROWS[op]} rows"))
+            continue
+        recipe = Recipe(session_id="bench", steps=[step])
+        results.append(_result(f"op.{op}", rows, cols, measure(lambda: transformer.apply_recipe(df, recipe), repeat)))
+    return results
+
+def _session(df: pd.DataFrame, folder: Path) -> Path:
+    """A session folder like an upload leaves it: sample.csv with its columnar copy and schema."""
+    sample_path = folder / "sample.csv"
+    df.to_csv(sample_path, index=False)
+    file_manager.write_columnar_copy(pa.Table.from_pandas(df, preserve_index=False), sample_path)
+    file_manager.write_schema(folder, df)
+    return sample_path
+
+def bench_analyzer(df: pd.DataFrame, repeat: int) -> List[dict]:
+    rows, cols = df.shape
+    with tempfile.TemporaryDirectory() as tmp:
+        sample_path = _session(df, Path(tmp))
+        return [_result("analyzer.analyze_dataset", rows, cols,
+                        measure(lambda: analyzer.analyze_dataset(sample_path), repeat))]
+
+def bench_ingest(df: pd.DataFrame, repeat: int) -> List[dict]:
+    rows, cols = df.shape
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp)
+        csv_bytes = df.to_csv(index=False).encode()
+        original_path = folder / "original.csv"
+        original_path.write_bytes(csv_bytes)
+
+        # Parse + sample.csv + columnar copy + schema (dtype inference), as at upload
+        # (here on the whole file, the upload only parses the reservoir sample)
+        results.append(_result("ingest.write_sample", rows, cols,
+                               measure(lambda: file_manager._write_sample(folder, csv_bytes), repeat)))
+        sample = file_manager.read_dataset(folder / "sample.csv")
+        schema = pa.Table.from_pandas(dtypes.widen(sample), preserve_index=False).schema
+
+        # Before the columnar copy lands, loaders read the CSV with the stored schema
+        results.append(_result("ingest.read_dataset_csv", rows, cols,
+                               measure(lambda: file_manager.read_dataset(original_path), repeat)))
+        results.append(_result("ingest.convert_columnar", rows, cols,
+                               measure(lambda: file_manager.convert_csv_to_columnar(original_path, schema), repeat)))
+        results.append(_result("ingest.read_dataset", rows, cols,
+                               measure(lambda: file_manager.read_dataset(original_path), repeat)))
+        results.append(_result("ingest.iter_chunks", rows, cols,
+                               measure(lambda: sum(len(c) for c in file_manager.iter_dataset_chunks(original_path, 100_000)),
+                                       repeat)))
+    return results
+
+def bench_codegen(df: pd.DataFrame, repeat: int) -> List[dict]:
+    rows, cols = df.shape
+    all_ops = Recipe(session_id="bench", steps=list(operation_steps(df).values()))
+    per_column = Recipe(session_id="bench", steps=[Step(id=str(c), operation="standard_scaler", column=str(c))
+                                                   for c in df.columns])
+    return [
+        _result("codegen.all_ops", rows, cols, measure(lambda: code_generator.generate_pipeline_code(all_ops), repeat)),
+        _result("codegen.per_column", rows, cols,
+                measure(lambda: code_generator.generate_pipeline_code(per_column), repeat)),
+    ]
+
+# ====================================================
+#  RUN / COMPARE
+# ====================================================
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _grid(args) -> List[Tuple[int, int]]:
+    if args.rows or args.cols:
+        return [(rows, cols) for rows in (args.rows or [1_000]) for cols in (args.cols or [10])]
+    return PRESETS[args.preset]
+
+def run(args) -> int:
+    suites = args.suite or SUITES
+    results = []
+    for rows, cols in _grid(args):
+        df = make_dataset(rows, cols, args.missing_rate, args.cardinality, args.skew, args.date_cols, args.seed)
+        print(f"📏 {rows} rows x {cols} cols")
+        for suite in suites:
+            if suite == "ops":
+                part = bench_ops(df, args.repeat, args.ops)
+            elif suite == "analyzer":
+                part = bench_analyzer(df, args.repeat)
+            elif suite == "ingest":
+                part = bench_ingest(df, args.repeat)
+            else:
+                part = bench_codegen(df, args.repeat)
+            for result in part:
+                timing = "skipped: " + result["skipped"] if "skipped" in result else f"{result['median_s']:.4f}s"
+                print(f"   {result['name']:<32} {timing}")
+            results.extend(part)
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k != "func"},
+        },
+        "results": results,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=1))
+    print(f"💾 Saved {len(results)} results to {args.output}")
+    return 0
+
+def _key(result: dict) -> Tuple[str, int, int]:
+    return result["name"], result["rows"], result["cols"]
+
+def compare(args) -> int:
+    base = {_key(r): r for r in json.loads(Path(args.baseline).read_text())["results"] if "skipped" not in r}
+    new = {_key(r): r for r in json.loads(Path(args.current).read_text())["results"] if "skipped" not in r}
+
+    regressions = 0
+    print(f"{'benchmark':<34} {'rows':>9} {'cols':>5} {'base (s)':>10} {'new (s)':>10} {'ratio':>7}")
+    for key in sorted(base.keys() & new.keys()):
+        before, after = base[key][args.stat], new[key][args.stat]
+        ratio = after / before if before > 0 else float("inf")
+        flag = ""
+        # Sub-millisecond timings are mostly noise
+        if max(before, after) >= args.min_seconds:
+            if ratio > 1 + args.threshold:
+                flag, regressions = "  ⚠️ slower", regressions + 1
+            elif ratio < 1 - args.threshold:
+                flag = "  faster"
+        name, rows, cols = key
+        print(f"{name:<34} {rows:>9} {cols:>5} {before:>10.4f} {after:>10.4f} {ratio:>6.2f}x{flag}")
+
+    for label, keys in [("only in baseline", base.keys() - new.keys()), ("only in current", new.keys() - base.keys())]:
+        if keys:
+            print(f"{len(keys)} benchmarks {label}")
+    print(f"{regressions} regressions over {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks and save the results as JSON.")
+    run_parser.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    run_parser.add_argument("--rows", type=int, nargs="+", help="Overrides the preset (crossed with --cols)")
+    run_parser.add_argument("--cols", type=int, nargs="+")
+    run_parser.add_argument("--suite", choices=SUITES, nargs="+", help="Default: all")
+    run_parser.add_argument("--ops", nargs="+", help="Only these operation ids")
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--missing-rate", type=float, default=0.05)
+    run_parser.add_argument("--cardinality", type=int, default=50)
+    run_parser.add_argument("--skew", type=float, default=1.0)
+    run_parser.add_argument("--date-cols", type=int, default=1)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--output", default="benchmark.json")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser("compare", help="Compare two result files.")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="Relative change that counts (0.1 = 10%%)")
+    compare_parser.add_argument("--stat", choices=["min_s", "median_s", "mean_s"], default="min_s")
+    compare_parser.add_argument("--min-seconds", type=float, default=0.001)
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+if __name__ == "__main__":
+    main()
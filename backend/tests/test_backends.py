@@ -0,0 +1,32 @@
+import pytest
+
+from app.models.recipe import Recipe
+from app.services import backends
+from benchmarks.backends import mismatch
+from benchmarks.datasets import make_dataset
+from benchmarks.suite import MAX_ROWS, operation_steps
+
+pytest.importorskip("polars")
+
+ROWS, COLS = 2_000, 10
+
+DF = make_dataset(ROWS, COLS, seed=0)
+STEPS = operation_steps(DF)
+
+
+def _compare(steps, capsys):
+    recipe = Recipe(session_id="test", steps=steps)
+    expected = backends.get_backend("pandas").apply_recipe(DF.copy(), recipe)
+    result = backends.get_backend("polars").apply_recipe(DF.copy(), recipe)
+    assert mismatch(expected, result) is None
+    # A whole-recipe fallback to pandas would make the comparison pointless
+    assert "running on pandas" not in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("op", sorted(STEPS))
+def test_operation_matches_pandas(op, capsys):
+    _compare([STEPS[op]], capsys)
+
+
+def test_full_recipe_matches_pandas(capsys):
+    _compare([step for op, step in STEPS.items() if op not in MAX_ROWS], capsys)
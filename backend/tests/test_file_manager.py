@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from app.config import settings
+from app.models.recipe import Recipe, Step
+from app.services import executor, file_manager
+
+SAMPLE_ROWS = 1_000
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    """A session whose int column has its first missing value past the sample."""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", tmp_path)
+    # No columnar copy (skipped, or still being built): every read goes to the CSV
+    monkeypatch.setattr(file_manager, "open_columnar", lambda csv_path: None)
+
+    folder = tmp_path / "s"
+    folder.mkdir()
+    df = pd.DataFrame({"n": range(3 * SAMPLE_ROWS), "label": ["a", "b", "c"] * SAMPLE_ROWS})
+    df["n"] = df["n"].astype(object)
+    df.loc[2 * SAMPLE_ROWS, "n"] = None
+    df.to_csv(folder / "original.csv", index=False)
+    sample = (folder / "original.csv").read_bytes().split(b"\n")[:SAMPLE_ROWS + 1]
+    file_manager._write_sample(folder, b"\n".join(sample) + b"\n")
+    assert file_manager.schema_dtypes(folder)["n"] == "int64"
+    return folder
+
+
+def test_read_dataset_with_missing_values_past_the_sample(session):
+    df = file_manager.read_dataset(session / "original.csv")
+    assert len(df) == 3 * SAMPLE_ROWS
+    assert df["n"].isna().sum() == 1
+
+
+def test_chunks_with_missing_values_past_the_sample(session):
+    chunks = list(file_manager.iter_dataset_chunks(session / "original.csv", 700))
+    assert sum(len(chunk) for chunk in chunks) == 3 * SAMPLE_ROWS
+    assert sum(chunk["n"].isna().sum() for chunk in chunks) == 1
+
+
+def test_full_run_with_missing_values_past_the_sample(session):
+    recipe = Recipe(session_id="s", steps=[Step(id="1", operation="fill_na_mean", column="n")])
+    executor.run_recipe_on_file(recipe, session / "out.csv")
+    out = pd.read_csv(session / "out.csv")
+    assert len(out) == 3 * SAMPLE_ROWS
+    assert out["n"].notna().all()
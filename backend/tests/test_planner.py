@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from app.models.recipe import Recipe, Step
+from app.services import planner, transformer
+
+
+def _steps(*ops):
+    return [Step(id=str(i), operation=op, column="x") for i, op in enumerate(ops)]
+
+
+def _run(df, steps):
+    return transformer.apply_recipe(df.copy(), Recipe(session_id="test", steps=steps))
+
+
+def test_scaler_before_standard_scaler_is_fused():
+    plan = planner.optimize(_steps("robust_scaler", "standard_scaler"), ["x"])
+    assert [step.operation for step in plan.steps] == ["standard_scaler"]
+
+
+def test_scaler_before_robust_scaler_is_kept_for_zero_iqr():
+    # IQR is 0, so robust_scaler only centers: its output depends on the first scaler
+    df = pd.DataFrame({"x": [0.0] * 8 + [5.0, 100.0]})
+    steps = _steps("standard_scaler", "robust_scaler")
+    plan = planner.optimize(steps, ["x"])
+
+    assert [step.operation for step in plan.steps] == ["standard_scaler", "robust_scaler"]
+    np.testing.assert_allclose(_run(df, plan.steps)["x"], _run(df, steps)["x"])